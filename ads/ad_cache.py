@@ -0,0 +1,62 @@
+"""
+Кэш сериализованных объявлений.
+
+- По ID для /ads/batch/: объявления читаются из кэша одним get_many, а
+  промахи догружаются одним запросом id__in и сохраняются set_many.
+- Ответы /ads/upd/<id>/ и первой страницы /ads/ без параметров: через
+  config.singleflight, чтобы одновременные промахи пересчитывал один запрос.
+
+Записи сбрасываются сигналами post_save/post_delete модели Ad, а также явно в
+местах, которые обходят сигналы (QuerySet.update() копий продавцов, пакетное
+удаление). Первая страница списка при этом не удаляется, а помечается
+устаревшей: её пересчитает следующий запрос, а одновременные с ним получат
+прежнюю страницу.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from config.singleflight import flights
+
+from .models import Ad
+from .serializers import AdBatchSerializer
+
+AD_LIST_CACHE_KEY = "ads:list:first"
+
+
+def ad_cache_key(pk):
+    return f"ads:ad:{pk}"
+
+
+def ad_detail_cache_key(pk):
+    return f"ads:detail:{pk}"
+
+
+def invalidate_ads(ids):
+    """
+    Сбрасывает кэш объявлений сразу и ещё раз после фиксации транзакции: иначе
+    параллельный запрос мог бы успеть закэшировать ещё не зафиксированную старую версию.
+    """
+    keys = [key for pk in ids for key in (ad_cache_key(pk), ad_detail_cache_key(pk))]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+        flights.expire(AD_LIST_CACHE_KEY)
+
+
+def get_ads(ids):
+    """
+    Возвращает сериализованные объявления по ID.
+
+    :param ids: Список ID без повторов.
+    :return: Словарь {id: данные объявления}; отсутствующих ID в нём нет.
+    """
+    cached = cache.get_many([ad_cache_key(pk) for pk in ids])
+    found = {pk: cached[ad_cache_key(pk)] for pk in ids if ad_cache_key(pk) in cached}
+    missing = [pk for pk in ids if pk not in found]
+    if missing:
+        loaded = {ad.pk: AdBatchSerializer(ad).data for ad in Ad.objects.filter(pk__in=missing).order_by()}
+        cache.set_many({ad_cache_key(pk): data for pk, data in loaded.items()}, settings.ADS_BATCH_CACHE_TIMEOUT)
+        found.update(loaded)
+    return found
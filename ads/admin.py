@@ -1,16 +1,28 @@
+from django.conf import settings
 from django.contrib import admin
+
+from .admin_tools import AutocompleteFilter, ScalableAdminMixin
 from .models import Ad, Review
+from .retention import purge_ads
 
 
 @admin.register(Ad)
-class AdAdmin(admin.ModelAdmin):
+class AdAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ("title", "price", "author", "created_at")
-    list_filter = ("author", "created_at")
-    search_fields = ("title", "description")
+    list_filter = (("author", AutocompleteFilter), "created_at")
+    list_select_related = ("author",)
+    search_fields = ("title",)  # Триграммный индекс ad_title_trgm_idx (PostgreSQL)
+    actions = ["purge_selected"]
+
+    @admin.action(description="Удалить выбранные объявления с отзывами (пакетно)", permissions=["delete"])
+    def purge_selected(self, request, queryset):
+        ads, reviews = purge_ads(queryset, settings.PURGE_BATCH_SIZE, settings.PURGE_BATCH_PAUSE)
+        self.message_user(request, f"Удалено объявлений: {ads}, отзывов: {reviews}.")
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ("author", "ad", "created_at")
-    list_filter = ("author", "ad", "created_at")
-    search_fields = ("text",)
+    list_filter = (("author", AutocompleteFilter), ("ad", AutocompleteFilter), "created_at")
+    list_select_related = ("author", "ad")
+    search_fields = ("text",)  # Триграммный индекс review_text_trgm_idx (PostgreSQL)
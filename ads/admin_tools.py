@@ -0,0 +1,106 @@
+"""
+Инструменты для списков админки на больших таблицах.
+
+- AutocompleteFilter - фильтр по связанному объекту с полем автодополнения
+  вместо списка всех объектов: загружается только выбранный объект, а варианты
+  подгружаются по мере ввода через autocomplete админки (нужны search_fields
+  у админки связанной модели).
+- EstimatedCountPaginator - для запроса без фильтров берёт оценку количества
+  строк из статистики PostgreSQL вместо COUNT(*) по всей таблице.
+- ScalableAdminMixin - подключает пагинатор, отключает второй COUNT(*) для
+  «всего N» и добавляет скрипты автодополнения на страницу списка.
+"""
+
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """
+    Фильтр по внешнему ключу с полем автодополнения.
+
+    Использование: list_filter = (("author", AutocompleteFilter),).
+    """
+
+    template = "admin/ads/autocomplete_filter.html"
+
+    def field_choices(self, field, request, model_admin):
+        # Варианты не загружаются целиком: поле автодополнения подгружает их по мере ввода
+        return []
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        related = self.field.remote_field.model
+        choice_field = forms.ModelChoiceField(
+            queryset=related._default_manager.all(),
+            required=False,
+            widget=AutocompleteSelect(self.field, changelist.model_admin.admin_site),
+        )
+        # Виджет выбирает из БД только объект с переданным значением
+        widget = choice_field.widget.render(
+            self.lookup_kwarg, self.lookup_val, attrs={"id": f"autocomplete-filter-{self.field_path}"}
+        )
+        yield {
+            "widget": widget,
+            "widget_id": f"autocomplete-filter-{self.field_path}",
+            "lookup_kwarg": self.lookup_kwarg,
+            "query_string": changelist.get_query_string(remove=[self.lookup_kwarg, self.lookup_kwarg_isnull]),
+        }
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор с оценкой количества строк для нефильтрованных списков.
+
+    Оценка (pg_class.reltuples) используется только в PostgreSQL и только если
+    таблица больше estimate_threshold строк: на маленьких таблицах точный
+    COUNT(*) дёшев и не сбивает пользователя неточным числом.
+    """
+
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            table = queryset.model._meta.db_table
+            with connection.cursor() as cursor:
+                # Для секционированной таблицы (ads/partitioning.py) оценки хранятся у секций
+                cursor.execute(
+                    """
+                    SELECT COALESCE(SUM(GREATEST(reltuples, 0)), 0)::bigint
+                    FROM pg_class
+                    WHERE oid = %s::regclass
+                       OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)
+                    """,
+                    [table, table],
+                )
+                estimate = cursor.fetchone()[0]
+            if estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
+
+
+class ScalableAdminMixin:
+    """
+    Настройки списка админки для больших таблиц.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # Не считать COUNT(*) по всей таблице для «всего N»
+
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if isinstance(list_filter, (list, tuple)) and issubclass(list_filter[1], AutocompleteFilter):
+                field = self.model._meta.get_field(list_filter[0])
+                return media + AutocompleteSelect(field, self.admin_site).media
+        return media
@@ -0,0 +1,94 @@
+import base64
+import heapq
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Ad, AdTombstone
+
+
+def encode_token(changed_at, ad_id):
+    """
+    Кодирует позицию в ленте изменений в непрозрачный токен.
+
+    :param changed_at: Время последнего изменения, отданного клиенту.
+    :param ad_id: ID объявления последнего изменения.
+    :return: Строка токена для параметра since.
+    """
+    raw = f"{changed_at.isoformat()}|{ad_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_token(token):
+    """
+    Декодирует токен ленты изменений.
+
+    :param token: Строка, полученная от encode_token.
+    :return: Кортеж (changed_at, ad_id).
+    :raises ValidationError: Если токен повреждён.
+    """
+    try:
+        changed_at, ad_id = base64.urlsafe_b64decode(token.encode()).decode().split("|")
+        return datetime.fromisoformat(changed_at), int(ad_id)
+    except (ValueError, UnicodeError):
+        raise ValidationError({"since": "Недействительный токен."})
+
+
+def collect_changes(since=None, limit=100):
+    """
+    Возвращает изменения объявлений после позиции since в монотонном порядке.
+
+    Изменения упорядочены по ключу (время изменения, ID объявления). Каждый
+    из двух источников (таблица объявлений по updated_at и таблица удалений
+    по deleted_at) читается по индексу не более чем на limit + 1 строк,
+    после чего потоки сливаются.
+
+    Изменения моложе settings.ADS_CHANGES_LAG не отдаются: транзакции
+    фиксируются не в порядке своих временных меток, и без задержки клиент
+    мог бы проскочить изменение, которое станет видимым позже.
+
+    Объявления, отмеченные почти повторами (duplicate_of), отдаются как
+    удалённые: они скрыты из каталога.
+
+    :param since: Токен позиции или None для полной синхронизации.
+    :param limit: Максимальное количество изменений в ответе.
+    :return: Кортеж (список изменений, токен продолжения, есть ли ещё изменения).
+    """
+    position = decode_token(since) if since else None
+    horizon = timezone.now() - settings.ADS_CHANGES_LAG
+
+    ads = Ad.objects.filter(updated_at__lte=horizon)
+    tombstones = AdTombstone.objects.filter(deleted_at__lte=horizon)
+    if position:
+        changed_at, ad_id = position
+        ads = ads.filter(Q(updated_at__gt=changed_at) | Q(updated_at=changed_at, id__gt=ad_id))
+        tombstones = tombstones.filter(Q(deleted_at__gt=changed_at) | Q(deleted_at=changed_at, ad_id__gt=ad_id))
+
+    ads = ads.order_by("updated_at", "id").values_list("updated_at", "id", "created_at", "duplicate_of_id")[
+        : limit + 1
+    ]
+    tombstones = tombstones.order_by("deleted_at", "ad_id").values_list("deleted_at", "ad_id")[: limit + 1]
+
+    def ad_events():
+        for updated_at, ad_id, created_at, duplicate_of_id in ads:
+            if duplicate_of_id is not None:
+                # Отмеченный повтор скрыт из каталога: для клиента он удалён
+                yield updated_at, ad_id, "deleted"
+                continue
+            created = position is None or created_at > position[0]
+            yield updated_at, ad_id, "created" if created else "updated"
+
+    def tombstone_events():
+        for deleted_at, ad_id in tombstones:
+            yield deleted_at, ad_id, "deleted"
+
+    events = list(heapq.merge(ad_events(), tombstone_events()))[: limit + 1]
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    results = [{"id": ad_id, "action": action, "changed_at": changed_at} for changed_at, ad_id, action in events]
+    next_token = encode_token(events[-1][0], events[-1][1]) if events else since
+    return results, next_token, has_more
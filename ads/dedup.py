@@ -0,0 +1,198 @@
+"""
+Поиск почти одинаковых объявлений автора (MinHash и LSH).
+
+Текст объявления (название и описание) разбивается на шинглы - последовательности
+из ADS_DEDUP["SHINGLE_SIZE"] слов. MinHash-сигнатура - минимумы PERMUTATIONS
+хэш-функций по шинглам: доля совпадающих позиций двух сигнатур оценивает
+коэффициент Жаккара множеств шинглов. Сигнатура делится на BANDS полос, и хэш
+каждой полосы записывается в AdBand вместе с автором. Объявления, совпадающие
+хотя бы в одной полосе, - кандидаты; при 16 полосах по 4 значения пара со
+сходством 0.8 становится кандидатом с вероятностью больше 0.999, а со сходством
+0.3 - меньше 0.13.
+
+При создании объявления кандидаты ищутся одним запросом по индексу
+(author, key) и проверяются по сигнатурам; если сходство с одним из них не
+ниже THRESHOLD, объявление отклоняется (ACTION = "reject") или сохраняется с
+duplicate_of (ACTION = "flag"). Сигнатура и корзины пересчитываются сигналом
+post_save при создании и изменении названия или описания.
+
+manage.py dedupe_ads ищет повторы во всём каталоге без попарного сравнения:
+перебираются только корзины, в которые попало несколько объявлений автора.
+"""
+
+import hashlib
+import random
+import re
+import struct
+import zlib
+from functools import lru_cache
+from itertools import groupby
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import Ad, AdBand, AdSignature
+
+_WORD = re.compile(r"\w+")
+_PRIME = (1 << 61) - 1  # Простое число Мерсенна для хэш-функций вида (a * x + b) mod p
+
+
+@lru_cache(maxsize=None)
+def permutations(count):
+    # Фиксированное зерно: сигнатуры должны совпадать между процессами и запусками
+    generator = random.Random(count)
+    return tuple((generator.randrange(1, _PRIME), generator.randrange(_PRIME)) for _ in range(count))
+
+
+def shingles(title, description):
+    """
+    Возвращает множество crc32 шинглов текста объявления.
+    """
+    words = _WORD.findall(f"{title} {description}".lower().replace("ё", "е"))
+    size = settings.ADS_DEDUP["SHINGLE_SIZE"]
+    grams = {" ".join(words[start : start + size]) for start in range(max(len(words) - size + 1, 1))}
+    return {zlib.crc32(gram.encode()) for gram in grams}
+
+
+@lru_cache(maxsize=256)
+def minhash(title, description):
+    # Кэш: AdCreate считает сигнатуру для проверки, а сигнал post_save сохраняет её без пересчёта
+    hashes = shingles(title, description)
+    return tuple(
+        min((a * value + b) % _PRIME for value in hashes) for a, b in permutations(settings.ADS_DEDUP["PERMUTATIONS"])
+    )
+
+
+def band_keys(signature):
+    """
+    Возвращает хэши полос сигнатуры (номер полосы входит в хэш, поэтому полосы не путаются).
+    """
+    bands = settings.ADS_DEDUP["BANDS"]
+    rows = len(signature) // bands
+    return [
+        int.from_bytes(
+            hashlib.blake2b(
+                struct.pack(f"<H{rows}Q", band, *signature[band * rows : (band + 1) * rows]), digest_size=8
+            ).digest(),
+            "little",
+            signed=True,
+        )
+        for band in range(bands)
+    ]
+
+
+def pack_signature(signature):
+    return struct.pack(f"<{len(signature)}Q", *signature)
+
+
+def unpack_signature(data):
+    return struct.unpack(f"<{len(data) // 8}Q", data)
+
+
+def similarity(first, second):
+    """
+    Оценка коэффициента Жаккара по двум сигнатурам.
+    """
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+def find_duplicate(author_id, signature):
+    """
+    Ищет среди объявлений автора почти повтор текста с сигнатурой signature.
+
+    :return: ID самого похожего объявления со сходством не ниже THRESHOLD или None.
+    """
+    candidates = list(
+        AdBand.objects.filter(author_id=author_id, key__in=band_keys(signature))
+        .values_list("ad_id", flat=True)
+        .distinct()[: settings.ADS_DEDUP["MAX_CANDIDATES"]]
+    )
+    if not candidates:
+        return None
+    scores = [
+        (similarity(signature, unpack_signature(data)), ad_id)
+        for ad_id, data in AdSignature.objects.filter(ad_id__in=candidates).values_list("ad_id", "signature")
+    ]
+    score, ad_id = max(scores, default=(0.0, None))
+    return ad_id if score >= settings.ADS_DEDUP["THRESHOLD"] else None
+
+
+def index_ads(ads):
+    """
+    Сохраняет сигнатуры и корзины объявлений.
+    """
+    signatures, bands = [], []
+    for ad in ads:
+        signature = minhash(ad.title, ad.description)
+        signatures.append(AdSignature(ad_id=ad.pk, signature=pack_signature(signature)))
+        bands += [AdBand(ad_id=ad.pk, author_id=ad.author_id, key=key) for key in band_keys(signature)]
+    ids = [signature.ad_id for signature in signatures]
+    AdSignature.objects.filter(ad_id__in=ids).delete()
+    AdBand.objects.filter(ad_id__in=ids).delete()
+    AdSignature.objects.bulk_create(signatures)
+    AdBand.objects.bulk_create(bands)
+
+
+def index_missing(batch_size):
+    """
+    Считает сигнатуры объявлений, у которых их нет (например, созданных до появления поиска повторов).
+
+    :return: Количество обработанных объявлений.
+    """
+    indexed = 0
+    queryset = Ad.objects.filter(signature__isnull=True).order_by("pk").only("pk", "title", "description", "author_id")
+    while True:
+        ads = list(queryset[:batch_size])
+        if not ads:
+            return indexed
+        index_ads(ads)
+        indexed += len(ads)
+
+
+def duplicate_groups():
+    """
+    Находит группы почти одинаковых объявлений каждого автора.
+
+    Кандидаты берутся только из корзин, где больше одного объявления автора;
+    внутри корзины каждое объявление сравнивается с первым, а группы
+    объединяются через общие объявления (система непересекающихся множеств).
+
+    :return: Словарь {ID исходного (самого раннего) объявления: [ID повторов]}.
+    """
+    shared = AdBand.objects.values("author_id", "key").annotate(count=Count("id")).filter(count__gt=1)
+    rows = (
+        AdBand.objects.filter(key__in=shared.values("key"))
+        .order_by("author_id", "key", "ad_id")
+        .values_list("author_id", "key", "ad_id")
+    )
+    buckets = [
+        [ad_id for _, _, ad_id in group] for _, group in groupby(rows.iterator(), key=lambda row: (row[0], row[1]))
+    ]
+    buckets = [bucket for bucket in buckets if len(bucket) > 1]
+    signatures = {
+        ad_id: unpack_signature(data)
+        for ad_id, data in AdSignature.objects.filter(
+            ad_id__in={ad_id for bucket in buckets for ad_id in bucket}
+        ).values_list("ad_id", "signature")
+    }
+
+    parent = {}
+
+    def find(ad_id):
+        while parent.get(ad_id, ad_id) != ad_id:
+            ad_id = parent[ad_id]
+        return ad_id
+
+    threshold = settings.ADS_DEDUP["THRESHOLD"]
+    for first, *others in buckets:
+        for other in others:
+            if first in signatures and other in signatures:
+                if similarity(signatures[first], signatures[other]) >= threshold:
+                    root, other_root = sorted((find(first), find(other)))
+                    if root != other_root:
+                        parent[other_root] = root
+
+    groups = {}
+    for ad_id in parent:
+        groups.setdefault(find(ad_id), []).append(ad_id)
+    return {root: sorted(ad_id for ad_id in members if ad_id != root) for root, members in groups.items()}
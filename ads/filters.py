@@ -0,0 +1,48 @@
+import django_filters
+from django.db.models import Q
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Ad
+
+
+class AdFilter(django_filters.FilterSet):
+    """
+    Фильтры для списка объявлений.
+
+    - title: Точное совпадение названия.
+    - price_min, price_max: Диапазон цены (включительно).
+    - author: ID автора объявления.
+    - created_after, created_before: Диапазон даты создания (ISO 8601).
+    """
+
+    price_min = django_filters.NumberFilter(field_name="price", lookup_expr="gte")  # Минимальная цена
+    price_max = django_filters.NumberFilter(field_name="price", lookup_expr="lte")  # Максимальная цена
+    author = django_filters.NumberFilter(field_name="author_id")  # ID автора без загрузки пользователя
+    created_after = django_filters.IsoDateTimeFilter(field_name="created_at", lookup_expr="gte")  # Создано не раньше
+    created_before = django_filters.IsoDateTimeFilter(field_name="created_at", lookup_expr="lt")  # Создано раньше
+
+    class Meta:
+        model = Ad
+        fields = ["title"]
+
+
+class MineFilterBackend(BaseFilterBackend):
+    """
+    Фильтр «мои объекты»: при ?mine=true оставляет только объекты текущего пользователя.
+
+    Проверка выполняется в SQL по полям из атрибута представления mine_fields
+    (по умолчанию owner и author), а не отдельной проверкой каждого объекта.
+    Анонимный пользователь с ?mine=true получает пустой список.
+    """
+
+    param = "mine"  # Имя параметра запроса
+
+    def filter_queryset(self, request, queryset, view):
+        if request.query_params.get(self.param, "").lower() not in ("1", "true"):
+            return queryset
+        if not request.user.is_authenticated:
+            return queryset.none()
+        condition = Q()
+        for field in getattr(view, "mine_fields", ("owner", "author")):
+            condition |= Q(**{f"{field}_id": request.user.pk})
+        return queryset.filter(condition)
@@ -0,0 +1,133 @@
+"""
+Повтор запросов на создание с заголовком Idempotency-Key.
+
+Клиент на ненадёжной сети не знает, дошёл ли его POST, и повторяет его. Если
+запрос пришёл с заголовком Idempotency-Key, ключ записывается в IdempotencyKey
+в одной транзакции с создаваемым объектом, а после создания в ту же запись
+сохраняется ответ. Проверка нового ключа - сама вставка: уникальное
+ограничение (user, scope, key) проверяется по индексу, и только при его
+нарушении (повторе) запись читается, а клиент получает сохранённый ответ с
+заголовком Idempotent-Replayed вместо второго объекта.
+
+Одновременный повтор ждёт на уникальном индексе, пока первый запрос не
+зафиксирует транзакцию, и получает его ответ; если первый запрос завершился
+ошибкой, транзакция откатывается вместе с ключом и повтор выполняется заново.
+Повтор с тем же ключом, но другим телом запроса отклоняется с кодом 422.
+
+Ключ действует ADS_IDEMPOTENCY["TTL"] секунд; истёкшие записи удаляет команда
+prune_idempotency_keys.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "Ключ Idempotency-Key уже использован для запроса с другим телом."
+    default_code = "idempotency_key_reused"
+
+
+class IdempotencyKeyInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Запрос с этим ключом Idempotency-Key ещё выполняется."
+    default_code = "idempotency_key_in_progress"
+
+
+def fingerprint(data):
+    """
+    Хэш тела запроса, не зависящий от порядка ключей.
+    """
+    return hashlib.blake2b(json.dumps(data, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+
+def claim(user, scope, key, digest):
+    """
+    Записывает ключ запроса.
+
+    :return: (запись, True) для нового ключа или (запись первого запроса, False) для повтора.
+    """
+    lookup = {"user": user, "scope": scope, "key": key}
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(**lookup, fingerprint=digest), True
+    except IntegrityError:
+        pass
+    expired = timezone.now() - timedelta(seconds=settings.ADS_IDEMPOTENCY["TTL"])
+    record = IdempotencyKey.objects.filter(**lookup).first()
+    if record is not None and record.created_at > expired:
+        return record, False
+    # Ключ истёк, но ещё не удалён командой prune_idempotency_keys: запрос выполняется как новый
+    IdempotencyKey.objects.filter(**lookup, created_at__lte=expired).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(**lookup, fingerprint=digest), True
+    except IntegrityError:
+        # Одновременный повтор тоже удалил истёкший ключ и записал свой раньше: это повтор его запроса
+        return IdempotencyKey.objects.get(**lookup), False
+
+
+def prune_expired(batch_size):
+    """
+    Удаляет пачками истёкшие ключи.
+
+    :return: Количество удалённых записей.
+    """
+    deleted = 0
+    cutoff = timezone.now() - timedelta(seconds=settings.ADS_IDEMPOTENCY["TTL"])
+    expired = IdempotencyKey.objects.filter(created_at__lte=cutoff).order_by().values_list("pk", flat=True)
+    while True:
+        ids = list(expired[:batch_size])
+        if not ids:
+            return deleted
+        IdempotencyKey.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+
+
+class IdempotentCreateMixin:
+    """
+    Подмешивается перед CreateAPIView или ModelViewSet: повтор POST с тем же
+    Idempotency-Key возвращает сохранённый ответ. Запрос без заголовка
+    обрабатывается как обычно.
+    """
+
+    idempotency_scope = None  # Имя представления в таблице ключей
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: [f"Ключ должен быть непустым и не длиннее {MAX_KEY_LENGTH} символов."]})
+
+        digest = fingerprint(request.data)
+        with transaction.atomic():
+            record, created = claim(request.user, self.idempotency_scope, key, digest)
+            if not created:
+                return self.replay(record, digest)
+            # Ошибка при создании откатывает и ключ: повтор с ним выполнится заново
+            response = super().create(request, *args, **kwargs)
+            record.status_code, record.response = response.status_code, response.data
+            record.save(update_fields=["status_code", "response"])
+        return response
+
+    def replay(self, record, digest):
+        if record.fingerprint != digest:
+            raise IdempotencyKeyReused()
+        if record.status_code is None:
+            raise IdempotencyKeyInProgress()
+        headers = {**self.get_success_headers(record.response), "Idempotent-Replayed": "true"}
+        return Response(record.response, status=record.status_code, headers=headers)
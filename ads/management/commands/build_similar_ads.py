@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from ads.similar import build_similar, current_version, update_similar
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает похожие объявления для /ads/<id>/similar/. С --incremental добавляет только "
+        "объявления, созданные после прошлого запуска (например, по расписанию между полными перестройками)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Добавить новые объявления к существующему индексу вместо полной перестройки",
+        )
+
+    def handle(self, *args, **options):
+        if options["incremental"]:
+            if current_version(settings.SIMILAR_ADS["DIR"]) is None:
+                raise CommandError("Индекс ещё не построен: запустите команду без --incremental.")
+            self.stdout.write(f"Добавлено объявлений: {update_similar()}")
+        else:
+            self.stdout.write(f"Объявлений в индексе: {build_similar()}")
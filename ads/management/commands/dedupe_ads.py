@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from ads import retention
+from ads.ad_cache import invalidate_ads
+from ads.dedup import duplicate_groups, index_missing
+from ads.models import Ad
+
+
+class Command(BaseCommand):
+    help = (
+        "Ищет почти одинаковые объявления каждого автора по LSH-корзинам и отмечает повторы "
+        "(duplicate_of, скрываются из списка) или удаляет их пакетно. Самое раннее объявление группы остаётся."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delete", action="store_true", help="Удалить повторы вместо отметки")
+        parser.add_argument("--batch-size", type=int, default=settings.PURGE_BATCH_SIZE, help="Размер пачки")
+        parser.add_argument(
+            "--pause", type=float, default=settings.PURGE_BATCH_PAUSE, help="Пауза между пачками удаления в секундах"
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать повторы")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        # Объявления, созданные до появления поиска повторов, сначала получают сигнатуры
+        indexed = index_missing(batch_size)
+        if indexed:
+            self.stdout.write(f"Посчитано сигнатур: {indexed}")
+
+        groups = duplicate_groups()
+        duplicates = sum(len(ids) for ids in groups.values())
+        if options["dry_run"]:
+            self.stdout.write(f"Найдено групп: {len(groups)}, повторов: {duplicates}")
+            return
+
+        if options["delete"]:
+            ids = [ad_id for ids in groups.values() for ad_id in ids]
+            deleted, reviews = retention.purge_ads(Ad.objects.filter(pk__in=ids), batch_size, options["pause"])
+            self.stdout.write(self.style.SUCCESS(f"Удалено повторов: {deleted}, отзывов: {reviews}"))
+            return
+
+        for original, ids in groups.items():
+            for start in range(0, len(ids), batch_size):
+                # update() не обновляет auto_now: без updated_at лента /ads/changes/ не увидела бы отметку.
+                # Уже отмеченные повторы не трогаются, чтобы не попадать в ленту при каждом запуске
+                Ad.objects.filter(pk__in=ids[start : start + batch_size]).exclude(duplicate_of_id=original).update(
+                    duplicate_of_id=original, updated_at=timezone.now()
+                )
+                invalidate_ads(ids[start : start + batch_size])  # Повторы пропадут из закэшированной первой страницы
+        self.stdout.write(self.style.SUCCESS(f"Отмечено повторов: {duplicates} в {len(groups)} группах"))
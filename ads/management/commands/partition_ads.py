@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from ads import partitioning
+from ads.models import Ad
+
+
+class Command(BaseCommand):
+    help = (
+        "Помесячное секционирование объявлений в PostgreSQL: "
+        "convert - перевести ads_ad на секции, create - создать будущие секции, "
+        "archive - выгрузить и удалить секции старше срока хранения, "
+        "verify - проверить отсечение секций для запросов списка и детали."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["convert", "create", "archive", "verify"])
+        parser.add_argument("--months-ahead", type=int, default=3, help="Сколько будущих месяцев держать готовыми")
+        parser.add_argument(
+            "--retention-months",
+            type=int,
+            default=settings.ADS_PARTITION_RETENTION_MONTHS,
+            help="Секции старше стольких месяцев архивируются",
+        )
+        parser.add_argument("--dir", default=settings.ADS_PARTITION_ARCHIVE_DIR, help="Каталог для архивов")
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет архивировано")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Секционирование поддерживается только для PostgreSQL.")
+
+        action = options["action"]
+        now = timezone.now()
+        if action == "convert":
+            if partitioning.is_partitioned():
+                raise CommandError("Таблица ads_ad уже секционирована.")
+            created = partitioning.convert(now, options["months_ahead"])
+            self.stdout.write(self.style.SUCCESS(f"ads_ad секционирована, созданы секции: {', '.join(created)}"))
+            return
+
+        if not partitioning.is_partitioned():
+            raise CommandError("Таблица ads_ad не секционирована, сначала выполните partition_ads convert.")
+
+        if action == "create":
+            created = partitioning.create_partitions(now, options["months_ahead"])
+            self.stdout.write(f"Созданы секции: {', '.join(created) or 'нет'}")
+        elif action == "archive":
+            for name in partitioning.expired_partitions(now, options["retention_months"]):
+                if options["dry_run"]:
+                    self.stdout.write(f"Будет архивирована секция {name}")
+                    continue
+                paths = partitioning.archive_partition(name, options["dir"])
+                self.stdout.write(f"Секция {name} архивирована: {', '.join(str(path) for path in paths)}")
+        else:
+            self.verify(now)
+
+    def verify(self, now):
+        partitions = partitioning.list_partitions()
+        self.stdout.write(f"Всего секций: {len(partitions)}")
+
+        # Первая страница списка: упорядоченный обход секций останавливается на самых новых
+        first_page = Ad.objects.order_by("-created_at")[:4]
+        # Список с начала прошлого месяца: остальные секции отсекаются на этапе планирования
+        last_month = Ad.objects.filter(created_at__gte=partitioning.add_months(now, -1)).order_by("-created_at")[:4]
+        # Деталь по id без created_at проверяет индекс каждой секции
+        detail = Ad.objects.filter(pk=0)
+
+        for label, queryset in (("список", first_page), ("список за месяц", last_month), ("деталь", detail)):
+            planned, scanned = partitioning.explain_partitions(queryset)
+            self.stdout.write(
+                f"{label}: в плане {len(planned)} секций, прочитано {len(scanned)}: {', '.join(scanned) or '-'}"
+            )
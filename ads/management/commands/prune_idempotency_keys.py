@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from ads.idempotency import prune_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет ключи Idempotency-Key старше ADS_IDEMPOTENCY['TTL'] вместе с сохранёнными ответами, "
+        "например раз в сутки по расписанию."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.PURGE_BATCH_SIZE, help="Размер пачки")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Удалено записей: {prune_expired(options['batch_size'])}")
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from ads import retention
+from ads.models import Review
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Пакетно удаляет объявления и отзывы старше срока хранения и/или принадлежащие "
+        "деактивированным пользователям, не загружая каскад в память."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, help="Удалить объявления и отзывы старше N дней")
+        parser.add_argument(
+            "--inactive-users", action="store_true", help="Удалить объявления и отзывы деактивированных пользователей"
+        )
+        parser.add_argument(
+            "--delete-users", action="store_true", help="Удалить и самих деактивированных пользователей"
+        )
+        parser.add_argument("--batch-size", type=int, default=settings.PURGE_BATCH_SIZE, help="Размер пачки")
+        parser.add_argument(
+            "--pause", type=float, default=settings.PURGE_BATCH_PAUSE, help="Пауза между пачками в секундах"
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать, что будет удалено")
+
+    def handle(self, *args, **options):
+        days = options["older_than_days"]
+        inactive_users = options["inactive_users"] or options["delete_users"]
+        if days is None and not inactive_users:
+            raise CommandError("Укажите --older-than-days и/или --inactive-users.")
+
+        cutoff = timezone.now() - timedelta(days=days) if days is not None else None
+        ads, reviews = retention.retention_querysets(cutoff=cutoff, inactive_users=inactive_users)
+        users = User.objects.filter(is_active=False) if options["delete_users"] else User.objects.none()
+
+        if options["dry_run"]:
+            affected_reviews = Review.objects.filter(Q(id__in=reviews.values("id")) | Q(ad_id__in=ads.values("id")))
+            stats = {"ads": ads.count(), "reviews": affected_reviews.count(), "users": users.count()}
+            batches = sum(-(-count // options["batch_size"]) for count in stats.values())
+            self.stdout.write(
+                f"Будет удалено: объявлений {stats['ads']}, отзывов {stats['reviews']}, "
+                f"деактивированных пользователей {stats['users']}; пачек не меньше {batches}"
+            )
+            return
+
+        batch_size, pause = options["batch_size"], options["pause"]
+        deleted_reviews = retention.purge_reviews(reviews, batch_size, pause)
+        deleted_ads, cascaded_reviews = retention.purge_ads(ads, batch_size, pause)
+        stats = retention.purge_users(users, batch_size, pause)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Удалено: объявлений {deleted_ads + stats['ads']}, "
+                f"отзывов {deleted_reviews + cascaded_reviews + stats['reviews']}, пользователей {stats['users']}"
+            )
+        )
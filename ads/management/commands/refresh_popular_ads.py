@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from ads.popularity import refresh_popular
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает список самых популярных объявлений для /ads/popular/ "
+        "(запускать по расписанию, например раз в минуту)."
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Популярных объявлений: {refresh_popular()}")
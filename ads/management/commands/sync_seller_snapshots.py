@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from ads.models import Ad
+from ads.snapshots import sync_sellers
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересинхронизирует копию имени и аватара продавца во всех объявлениях "
+        "(после миграции или если фоновое обновление не успело выполниться)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.ADS_SELLER_SNAPSHOT["BATCH_SIZE"], help="Размер пачки"
+        )
+
+    def handle(self, *args, **options):
+        author_ids = Ad.objects.order_by().values_list("author_id", flat=True).distinct().iterator()
+        updated, chunk = 0, []
+        for author_id in author_ids:
+            chunk.append(author_id)
+            if len(chunk) >= options["batch_size"]:
+                updated += sync_sellers(chunk, options["batch_size"])
+                chunk = []
+        updated += sync_sellers(chunk, options["batch_size"])
+        self.stdout.write(f"Обновлено объявлений: {updated}")
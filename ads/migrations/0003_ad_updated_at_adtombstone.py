@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-19 09:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ads", "0002_ad_owner_review_owner"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ad",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name="AdTombstone",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("ad_id", models.BigIntegerField()),
+                ("deleted_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Удалённое объявление",
+                "verbose_name_plural": "Удалённые объявления",
+                "indexes": [models.Index(fields=["deleted_at", "ad_id"], name="adtombstone_deleted_at_idx")],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="ad",
+            index=models.Index(fields=["updated_at", "id"], name="ad_updated_at_id_idx"),
+        ),
+    ]
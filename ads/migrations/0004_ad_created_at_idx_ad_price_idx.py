@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ads", "0003_ad_updated_at_adtombstone"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ad",
+            index=models.Index(fields=["created_at"], name="ad_created_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="ad",
+            index=models.Index(fields=["price"], name="ad_price_idx"),
+        ),
+    ]
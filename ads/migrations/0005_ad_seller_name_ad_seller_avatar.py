@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ads", "0004_ad_created_at_idx_ad_price_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ad",
+            name="seller_avatar",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.AddField(
+            model_name="ad",
+            name="seller_name",
+            field=models.CharField(blank=True, default="", max_length=61),
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.db import migrations
+
+# Триграммные индексы для поиска в админке: icontains в PostgreSQL выполняется
+# как UPPER(col::text) LIKE UPPER('%...%'), поэтому индекс строится по этому же выражению.
+# Индексы создаются без блокировки записи (CONCURRENTLY), поэтому миграция не атомарна.
+# Для секционированной таблицы (manage.py partition_ads convert) CONCURRENTLY не поддерживается:
+# индекс родителя создаётся ON ONLY, индексы секций - CONCURRENTLY, затем присоединяются к нему.
+INDEXES = {
+    "ad_title_trgm_idx": ("ads_ad", "title"),
+    "review_text_trgm_idx": ("ads_review", "text"),
+}
+
+
+def partitions(schema_editor, table):
+    """
+    Возвращает секции таблицы или None, если таблица не секционирована.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [table])
+        if cursor.fetchone() != ("p",):
+            return None
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, (table, column) in INDEXES.items():
+        method = f"USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+        children = partitions(schema_editor, table)
+        if children is None:
+            schema_editor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {method}")
+            continue
+        # Индекс только родителя недействителен, пока к нему не присоединены индексы всех секций
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} {method}")
+        for child in children:
+            child_name = f"{child}_{column}_trgm"
+            schema_editor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child_name} ON {child} {method}")
+            schema_editor.execute(f"ALTER INDEX {name} ATTACH PARTITION {child_name}")
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, (table, _) in INDEXES.items():
+        # Индекс секционированной таблицы удаляется вместе с индексами секций, но не CONCURRENTLY
+        concurrently = "" if partitions(schema_editor, table) is not None else "CONCURRENTLY "
+        schema_editor.execute(f"DROP INDEX {concurrently}IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("ads", "0005_ad_seller_name_ad_seller_avatar"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
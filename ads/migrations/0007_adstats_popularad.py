@@ -0,0 +1,59 @@
+# Generated by Django 4.2 on 2026-10-19 11:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ads", "0006_admin_search_trgm_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AdStats",
+            fields=[
+                (
+                    "ad",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="ads.ad",
+                    ),
+                ),
+                ("views", models.PositiveBigIntegerField(default=0)),
+                ("score", models.FloatField(default=0)),
+                ("epoch", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Статистика объявления",
+                "verbose_name_plural": "Статистика объявлений",
+            },
+        ),
+        migrations.CreateModel(
+            name="PopularAd",
+            fields=[
+                ("position", models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ("score", models.FloatField()),
+                (
+                    "ad",
+                    models.ForeignKey(
+                        db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name="+", to="ads.ad"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Популярное объявление",
+                "verbose_name_plural": "Популярные объявления",
+                "ordering": ["position"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="adstats",
+            index=models.Index(fields=["epoch", "-score"], name="adstats_epoch_score_idx"),
+        ),
+    ]
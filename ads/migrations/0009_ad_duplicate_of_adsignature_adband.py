@@ -0,0 +1,76 @@
+# Generated by Django 4.2 on 2026-10-19 11:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("ads", "0008_savedsearch_savedsearchmatch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AdSignature",
+            fields=[
+                (
+                    "ad",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="signature",
+                        serialize=False,
+                        to="ads.ad",
+                    ),
+                ),
+                ("signature", models.BinaryField()),
+            ],
+            options={
+                "verbose_name": "Сигнатура объявления",
+                "verbose_name_plural": "Сигнатуры объявлений",
+            },
+        ),
+        migrations.AddField(
+            model_name="ad",
+            name="duplicate_of",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="duplicates",
+                to="ads.ad",
+            ),
+        ),
+        migrations.CreateModel(
+            name="AdBand",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("key", models.BigIntegerField()),
+                (
+                    "ad",
+                    models.ForeignKey(
+                        db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name="+", to="ads.ad"
+                    ),
+                ),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to=settings.AUTH_USER_MODEL
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Корзина объявления",
+                "verbose_name_plural": "Корзины объявлений",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="adband",
+            index=models.Index(fields=["author", "key"], name="adband_author_key_idx"),
+        ),
+    ]
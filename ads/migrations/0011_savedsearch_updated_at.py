@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ads", "0010_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="savedsearch",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
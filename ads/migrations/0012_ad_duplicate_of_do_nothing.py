@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-19 12:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ads", "0011_savedsearch_updated_at"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ad",
+            name="duplicate_of",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="duplicates",
+                to="ads.ad",
+            ),
+        ),
+    ]
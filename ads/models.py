@@ -1,4 +1,5 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth import get_user_model
 
 User = get_user_model()  # Получаем модель пользователя
@@ -16,6 +17,13 @@ class Ad(models.Model):
     - description: Описание товара.
     - author: Пользователь, который создал объявление.
     - created_at: Время и дата создания объявления.
+    - updated_at: Время и дата последнего изменения объявления.
+    - seller_name, seller_avatar: Копия имени и пути аватара автора для списков
+      без JOIN с пользователями (обновляется ads.snapshots при изменении пользователя).
+    - duplicate_of: Объявление того же автора, почти повтором которого является это
+      (см. ads/dedup.py); такие объявления не показываются в списке. После удаления
+      исходного объявления повторы остаются скрытыми: ссылка не обнуляется ни при
+      удалении через ORM, ни при пакетной очистке и архивации секций.
     """
 
     title = models.CharField(max_length=255)  # Название товара
@@ -23,17 +31,32 @@ class Ad(models.Model):
     description = models.TextField()  # Описание товара
     author = models.ForeignKey(User, on_delete=models.CASCADE)  # Пользователь, который создал объявление
     created_at = models.DateTimeField(auto_now_add=True)  # Время и дата создания объявления
+    updated_at = models.DateTimeField(auto_now=True)  # Время и дата последнего изменения объявления
     owner = models.ForeignKey(
         User,
         related_name="ads",
         on_delete=models.CASCADE,
         **NULLABLE,
     )  # владелец объявления
+    seller_name = models.CharField(max_length=61, blank=True, default="")  # Имя и фамилия автора (копия)
+    seller_avatar = models.CharField(max_length=100, blank=True, default="")  # Путь к аватару автора (копия)
+    duplicate_of = models.ForeignKey(
+        "self",
+        related_name="duplicates",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        **NULLABLE,
+    )  # Исходное объявление, если это почти повтор
 
     class Meta:
         ordering = ["-created_at"]  # Сортировка по дате создания (чем новее, тем выше)
         verbose_name = "Объявление"
         verbose_name_plural = "Объявления"
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="ad_updated_at_id_idx"),  # Лента изменений /ads/changes/
+            models.Index(fields=["created_at"], name="ad_created_at_idx"),  # Сортировка и фильтр по дате создания
+            models.Index(fields=["price"], name="ad_price_idx"),  # Сортировка, фильтр и гистограмма по цене
+        ]
 
     def __str__(self):
         """
@@ -79,3 +102,228 @@ class Review(models.Model):
         :return: Строка с информацией об отзыве.
         """
         return f"Review by {self.author} on {self.ad.title}"  # Возвращаем строку с информацией об отзыве
+
+
+class AdTombstone(models.Model):
+    """
+    Запись об удалённом объявлении.
+
+    Заполняется сигналом post_delete модели Ad, чтобы лента изменений
+    могла сообщить клиентам об удалении, не храня само объявление.
+
+    Поля:
+    - ad_id: ID удалённого объявления.
+    - deleted_at: Время и дата удаления.
+    """
+
+    ad_id = models.BigIntegerField()  # ID удалённого объявления
+    deleted_at = models.DateTimeField(auto_now_add=True)  # Время и дата удаления
+
+    class Meta:
+        verbose_name = "Удалённое объявление"
+        verbose_name_plural = "Удалённые объявления"
+        indexes = [
+            models.Index(fields=["deleted_at", "ad_id"], name="adtombstone_deleted_at_idx"),
+        ]
+
+    def __str__(self):
+        """
+        Возвращает строковое представление записи об удалении.
+
+        :return: Строка с ID удалённого объявления.
+        """
+        return f"Ad {self.ad_id} deleted at {self.deleted_at}"
+
+
+class AdStats(models.Model):
+    """
+    Счётчик просмотров и популярность объявления.
+
+    Хранится отдельно от ads_ad, чтобы просмотры не обновляли строки объявлений
+    и не меняли их updated_at. Внешний ключ без ограничения в БД, как у отзывов
+    секционированной таблицы (см. ads/partitioning.py).
+
+    Поля:
+    - ad: Объявление.
+    - views: Общее количество просмотров.
+    - score: Популярность с затуханием относительно начала эпохи (см. ads/popularity.py).
+    - epoch: Номер эпохи, к которой приведён score.
+    """
+
+    ad = models.OneToOneField(
+        Ad, primary_key=True, related_name="stats", on_delete=models.CASCADE, db_constraint=False
+    )  # Объявление
+    views = models.PositiveBigIntegerField(default=0)  # Общее количество просмотров
+    score = models.FloatField(default=0)  # Популярность относительно начала эпохи
+    epoch = models.IntegerField(default=0)  # Номер эпохи
+
+    class Meta:
+        verbose_name = "Статистика объявления"
+        verbose_name_plural = "Статистика объявлений"
+        indexes = [
+            models.Index(fields=["epoch", "-score"], name="adstats_epoch_score_idx"),  # Отбор самых популярных
+        ]
+
+    def __str__(self):
+        return f"Ad {self.ad_id}: {self.views} views"
+
+
+class PopularAd(models.Model):
+    """
+    Заранее рассчитанный список самых популярных объявлений для /ads/popular/.
+
+    Поля:
+    - position: Место в списке, начиная с 1.
+    - ad: Объявление.
+    - score: Популярность на момент расчёта.
+    """
+
+    position = models.PositiveSmallIntegerField(primary_key=True)  # Место в списке
+    ad = models.ForeignKey(Ad, related_name="+", on_delete=models.CASCADE, db_constraint=False)  # Объявление
+    score = models.FloatField()  # Популярность на момент расчёта
+
+    class Meta:
+        ordering = ["position"]
+        verbose_name = "Популярное объявление"
+        verbose_name_plural = "Популярные объявления"
+
+    def __str__(self):
+        return f"{self.position}. Ad {self.ad_id}"
+
+
+class SavedSearch(models.Model):
+    """
+    Сохранённый поиск пользователя для уведомлений о новых объявлениях.
+
+    Поля:
+    - user: Владелец поиска.
+    - query: Слова, которые все должны встретиться в названии или описании.
+    - price_min, price_max: Диапазон цены (необязательный).
+    - created_at: Время и дата создания.
+    - updated_at: Время и дата изменения (по нему индекс поисков догружает изменения других процессов).
+    """
+
+    user = models.ForeignKey(User, related_name="saved_searches", on_delete=models.CASCADE)  # Владелец поиска
+    query = models.CharField(max_length=255, blank=True)  # Слова поиска
+    price_min = models.PositiveIntegerField(**NULLABLE)  # Минимальная цена
+    price_max = models.PositiveIntegerField(**NULLABLE)  # Максимальная цена
+    created_at = models.DateTimeField(auto_now_add=True)  # Время и дата создания
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Время и дата изменения
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Сохранённый поиск"
+        verbose_name_plural = "Сохранённые поиски"
+
+    def __str__(self):
+        return self.query or f"{self.price_min}-{self.price_max}"
+
+
+class SavedSearchMatch(models.Model):
+    """
+    Уведомление о новом объявлении, подходящем под сохранённый поиск.
+
+    Поля:
+    - search: Сохранённый поиск.
+    - ad: Подходящее объявление.
+    - created_at: Время и дата совпадения.
+    """
+
+    search = models.ForeignKey(SavedSearch, related_name="matches", on_delete=models.CASCADE)  # Сохранённый поиск
+    ad = models.ForeignKey(Ad, related_name="+", on_delete=models.CASCADE, db_constraint=False)  # Объявление
+    created_at = models.DateTimeField(auto_now_add=True)  # Время и дата совпадения
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Совпадение сохранённого поиска"
+        verbose_name_plural = "Совпадения сохранённых поисков"
+        constraints = [
+            models.UniqueConstraint(fields=["search", "ad"], name="savedsearchmatch_search_ad_unique"),
+        ]
+
+    def __str__(self):
+        return f"Search {self.search_id} matched ad {self.ad_id}"
+
+
+class AdSignature(models.Model):
+    """
+    MinHash-сигнатура текста объявления (см. ads/dedup.py).
+
+    Внешний ключ без ограничения в БД, как у статистики объявлений.
+
+    Поля:
+    - ad: Объявление.
+    - signature: Минимальные хэши шинглов, упакованные по 8 байт.
+    """
+
+    ad = models.OneToOneField(
+        Ad, primary_key=True, related_name="signature", on_delete=models.CASCADE, db_constraint=False
+    )  # Объявление
+    signature = models.BinaryField()  # Упакованная сигнатура
+
+    class Meta:
+        verbose_name = "Сигнатура объявления"
+        verbose_name_plural = "Сигнатуры объявлений"
+
+    def __str__(self):
+        return f"Signature of ad {self.ad_id}"
+
+
+class AdBand(models.Model):
+    """
+    LSH-корзина объявления: хэш одной полосы MinHash-сигнатуры.
+
+    Объявления автора с совпадающим хэшем хотя бы одной полосы - кандидаты в почти повторы.
+
+    Поля:
+    - ad: Объявление.
+    - author: Автор объявления (копия, чтобы искать кандидатов без JOIN).
+    - key: Хэш номера полосы и её значений.
+    """
+
+    ad = models.ForeignKey(Ad, related_name="+", on_delete=models.CASCADE, db_constraint=False)  # Объявление
+    author = models.ForeignKey(User, related_name="+", on_delete=models.CASCADE)  # Автор объявления
+    key = models.BigIntegerField()  # Хэш полосы
+
+    class Meta:
+        verbose_name = "Корзина объявления"
+        verbose_name_plural = "Корзины объявлений"
+        indexes = [
+            models.Index(fields=["author", "key"], name="adband_author_key_idx"),  # Поиск кандидатов автора
+        ]
+
+    def __str__(self):
+        return f"Band {self.key} of ad {self.ad_id}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Ключ Idempotency-Key запроса на создание и сохранённый ответ на него (см. ads/idempotency.py).
+
+    Поля:
+    - user: Пользователь, отправивший запрос (ключи разных пользователей не пересекаются).
+    - scope: Представление, к которому относится ключ.
+    - key: Значение заголовка Idempotency-Key.
+    - fingerprint: Хэш тела запроса, чтобы не вернуть ответ на другой запрос с тем же ключом.
+    - status_code: Код ответа.
+    - response: Тело ответа.
+    - created_at: Дата и время первого запроса (по ней истекает ключ).
+    """
+
+    user = models.ForeignKey(User, related_name="+", on_delete=models.CASCADE)  # Пользователь
+    scope = models.CharField(max_length=32)  # Представление
+    key = models.CharField(max_length=255)  # Значение заголовка
+    fingerprint = models.CharField(max_length=32)  # Хэш тела запроса
+    status_code = models.PositiveSmallIntegerField(null=True)  # Код ответа
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)  # Тело ответа
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)  # Дата и время первого запроса
+
+    class Meta:
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "scope", "key"], name="idempotencykey_user_scope_key_unique"),
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key} of user {self.user_id}"
@@ -0,0 +1,255 @@
+"""
+Помесячное секционирование таблицы объявлений в PostgreSQL (по желанию).
+
+Таблица ads_ad превращается в секционированную по диапазону created_at:
+существующие строки остаются в секции ads_ad_p_legacy (до начала следующего
+месяца), новые строки попадают в помесячные секции ads_ad_pYYYY_MM.
+
+Ограничения PostgreSQL, которые учитывает схема:
+- первичный ключ секционированной таблицы обязан включать ключ секционирования,
+  поэтому он становится (id, created_at), а id выдаётся отдельной последовательностью;
+- внешний ключ ads_review.ad_id -> ads_ad.id невозможен без уникальности id,
+  поэтому ограничение в БД снимается. Каскадное удаление отзывов выполняет
+  коллектор Django (on_delete=CASCADE), а при архивации секции её отзывы
+  архивируются и удаляются вместе с объявлениями.
+
+Отзывы (ads_review) не секционируются: ключом секции была бы дата создания
+объявления, которой в таблице отзывов нет, а её копирование в каждый отзыв
+потребовало бы переписать всю таблицу. ads_review остаётся одной таблицей;
+отзывы архивируемой секции выгружаются и удаляются вместе с ней.
+
+Верхняя граница legacy-секции хранится в комментарии к ней (COMMENT ON TABLE),
+чтобы не разбирать текст pg_get_expr(relpartbound).
+"""
+
+import gzip
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.db import connection, transaction
+
+from .ad_cache import invalidate_ads
+
+TABLE = "ads_ad"
+LEGACY_PARTITION = "ads_ad_p_legacy"
+SEQUENCE = "ads_ad_id_seq"
+
+
+def month_start(moment):
+    """
+    Возвращает начало месяца (UTC) для указанного момента.
+    """
+    moment = moment.astimezone(timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(moment, months):
+    """
+    Сдвигает начало месяца на указанное количество месяцев.
+    """
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(start):
+    """
+    Возвращает имя помесячной секции, например ads_ad_p2024_11.
+    """
+    return f"{TABLE}_p{start:%Y_%m}"
+
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def list_partitions():
+    """
+    Возвращает имена секций ads_ad по возрастанию.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            ORDER BY child.relname
+            """,
+            [TABLE],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def convert(now, months_ahead):
+    """
+    Превращает ads_ad в секционированную таблицу. Выполняется одной транзакцией
+    под эксклюзивной блокировкой; данные не копируются, старая таблица
+    присоединяется как секция ads_ad_p_legacy.
+    """
+    boundary = add_months(month_start(now), 1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {TABLE}, ads_review IN ACCESS EXCLUSIVE MODE")
+
+        # Снимаем внешний ключ отзывов и переносим остальные ограничения на родителя
+        cursor.execute(
+            """
+            SELECT conname, conrelid::regclass::text, contype, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE (conrelid = %s::regclass AND contype IN ('p', 'f'))
+               OR (conrelid = 'ads_review'::regclass AND confrelid = %s::regclass)
+            """,
+            [TABLE, TABLE],
+        )
+        constraints = cursor.fetchall()
+        for name, table, _, _ in constraints:
+            cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+
+        cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s", [TABLE])
+        indexes = cursor.fetchall()
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_PARTITION}")
+        cursor.execute(f"ALTER TABLE {LEGACY_PARTITION} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute(f"ALTER TABLE {LEGACY_PARTITION} ALTER COLUMN id DROP DEFAULT")
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX "{name}" RENAME TO "{name[:55]}_legacy"')
+
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {LEGACY_PARTITION} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            "PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE}")
+        cursor.execute(f"CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id")
+        cursor.execute(f"SELECT setval('{SEQUENCE}', COALESCE(MAX(id), 0) + 1, false) FROM {LEGACY_PARTITION}")
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, created_at)")
+        for name, table, contype, definition in constraints:
+            if table == TABLE and contype == "f":
+                cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT "{name}" {definition}')
+
+        # Индексы родителя создаются заново; совпадающие индексы legacy-секции присоединяются без перестроения
+        for name, definition in indexes:
+            cursor.execute(definition.replace(f" ON public.{TABLE} ", f" ON {TABLE} "))
+
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {LEGACY_PARTITION} FOR VALUES FROM (MINVALUE) TO (%s)",
+            [boundary],
+        )
+        cursor.execute(f"COMMENT ON TABLE {LEGACY_PARTITION} IS %s", [boundary.isoformat()])
+    return create_partitions(now, months_ahead)
+
+
+def legacy_upper_bound():
+    """
+    Возвращает верхнюю границу legacy-секции или None, если её нет.
+    """
+    with connection.cursor() as cursor:
+        # Граница записана в комментарий секции при convert в формате ISO 8601
+        cursor.execute(
+            "SELECT obj_description(oid, 'pg_class')::timestamptz FROM pg_class WHERE relname = %s",
+            [LEGACY_PARTITION],
+        )
+        row = cursor.fetchone()
+    return row[0] if row is not None else None
+
+
+def create_partitions(now, months_ahead):
+    """
+    Создаёт недостающие помесячные секции от текущего месяца на months_ahead месяцев вперёд.
+    Месяцы, ещё покрытые legacy-секцией, пропускаются.
+
+    :return: Список имён созданных секций.
+    """
+    existing = set(list_partitions())
+    floor = legacy_upper_bound()
+    created = []
+    with connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            lower = add_months(month_start(now), offset)
+            name = partition_name(lower)
+            if name in existing or (floor is not None and lower < floor):
+                continue
+            cursor.execute(
+                f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)",
+                [lower, add_months(lower, 1)],
+            )
+            created.append(name)
+    return created
+
+
+def archive_partition(name, directory):
+    """
+    Отсоединяет секцию, выгружает её объявления и их отзывы в сжатые CSV,
+    оставляет записи об удалении для ленты изменений и удаляет секцию.
+
+    DROP TABLE не отправляет post_delete, а у связанных таблиц нет ограничения
+    внешнего ключа в БД, поэтому их строки и кэш архивированных объявлений
+    удаляются здесь же, в той же транзакции.
+
+    :return: Список путей созданных архивов.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    ads_path = directory / f"{name}.csv.gz"
+    reviews_path = directory / f"{name}_reviews.csv.gz"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+        cursor.execute(f"SELECT id FROM {name}")
+        ids = [row[0] for row in cursor.fetchall()]
+        with gzip.open(ads_path, "wb") as archive:
+            cursor.copy_expert(f"COPY (SELECT * FROM {name} ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)", archive)
+        reviews = f"SELECT * FROM ads_review WHERE ad_id IN (SELECT id FROM {name})"
+        with gzip.open(reviews_path, "wb") as archive:
+            cursor.copy_expert(f"COPY ({reviews} ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)", archive)
+        for table in (
+            "ads_review",
+            "ads_adsignature",
+            "ads_adband",
+            "ads_adstats",
+            "ads_popularad",
+            "ads_savedsearchmatch",
+        ):
+            cursor.execute(f"DELETE FROM {table} WHERE ad_id IN (SELECT id FROM {name})")
+        cursor.execute(f"INSERT INTO ads_adtombstone (ad_id, deleted_at) SELECT id, now() FROM {name}")
+        cursor.execute(f"DROP TABLE {name}")
+        invalidate_ads(ids)
+    return [ads_path, reviews_path]
+
+
+def expired_partitions(now, retention_months):
+    """
+    Возвращает помесячные секции, которые целиком старше срока хранения.
+    """
+    cutoff = add_months(month_start(now), -retention_months)
+    return [name for name in list_partitions() if name != LEGACY_PARTITION and name < partition_name(cutoff)]
+
+
+def explain_partitions(queryset):
+    """
+    Выполняет EXPLAIN ANALYZE запроса и возвращает пару
+    (секции в плане, секции, которые реально читались).
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    planned, scanned = set(), set()
+
+    def walk(node):
+        relation = node.get("Relation Name")
+        if relation and relation.startswith(f"{TABLE}_p"):
+            planned.add(relation)
+            if node.get("Actual Loops", 0) > 0:
+                scanned.add(relation)
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return sorted(planned), sorted(scanned)
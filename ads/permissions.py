@@ -1,7 +1,33 @@
 from rest_framework import permissions
 
 
-class IsOwner(permissions.BasePermission):
+class CachedObjectPermission(permissions.BasePermission):
+    """
+    Базовое разрешение с запоминанием результата проверки объекта в рамках запроса.
+
+    Составные разрешения (например, IsOwner | IsAdminOrReadOnly | IsAuthor) и
+    повторные вызовы check_object_permissions могут проверять один и тот же
+    объект несколько раз; результат для пары (класс разрешения, объект)
+    хранится на объекте запроса и вычисляется один раз.
+    """
+
+    def has_object_permission(self, request, view, obj):
+        cache = getattr(request, "_object_permission_cache", None)
+        if cache is None:
+            cache = request._object_permission_cache = {}
+        key = (type(self), obj._meta.label, obj.pk)
+        if key not in cache:
+            cache[key] = self.check_object(request, obj)
+        return cache[key]
+
+    def check_object(self, request, obj):
+        """
+        Выполняет саму проверку объекта. Переопределяется в наследниках.
+        """
+        return True
+
+
+class IsOwner(CachedObjectPermission):
     """
     Разрешение, позволяющее редактировать или удалять только свои объекты.
 
@@ -10,16 +36,18 @@ class IsOwner(permissions.BasePermission):
     не является владельцем, доступ будет запрещен.
     """
 
-    def has_object_permission(self, request, view, obj):
+    def check_object(self, request, obj):
         """
         Проверяет, имеет ли пользователь разрешение на доступ к объекту.
 
+        Сравниваются ID, поэтому связанный пользователь не загружается из базы.
+
         :param request: Объект запроса, содержащий информацию о текущем пользователе.
-        :param view: Представление, в котором выполняется проверка разрешений.
         :param obj: Объект, к которому пользователь пытается получить доступ.
         :return: True, если пользователь является владельцем объекта, иначе False.
         """
-        return obj.owner == request.user  # Проверяем, совпадает ли владелец объекта с текущим пользователем
+        # Проверяем, совпадает ли владелец объекта с текущим пользователем
+        return request.user.is_authenticated and obj.owner_id == request.user.pk
 
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -47,6 +75,10 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         return request.user and request.user.is_staff  # Проверяем, является ли пользователь администратором
 
 
-class IsAuthor(permissions.BasePermission):
-    def has_object_permission(self, request, view, obj):
-        return obj.author == request.user
+class IsAuthor(CachedObjectPermission):
+    """
+    Разрешение, позволяющее редактировать или удалять только объекты, автором которых является пользователь.
+    """
+
+    def check_object(self, request, obj):
+        return request.user.is_authenticated and obj.author_id == request.user.pk
@@ -0,0 +1,190 @@
+"""
+Счётчики просмотров и популярность объявлений.
+
+Просмотры не пишутся в БД по одному: ViewCounter накапливает их в памяти
+процесса и раз в ADS_POPULARITY["FLUSH_INTERVAL"] секунд записывает одним
+пакетным INSERT ... ON CONFLICT DO UPDATE в ads_adstats.
+
+Популярность - сумма просмотров с экспоненциальным затуханием (период
+полураспада HALF_LIFE). Чтобы обновлять её прибавлением, без пересчёта старых
+значений, вес просмотра считается относительно начала эпохи (EPOCH_HALF_LIVES
+периодов полураспада): просмотр в момент t весит 2 ** ((t - начало эпохи) / HALF_LIFE).
+Внутри эпохи порядок объявлений по такой сумме совпадает с порядком по
+затухающей популярности. При переходе в следующую эпоху накопленное значение
+умножается на 2 ** -EPOCH_HALF_LIVES; значения старше одной эпохи пренебрежимо малы
+и отбрасываются.
+
+Список самых популярных объявлений пересчитывается в таблицу ads_popularad,
+из которой читает /ads/popular/, командой refresh_popular_ads по расписанию.
+Пересчёт не выполняется в каждом процессе: N процессов повторяли бы одну и ту
+же работу и сталкивались бы на первичном ключе position при одновременной
+перезаписи таблицы.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from .models import Ad, AdStats, PopularAd
+
+logger = logging.getLogger(__name__)
+
+REFRESH_LOCK = 0x6164_706F  # Ключ pg_advisory_xact_lock пересчёта ads_popularad
+
+
+def epoch_length():
+    config = settings.ADS_POPULARITY
+    return config["HALF_LIFE"] * config["EPOCH_HALF_LIVES"]
+
+
+def epoch_factor():
+    """
+    Множитель, приводящий популярность прошлой эпохи к текущей.
+    """
+    return 2.0 ** -settings.ADS_POPULARITY["EPOCH_HALF_LIVES"]
+
+
+def view_weight(moment):
+    """
+    Возвращает пару (эпоха, вес просмотра) для момента времени (секунды Unix).
+    """
+    length = epoch_length()
+    epoch = int(moment // length)
+    return epoch, 2.0 ** ((moment - epoch * length) / settings.ADS_POPULARITY["HALF_LIFE"])
+
+
+def upsert_stats(rows, epoch):
+    """
+    Добавляет просмотры и популярность одним пакетным запросом.
+
+    Процессы записывают буферы независимо, поэтому на границе эпох пачка прошлой
+    эпохи может прийти после пачки новой: тогда она приводится к эпохе строки,
+    а эпоха строки не уменьшается.
+
+    :param rows: Список кортежей (ad_id, просмотры, популярность в эпохе epoch).
+    """
+    table = AdStats._meta.db_table
+    values = ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+    params = [value for ad_id, views, score in rows for value in (ad_id, views, score, epoch)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (ad_id, views, score, epoch) VALUES {values}
+            ON CONFLICT (ad_id) DO UPDATE SET
+                views = {table}.views + EXCLUDED.views,
+                score = CASE
+                    WHEN {table}.epoch = EXCLUDED.epoch THEN {table}.score + EXCLUDED.score
+                    WHEN {table}.epoch = EXCLUDED.epoch - 1 THEN {table}.score * %s + EXCLUDED.score
+                    WHEN {table}.epoch = EXCLUDED.epoch + 1 THEN {table}.score + EXCLUDED.score * %s
+                    WHEN {table}.epoch > EXCLUDED.epoch THEN {table}.score
+                    ELSE EXCLUDED.score
+                END,
+                epoch = CASE WHEN {table}.epoch > EXCLUDED.epoch THEN {table}.epoch ELSE EXCLUDED.epoch END
+            """,
+            [*params, epoch_factor(), epoch_factor()],
+        )
+
+
+def refresh_popular(now=None):
+    """
+    Пересчитывает таблицу самых популярных объявлений.
+
+    Кандидаты отбираются по индексу (epoch, -score) из текущей и прошлой эпох,
+    объявления, удалённые в обход ORM, пропускаются.
+
+    :return: Количество объявлений в списке.
+    """
+    top = settings.ADS_POPULARITY["TOP_SIZE"]
+    current = int((now if now is not None else time.time()) // epoch_length())
+    candidates = []
+    for epoch, factor in ((current, 1.0), (current - 1, epoch_factor())):
+        queryset = AdStats.objects.filter(epoch=epoch).order_by("-score").values_list("ad_id", "score")
+        candidates += [(score * factor, ad_id) for ad_id, score in queryset[: top * 2]]
+    candidates.sort(reverse=True)
+    existing = set(Ad.objects.filter(pk__in=[ad_id for _, ad_id in candidates]).values_list("pk", flat=True))
+    ranked = [(score, ad_id) for score, ad_id in candidates if ad_id in existing][:top]
+
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            # Пересекающиеся запуски перезаписывают таблицу по очереди
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [REFRESH_LOCK])
+        PopularAd.objects.all().delete()
+        PopularAd.objects.bulk_create(
+            PopularAd(position=position, ad_id=ad_id, score=score) for position, (score, ad_id) in enumerate(ranked, 1)
+        )
+    return len(ranked)
+
+
+class ViewCounter:
+    """
+    Буфер просмотров процесса с фоновой записью в БД.
+    """
+
+    def __init__(self):
+        self._pending = {}  # (эпоха, ad_id) -> [просмотры, популярность]
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, ad_id, moment=None):
+        epoch, weight = view_weight(moment if moment is not None else time.time())
+        with self._lock:
+            entry = self._pending.setdefault((epoch, ad_id), [0, 0.0])
+            entry[0] += 1
+            entry[1] += weight
+            if self._thread is None and settings.ADS_POPULARITY["BACKGROUND"]:
+                self._thread = threading.Thread(target=self.run, name="ad-view-counter", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def flush(self):
+        """
+        Записывает накопленные просмотры пачками по BATCH_SIZE строк.
+
+        :return: Количество записанных объявлений.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        # Просмотры, накопленные на границе эпох, приводятся к последней эпохе
+        epoch = max(key[0] for key in pending)
+        merged = {}
+        for (view_epoch, ad_id), (views, score) in pending.items():
+            entry = merged.setdefault(ad_id, [0, 0.0])
+            entry[0] += views
+            entry[1] += score * epoch_factor() ** (epoch - view_epoch)
+
+        rows = [(ad_id, views, score) for ad_id, (views, score) in merged.items()]
+        batch_size = settings.ADS_POPULARITY["BATCH_SIZE"]
+        for start in range(0, len(rows), batch_size):
+            try:
+                upsert_stats(rows[start : start + batch_size], epoch)
+            except Exception:
+                # Незаписанные просмотры возвращаются в буфер до следующей попытки
+                with self._lock:
+                    for ad_id, views, score in rows[start:]:
+                        entry = self._pending.setdefault((epoch, ad_id), [0, 0.0])
+                        entry[0] += views
+                        entry[1] += score
+                raise
+        return len(rows)
+
+    def run(self):
+        config = settings.ADS_POPULARITY
+        while True:
+            time.sleep(config["FLUSH_INTERVAL"])
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Не удалось записать просмотры объявлений")
+            finally:
+                close_old_connections()
+
+
+counter = ViewCounter()
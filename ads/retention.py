@@ -0,0 +1,126 @@
+"""
+Пакетная очистка объявлений, отзывов и пользователей.
+
+Удаление через ORM каскадом загружает в память все связанные строки.
+Здесь строки удаляются пачками сырым DELETE ... WHERE id IN (...): каждая пачка
+выполняется в своей короткой транзакции, а между пачками делается пауза,
+чтобы не держать долгих блокировок и не создавать отставания реплик.
+"""
+
+import operator
+import time
+from functools import reduce
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .ad_cache import invalidate_ads
+from .models import Ad, AdBand, AdSignature, AdStats, AdTombstone, PopularAd, Review, SavedSearchMatch
+
+User = get_user_model()
+
+
+def _delete_ids(model, ids):
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {model._meta.db_table} WHERE id IN ({placeholders})", ids)
+
+
+def _batches(queryset, batch_size):
+    """
+    Отдаёт пачки ID из queryset, пока он не опустеет.
+
+    Вызывающий код должен удалить пачку до запроса следующей.
+    """
+    while True:
+        ids = list(queryset.order_by().values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+
+
+def purge_reviews(queryset, batch_size, pause):
+    """
+    Удаляет отзывы из queryset пачками.
+
+    :return: Количество удалённых отзывов.
+    """
+    deleted = 0
+    for ids in _batches(queryset, batch_size):
+        with transaction.atomic():
+            _delete_ids(Review, ids)
+        deleted += len(ids)
+        time.sleep(pause)
+    return deleted
+
+
+def purge_ads(queryset, batch_size, pause):
+    """
+    Удаляет объявления из queryset пачками вместе с их отзывами.
+
+    Сырой DELETE не отправляет post_delete, поэтому записи об удалении для
+    ленты изменений создаются, а кэш объявлений, сигнатуры и корзины поиска
+    повторов, статистика просмотров и уведомления сохранённых поисков удаляются
+    здесь же, в транзакции пачки.
+
+    :return: Кортеж (удалено объявлений, удалено отзывов).
+    """
+    deleted_ads = deleted_reviews = 0
+    for ids in _batches(queryset, batch_size):
+        deleted_reviews += purge_reviews(Review.objects.filter(ad_id__in=ids), batch_size, pause)
+        with transaction.atomic():
+            _delete_ids(Ad, ids)
+            # У сигнатур, корзин, статистики и уведомлений нет ограничения внешнего ключа в БД, каскад выполняем сами
+            AdSignature.objects.filter(ad_id__in=ids).delete()
+            AdBand.objects.filter(ad_id__in=ids).delete()
+            AdStats.objects.filter(ad_id__in=ids).delete()
+            PopularAd.objects.filter(ad_id__in=ids).delete()
+            SavedSearchMatch.objects.filter(ad_id__in=ids).delete()
+            AdTombstone.objects.bulk_create([AdTombstone(ad_id=ad_id) for ad_id in ids])
+            invalidate_ads(ids)
+        deleted_ads += len(ids)
+        time.sleep(pause)
+    return deleted_ads, deleted_reviews
+
+
+def purge_users(queryset, batch_size, pause):
+    """
+    Удаляет пользователей пачками, предварительно очистив их объявления и отзывы.
+
+    Сами пользователи удаляются через ORM: после очистки у них остаются только
+    лёгкие связи (группы, права, журнал админки).
+
+    :return: Словарь со статистикой удаления.
+    """
+    stats = {"users": 0, "ads": 0, "reviews": 0}
+    for ids in _batches(queryset, batch_size):
+        stats["reviews"] += purge_reviews(
+            Review.objects.filter(Q(author_id__in=ids) | Q(owner_id__in=ids)), batch_size, pause
+        )
+        ads, reviews = purge_ads(Ad.objects.filter(Q(author_id__in=ids) | Q(owner_id__in=ids)), batch_size, pause)
+        stats["ads"] += ads
+        stats["reviews"] += reviews
+        User.objects.filter(pk__in=ids).delete()
+        stats["users"] += len(ids)
+    return stats
+
+
+def retention_querysets(cutoff=None, inactive_users=False):
+    """
+    Собирает объявления и отзывы, подлежащие очистке.
+
+    :param cutoff: Удалять объявления и отзывы, созданные раньше этого момента.
+    :param inactive_users: Удалять объявления и отзывы деактивированных пользователей.
+    :return: Кортеж (queryset объявлений, queryset отзывов).
+    """
+    conditions = []
+    if cutoff is not None:
+        conditions.append(Q(created_at__lt=cutoff))
+    if inactive_users:
+        inactive = User.objects.filter(is_active=False).values("id")
+        conditions += [Q(author_id__in=inactive), Q(owner_id__in=inactive)]
+    if not conditions:
+        return Ad.objects.none(), Review.objects.none()
+    condition = reduce(operator.or_, conditions)
+    return Ad.objects.filter(condition), Review.objects.filter(condition)
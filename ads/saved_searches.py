@@ -0,0 +1,241 @@
+"""
+Сохранённые поиски и уведомления о новых объявлениях.
+
+Сохранённый поиск - набор слов (все должны встретиться в названии или
+описании объявления) и необязательный диапазон цены. Новое объявление не
+сравнивается со всеми поисками: SearchIndex хранит в памяти процесса
+обратный индекс «слово -> поиски», и каждый поиск записан в нём под одним
+словом - самым длинным из запроса (длинные слова реже встречаются в
+объявлениях). Кандидаты - поиски, записанные под словами объявления; для них
+проверяются остальные слова и цена. Поэтому время сопоставления зависит от
+количества слов объявления и числа кандидатов, а не от общего числа поисков.
+
+Созданные объявления передаются в фоновый поток (SavedSearchMatcher), который
+сопоставляет их с индексом и записывает уведомления (SavedSearchMatch) одним
+bulk_create. Индекс строится при первом сопоставлении. Перед каждой пачкой в
+него догружаются поиски, созданные или изменённые (updated_at) с момента
+прошлой загрузки за вычетом SYNC_MARGIN секунд - запаса на транзакции,
+зафиксированные позже, и расхождение часов серверов; в том числе в других
+процессах. Изменения и удаления в своём процессе применяются сразу через
+сигналы, удаления в других процессах - при полной перестройке раз в
+ADS_SAVED_SEARCHES["REBUILD_INTERVAL"] секунд (до неё уведомления по удалённым
+поискам не записываются благодаря проверке в process()). Перестройка и
+чтение изменений из БД идут без блокировки индекса: новый индекс подменяет
+старый целиком, поэтому сигналы запросов не ждут перестройки.
+"""
+
+import logging
+import re
+import sys
+import threading
+import time
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import SavedSearch, SavedSearchMatch
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w{2,}")  # Однобуквенные слова не индексируются
+
+
+def tokenize(text):
+    """
+    Возвращает множество слов текста в нижнем регистре (ё приводится к е).
+    """
+    return set(_WORD.findall(text.lower().replace("ё", "е")))
+
+
+class SearchIndex:
+    """
+    Обратный индекс сохранённых поисков. Методы не потокобезопасны, блокировку держит SavedSearchMatcher.
+    """
+
+    def __init__(self):
+        self.searches = {}  # ID поиска -> (ID пользователя, слова, минимальная цена, максимальная цена)
+        self.by_term = {}  # Слово -> множество ID поисков, записанных под ним
+
+    def add(self, search_id, user_id, query, price_min, price_max):
+        self.remove(search_id)
+        # Одинаковые слова миллионов поисков хранятся в памяти один раз
+        terms = tuple(sorted(sys.intern(term) for term in tokenize(query)))
+        if not terms:
+            return
+        self.searches[search_id] = (user_id, terms, price_min, price_max)
+        self.by_term.setdefault(self.anchor(terms), set()).add(search_id)
+
+    def remove(self, search_id):
+        entry = self.searches.pop(search_id, None)
+        if entry is None:
+            return
+        anchor = self.anchor(entry[1])
+        ids = self.by_term[anchor]
+        ids.discard(search_id)
+        if not ids:
+            del self.by_term[anchor]
+
+    def load(self, rows):
+        """
+        :param rows: Кортежи (ID поиска, ID пользователя, слова, минимальная цена, максимальная цена), см. search_rows.
+        """
+        for search_id, user_id, query, price_min, price_max in rows:
+            self.add(search_id, user_id, query, price_min, price_max)
+
+    @staticmethod
+    def anchor(terms):
+        return max(terms, key=lambda term: (len(term), term))
+
+    def match(self, text, price, exclude_user=None):
+        """
+        Возвращает ID поисков, под которые подходит объявление с текстом text и ценой price.
+        """
+        words = tokenize(text)
+        matched = []
+        for word in words:
+            for search_id in self.by_term.get(word, ()):
+                user_id, terms, price_min, price_max = self.searches[search_id]
+                if user_id == exclude_user:
+                    continue
+                if (price_min is not None and price < price_min) or (price_max is not None and price > price_max):
+                    continue
+                if all(term in words for term in terms):
+                    matched.append(search_id)
+        return matched
+
+
+def search_rows(queryset):
+    return queryset.values_list("pk", "user_id", "query", "price_min", "price_max").iterator()
+
+
+class SavedSearchMatcher:
+    """
+    Очередь созданных объявлений с фоновым потоком сопоставления.
+
+    Если ADS_SAVED_SEARCHES["ASYNC"] ложно, объявление сопоставляется сразу в
+    вызывающем потоке.
+    """
+
+    def __init__(self):
+        self._pending = []
+        self._lock = threading.Lock()  # Очередь объявлений
+        self._index_lock = threading.Lock()  # Индекс поисков (короткие операции в памяти)
+        self._refresh_lock = threading.Lock()  # Загрузка из БД: одна на процесс
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._index = None
+        self._built = 0.0
+        self._synced = None  # Время начала последней загрузки из БД
+
+    def schedule(self, ad):
+        item = (ad.pk, ad.author_id, f"{ad.title} {ad.description}", ad.price)
+        if not settings.ADS_SAVED_SEARCHES["ASYNC"]:
+            self.process([item])
+            return
+        with self._lock:
+            self._pending.append(item)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="saved-searches", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def refresh(self):
+        """
+        Строит индекс, перестраивает его раз в REBUILD_INTERVAL секунд и догружает изменённые поиски.
+        """
+        config = settings.ADS_SAVED_SEARCHES
+        with self._refresh_lock:
+            started = timezone.now()
+            if self._index is None or time.monotonic() - self._built >= config["REBUILD_INTERVAL"]:
+                index = SearchIndex()
+                index.load(search_rows(SavedSearch.objects.all()))
+                with self._index_lock:
+                    self._index, self._built = index, time.monotonic()
+            else:
+                since = self._synced - timedelta(seconds=config["SYNC_MARGIN"])
+                rows = list(search_rows(SavedSearch.objects.filter(updated_at__gte=since)))
+                with self._index_lock:
+                    self._index.load(rows)
+            # Изменения, зафиксированные во время загрузки, попадут в следующую
+            self._synced = started
+
+    def update(self, search):
+        """
+        Применяет изменение поиска к индексу процесса (если индекс уже построен).
+        """
+        with self._index_lock:
+            if self._index is not None:
+                self._index.add(search.pk, search.user_id, search.query, search.price_min, search.price_max)
+
+    def discard(self, search_id):
+        with self._index_lock:
+            if self._index is not None:
+                self._index.remove(search_id)
+
+    def reset(self):
+        """
+        Сбрасывает индекс: он будет заново построен при следующем сопоставлении.
+        """
+        with self._index_lock:
+            self._index = None
+
+    def process(self, items):
+        """
+        Сопоставляет объявления с поисками и записывает уведомления.
+
+        :param items: Список кортежей (ID объявления, ID автора, текст, цена).
+        :return: Количество записанных уведомлений.
+        """
+        self.refresh()
+        with self._index_lock:
+            pairs = [
+                (search_id, ad_id)
+                for ad_id, author_id, text, price in items
+                for search_id in self._index.match(text, price, exclude_user=author_id)
+            ]
+        if not pairs:
+            return 0
+        # Поиски, удалённые в других процессах, остаются в индексе до перестройки
+        existing = set(SavedSearch.objects.filter(pk__in={pair[0] for pair in pairs}).values_list("pk", flat=True))
+        matches = SavedSearchMatch.objects.bulk_create(
+            [
+                SavedSearchMatch(search_id=search_id, ad_id=ad_id)
+                for search_id, ad_id in pairs
+                if search_id in existing
+            ],
+            ignore_conflicts=True,
+        )
+        return len(matches)
+
+    def flush(self):
+        with self._lock:
+            items, self._pending = self._pending, []
+        if not items:
+            return
+        try:
+            self.process(items)
+        except Exception:
+            # Несопоставленные объявления возвращаются в очередь до следующей попытки
+            with self._lock:
+                self._pending[:0] = items
+            self._wakeup.set()
+            raise
+
+    def run(self):
+        while True:
+            self._wakeup.wait()
+            # Объявления, созданные за FLUSH_INTERVAL, обрабатываются одной пачкой
+            time.sleep(settings.ADS_SAVED_SEARCHES["FLUSH_INTERVAL"])
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Не удалось сопоставить объявления с сохранёнными поисками")
+            finally:
+                close_old_connections()
+
+
+matcher = SavedSearchMatcher()
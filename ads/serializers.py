@@ -1,8 +1,24 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Ad, Review
+from .models import Ad, Review, SavedSearch, SavedSearchMatch
+from .saved_searches import tokenize
+
+
+class SellerSerializer(serializers.Serializer):
+    name = serializers.CharField(source="seller_name")
+    avatar = serializers.CharField(source="seller_avatar")
 
 
 class AdSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор объявления.
+
+    Поле seller (имя и аватар продавца из копии в объявлении) выводится,
+    только если в контексте передано include_seller.
+    """
+
+    seller = SellerSerializer(source="*", read_only=True)
+
     class Meta:
         model = Ad
         fields = (
@@ -11,8 +27,28 @@ class AdSerializer(serializers.ModelSerializer):
             "description",
             "created_at",
             "owner",
+            "seller",
         )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get("include_seller"):
+            self.fields.pop("seller")
+
+
+class AdBatchSerializer(AdSerializer):
+    """
+    Сериализатор объявления для /ads/batch/: с ID, копией продавца и отметкой повтора (duplicate_of).
+    """
+
+    class Meta(AdSerializer.Meta):
+        fields = ("id", *AdSerializer.Meta.fields, "duplicate_of")
+        read_only_fields = ("duplicate_of",)
+
+    def __init__(self, *args, **kwargs):
+        kwargs["context"] = {**kwargs.get("context", {}), "include_seller": True}
+        super().__init__(*args, **kwargs)
+
 
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
@@ -23,3 +59,57 @@ class ReviewSerializer(serializers.ModelSerializer):
             "ad",
             "created_at",
         )
+
+
+class PriceBucketSerializer(serializers.Serializer):
+    price_min = serializers.IntegerField()
+    price_max = serializers.IntegerField()
+    count = serializers.IntegerField()
+
+
+class AdFacetsSerializer(serializers.Serializer):
+    bucket_size = serializers.IntegerField()
+    buckets = PriceBucketSerializer(many=True)
+    truncated = serializers.BooleanField()
+
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SavedSearch
+        fields = (
+            "id",
+            "query",
+            "price_min",
+            "price_max",
+            "created_at",
+        )
+
+    def validate_query(self, value):
+        # Поиск без слов подошёл бы к большинству объявлений и не попал бы в обратный индекс
+        if not tokenize(value):
+            raise serializers.ValidationError("Укажите хотя бы одно слово длиной от двух букв.")
+        return value
+
+    def validate(self, attrs):
+        price_min = attrs.get("price_min", getattr(self.instance, "price_min", None))
+        price_max = attrs.get("price_max", getattr(self.instance, "price_max", None))
+        if price_min is not None and price_max is not None and price_min > price_max:
+            raise serializers.ValidationError({"price_max": "Максимальная цена меньше минимальной."})
+        if self.instance is None:
+            limit = settings.ADS_SAVED_SEARCHES["MAX_PER_USER"]
+            if SavedSearch.objects.filter(user=self.context["request"].user).count() >= limit:
+                raise serializers.ValidationError(f"Можно сохранить не больше {limit} поисков.")
+        return attrs
+
+
+class SavedSearchMatchSerializer(serializers.ModelSerializer):
+    ad = AdBatchSerializer(read_only=True)
+
+    class Meta:
+        model = SavedSearchMatch
+        fields = (
+            "id",
+            "search",
+            "ad",
+            "created_at",
+        )
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .ad_cache import invalidate_ads
+from .dedup import index_ads
+from .models import Ad, AdTombstone, SavedSearch
+from .saved_searches import matcher
+from .snapshots import SNAPSHOT_FIELDS, seller_snapshot, updater
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Ad)
+def create_ad_tombstone(sender, instance, **kwargs):
+    """
+    Сохраняет запись об удалении объявления для ленты изменений.
+
+    Срабатывает и при удалении через QuerySet.delete(), так как коллектор
+    Django отправляет post_delete для каждого удалённого объекта.
+    """
+    AdTombstone.objects.create(ad_id=instance.pk)
+
+
+@receiver(post_save, sender=Ad)
+@receiver(post_delete, sender=Ad)
+def invalidate_ad_cache(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш объявления для /ads/batch/.
+    """
+    invalidate_ads([instance.pk])
+
+
+@receiver(post_save, sender=Ad)
+def index_ad_signature(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Пересчитывает MinHash-сигнатуру и LSH-корзины объявления для поиска повторов.
+    """
+    if created or update_fields is None or {"title", "description", "author"} & set(update_fields):
+        index_ads([instance])
+
+
+@receiver(pre_save, sender=Ad)
+def fill_seller_snapshot(sender, instance, **kwargs):
+    """
+    Копирует имя и аватар автора в новое объявление.
+    """
+    if instance._state.adding and instance.author_id is not None:
+        for field, value in seller_snapshot(instance.author).items():
+            setattr(instance, field, value)
+
+
+@receiver(post_save, sender=User)
+def schedule_seller_snapshot(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Ставит в очередь обновление копии продавца в объявлениях пользователя.
+
+    Сохранения, не затрагивающие имя и аватар (например, last_login при входе), пропускаются.
+    """
+    if created or (update_fields is not None and not SNAPSHOT_FIELDS & set(update_fields)):
+        return
+    transaction.on_commit(lambda: updater.schedule(instance.pk))
+
+
+@receiver(post_save, sender=SavedSearch)
+def index_saved_search(sender, instance, **kwargs):
+    """
+    Обновляет сохранённый поиск в индексе процесса после фиксации транзакции.
+    """
+    transaction.on_commit(lambda: matcher.update(instance))
+
+
+@receiver(post_delete, sender=SavedSearch)
+def unindex_saved_search(sender, instance, **kwargs):
+    search_id = instance.pk
+    transaction.on_commit(lambda: matcher.discard(search_id))
@@ -0,0 +1,382 @@
+"""
+Похожие объявления для /ads/<id>/similar/.
+
+Объявление представляется хэшированным мешком слов: каждое слово названия и
+описания (названия - с двойным весом) попадает в один из
+SIMILAR_ADS["DIMENSIONS"] признаков по crc32, вес умножается на IDF признака,
+из вектора остаются FEATURES самых весомых признаков, и он нормируется.
+Косинусная близость нормированных векторов - сумма произведений весов общих
+признаков; кандидаты для каждого объявления берутся из обратного индекса
+«признак -> объявления», поэтому объявления без общих слов не сравниваются.
+Признаки, встречающиеся больше чем в MAX_POSTINGS объявлениях, для отбора
+кандидатов не используются: их вклад мал, а перебор дорог.
+
+Соседи считаются заранее командой manage.py build_similar_ads и хранятся в
+файлах версии индекса записями фиксированного размера, отсортированными по ID
+объявления:
+
+- neighbors.bin - ID объявления и NEIGHBORS пар (ID соседа, близость);
+  представление открывает файл через mmap и ищет запись двоичным поиском, не
+  обращаясь к БД;
+- vectors.bin, df.bin, meta.json - векторы, частоты признаков и последний
+  учтённый ID, нужные для дообработки.
+
+build_similar_ads --incremental добавляет объявления, созданные после
+последнего запуска: считает их векторы и соседей и вставляет их в списки
+соседей старых объявлений. IDF старых векторов при этом не пересчитывается, а
+удалённые объявления отфильтровываются при выдаче; полная перестройка
+исправляет и то и другое.
+
+Каждый запуск пишет все файлы в новый каталог версии SIMILAR_ADS["DIR"]/v<время>
+и только затем одной атомарной заменой (os.replace) файла-указателя current
+делает её действующей. Если запуск прервался, действующей остаётся прежняя
+версия целиком, и следующий --incremental не добавит объявления повторно.
+Открытые отображения продолжают читать прежнюю версию; остальные версии,
+кроме предыдущей, удаляются.
+"""
+
+import heapq
+import json
+import mmap
+import math
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import defaultdict
+from operator import itemgetter
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import Ad
+from .saved_searches import tokenize
+
+NEIGHBORS_FILE = "neighbors.bin"
+VECTORS_FILE = "vectors.bin"
+DF_FILE = "df.bin"
+META_FILE = "meta.json"
+CURRENT_FILE = "current"  # Имя каталога действующей версии
+
+HEADER = struct.Struct("<4sI")  # Сигнатура и количество пар в записи
+AD_ID = struct.Struct("<q")  # Первое поле каждой записи
+NEIGHBORS_MAGIC = b"ADSN"
+VECTORS_MAGIC = b"ADSV"
+
+
+def neighbors_record(size):
+    return struct.Struct(f"<q{size}q{size}f")
+
+
+def vectors_record(size):
+    return struct.Struct(f"<q{size}I{size}f")
+
+
+def pack(record, size, ad_id, pairs):
+    """
+    Упаковывает запись: ID объявления, затем первые и вторые элементы пар, дополненные нулями до size.
+    """
+    padding = [0] * (size - len(pairs))
+    return record.pack(ad_id, *(key for key, _ in pairs), *padding, *(value for _, value in pairs), *padding)
+
+
+def unpack(record, size, buffer, row):
+    values = record.unpack_from(buffer, HEADER.size + row * record.size)
+    return values[0], [(key, value) for key, value in zip(values[1 : size + 1], values[size + 1 :]) if value]
+
+
+def hashed_terms(title, description, dimensions):
+    """
+    Возвращает {признак: вес слова}: слова названия весят вдвое больше слов описания.
+    """
+    terms = {zlib.crc32(term.encode()) % dimensions: 1.0 for term in tokenize(description)}
+    terms.update({zlib.crc32(term.encode()) % dimensions: 2.0 for term in tokenize(title)})
+    return terms
+
+
+def vectorize(terms, df, documents, size):
+    """
+    Возвращает нормированный вектор [(признак, вес)] из size самых весомых признаков.
+    """
+    weights = {bucket: weight * (math.log((1 + documents) / (1 + df[bucket])) + 1) for bucket, weight in terms.items()}
+    top = heapq.nlargest(size, weights.items(), key=itemgetter(1))
+    norm = math.sqrt(sum(weight * weight for _, weight in top)) or 1.0
+    return [(bucket, weight / norm) for bucket, weight in top]
+
+
+def current_version(directory):
+    """
+    Возвращает каталог действующей версии индекса или None, если индекс ещё не построен.
+    """
+    try:
+        return Path(directory) / (Path(directory) / CURRENT_FILE).read_text().strip()
+    except FileNotFoundError:
+        return None
+
+
+def new_version(directory):
+    version = Path(directory) / f"v{time.time_ns()}"
+    version.mkdir(parents=True)
+    return version
+
+
+def publish(directory, version):
+    """
+    Делает версию действующей и удаляет остальные, кроме предыдущей (в том числе оставшиеся от прерванных запусков).
+    """
+    directory = Path(directory)
+    previous = current_version(directory)
+    pointer = directory / f"{CURRENT_FILE}.tmp"
+    pointer.write_text(version.name)
+    os.replace(pointer, directory / CURRENT_FILE)
+    # Одновременные запуски не поддерживаются, поэтому остальные каталоги - старые или брошенные
+    kept = {version.name, previous.name if previous is not None else None}
+    for path in directory.glob("v*"):
+        if path.is_dir() and path.name not in kept:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class Postings:
+    """
+    Обратный индекс «признак -> (номера строк, веса)» в компактных массивах.
+
+    :param buckets: Если передано, индексируются только эти признаки.
+    """
+
+    def __init__(self, buckets=None):
+        self.buckets = buckets
+        self.rows = {}
+        self.weights = {}
+
+    def add(self, row, vector):
+        for bucket, weight in vector:
+            if self.buckets is None or bucket in self.buckets:
+                self.rows.setdefault(bucket, array("I")).append(row)
+                self.weights.setdefault(bucket, array("f")).append(weight)
+
+    def scores(self, vector, max_postings):
+        """
+        Возвращает {номер строки: близость} для строк с общими признаками.
+        """
+        scores = defaultdict(float)
+        for bucket, weight in vector:
+            rows = self.rows.get(bucket)
+            if rows is None or len(rows) > max_postings:
+                continue
+            for row, other in zip(rows, self.weights[bucket]):
+                scores[row] += weight * other
+        return scores
+
+
+def build_similar(directory=None):
+    """
+    Полностью пересчитывает векторы и соседей всех объявлений.
+
+    :return: Количество объявлений в индексе.
+    """
+    config = settings.SIMILAR_ADS
+    directory = Path(directory or config["DIR"])
+    version = new_version(directory)
+    dimensions, size, count = config["DIMENSIONS"], config["FEATURES"], config["NEIGHBORS"]
+    last_id = Ad.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+    queryset = (
+        Ad.objects.filter(pk__lte=last_id, duplicate_of__isnull=True)
+        .order_by("pk")
+        .values_list("pk", "title", "description")
+    )
+
+    # Первый проход: частоты признаков для IDF
+    df, documents = array("I", [0]) * dimensions, 0
+    for _, title, description in queryset.iterator():
+        for bucket in hashed_terms(title, description, dimensions):
+            df[bucket] += 1
+        documents += 1
+
+    # Второй проход: векторы пишутся в файл, в памяти остаётся только обратный индекс
+    vectors = vectors_record(size)
+    postings = Postings()
+    vectors_path = version / VECTORS_FILE
+    rows = 0
+    with open(vectors_path, "wb") as output:
+        output.write(HEADER.pack(VECTORS_MAGIC, size))
+        for pk, title, description in queryset.iterator():
+            vector = vectorize(hashed_terms(title, description, dimensions), df, documents, size)
+            postings.add(rows, vector)
+            output.write(pack(vectors, size, pk, vector))
+            rows += 1
+
+    neighbors = neighbors_record(count)
+    with open(vectors_path, "rb") as source, open(version / NEIGHBORS_FILE, "wb") as output:
+        output.write(HEADER.pack(NEIGHBORS_MAGIC, count))
+        if rows:
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                ad_ids = [AD_ID.unpack_from(buffer, HEADER.size + row * vectors.size)[0] for row in range(rows)]
+                for row, pk in enumerate(ad_ids):
+                    scores = postings.scores(unpack(vectors, size, buffer, row)[1], config["MAX_POSTINGS"])
+                    scores.pop(row, None)
+                    top = heapq.nlargest(count, scores.items(), key=itemgetter(1))
+                    output.write(pack(neighbors, count, pk, [(ad_ids[other], score) for other, score in top]))
+
+    with open(version / DF_FILE, "wb") as output:
+        df.tofile(output)
+    (version / META_FILE).write_text(json.dumps({"documents": documents, "last_id": last_id}))
+    publish(directory, version)
+    return rows
+
+
+def update_similar(directory=None):
+    """
+    Добавляет в индекс объявления, созданные после последнего построения.
+
+    :return: Количество добавленных объявлений.
+    """
+    config = settings.SIMILAR_ADS
+    directory = Path(directory or config["DIR"])
+    source = current_version(directory)
+    dimensions, size, count = config["DIMENSIONS"], config["FEATURES"], config["NEIGHBORS"]
+    meta = json.loads((source / META_FILE).read_text())
+    new_ads = list(
+        Ad.objects.filter(pk__gt=meta["last_id"], duplicate_of__isnull=True)
+        .order_by("pk")
+        .values_list("pk", "title", "description")
+    )
+    if not new_ads:
+        return 0
+
+    df = array("I")
+    with open(source / DF_FILE, "rb") as stream:
+        df.fromfile(stream, dimensions)
+    documents = meta["documents"] + len(new_ads)
+    new_terms = [(pk, hashed_terms(title, description, dimensions)) for pk, title, description in new_ads]
+    for _, terms in new_terms:
+        for bucket in terms:
+            df[bucket] += 1
+    new_vectors = [(pk, vectorize(terms, df, documents, size)) for pk, terms in new_terms]
+
+    # Старые векторы читаются из файла, в обратный индекс попадают только признаки новых объявлений
+    vectors = vectors_record(size)
+    postings = Postings({bucket for _, vector in new_vectors for bucket, _ in vector})
+    version = new_version(directory)
+    vectors_path = version / VECTORS_FILE
+    shutil.copyfile(source / VECTORS_FILE, vectors_path)
+    rows = (vectors_path.stat().st_size - HEADER.size) // vectors.size
+    ad_ids = []
+    with open(vectors_path, "r+b") as output:
+        with mmap.mmap(output.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for row in range(rows):
+                pk, vector = unpack(vectors, size, buffer, row)
+                postings.add(row, vector)
+                ad_ids.append(pk)
+        output.seek(0, os.SEEK_END)
+        for offset, (pk, vector) in enumerate(new_vectors):
+            postings.add(rows + offset, vector)
+            ad_ids.append(pk)
+            output.write(pack(vectors, size, pk, vector))
+
+    neighbors = neighbors_record(count)
+    neighbors_path = version / NEIGHBORS_FILE
+    shutil.copyfile(source / NEIGHBORS_FILE, neighbors_path)
+    with open(neighbors_path, "r+b") as output:
+        with mmap.mmap(output.fileno(), 0) as buffer:
+            appended = []
+            for offset, (pk, vector) in enumerate(new_vectors):
+                scores = postings.scores(vector, config["MAX_POSTINGS"])
+                scores.pop(rows + offset, None)
+                top = heapq.nlargest(count, scores.items(), key=itemgetter(1))
+                appended.append(pack(neighbors, count, pk, [(ad_ids[other], score) for other, score in top]))
+                # Новое объявление вставляется в списки соседей старых, если оно ближе их последнего соседа
+                for other, score in scores.items():
+                    if other >= rows:
+                        continue
+                    other_id, pairs = unpack(neighbors, count, buffer, other)
+                    if len(pairs) < count or score > pairs[-1][1]:
+                        pairs = sorted([*pairs, (pk, score)], key=itemgetter(1), reverse=True)[:count]
+                        start = HEADER.size + other * neighbors.size
+                        buffer[start : start + neighbors.size] = pack(neighbors, count, other_id, pairs)
+        output.seek(0, os.SEEK_END)
+        output.write(b"".join(appended))
+
+    with open(version / DF_FILE, "wb") as output:
+        df.tofile(output)
+    (version / META_FILE).write_text(json.dumps({"documents": documents, "last_id": new_ads[-1][0]}))
+    publish(directory, version)
+    return len(new_ads)
+
+
+class Neighbors:
+    """
+    Открытая версия neighbors.bin. Не изменяется после создания, поэтому читается без блокировки.
+    """
+
+    def __init__(self, version, buffer, size):
+        self.version = version
+        self.buffer = buffer
+        self.size = size
+        self.record = neighbors_record(size)
+        self.rows = (len(buffer) - HEADER.size) // self.record.size
+
+    def find(self, ad_id):
+        low, high = 0, self.rows
+        while low < high:
+            middle = (low + high) // 2
+            (pk,) = AD_ID.unpack_from(self.buffer, HEADER.size + middle * self.record.size)
+            if pk == ad_id:
+                return unpack(self.record, self.size, self.buffer, middle)[1]
+            if pk < ad_id:
+                low = middle + 1
+            else:
+                high = middle
+        return []
+
+
+class SimilarIndex:
+    """
+    Чтение соседей из neighbors.bin действующей версии через mmap.
+
+    Версия проверяется по файлу-указателю без блокировки; блокировка берётся
+    только для переоткрытия после build_similar_ads. Прежнее отображение
+    закрывается сборщиком мусора, когда его перестают читать все потоки.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = None
+
+    def open(self):
+        """
+        :return: Открытая действующая версия или None, если индекс не построен.
+        """
+        directory = Path(settings.SIMILAR_ADS["DIR"])
+        try:
+            stat = (directory / CURRENT_FILE).stat()
+        except FileNotFoundError:
+            return None
+        version = (str(directory), stat.st_ino, stat.st_mtime_ns)
+        current = self._current
+        if current is not None and current.version == version:
+            return current
+        with self._lock:
+            current = self._current
+            if current is None or current.version != version:
+                path = current_version(directory) / NEIGHBORS_FILE
+                with open(path, "rb") as source:
+                    buffer = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, size = HEADER.unpack_from(buffer)
+                if magic != NEIGHBORS_MAGIC:
+                    buffer.close()
+                    return None
+                current = self._current = Neighbors(version, buffer, size)
+        return current
+
+    def neighbors(self, ad_id):
+        """
+        Возвращает [(ID соседа, близость)] по убыванию близости; пустой список, если объявления нет в индексе.
+        """
+        current = self.open()
+        return current.find(ad_id) if current is not None else []
+
+
+index = SimilarIndex()
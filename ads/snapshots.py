@@ -0,0 +1,114 @@
+"""
+Копия данных продавца (автора) в объявлении.
+
+Списки объявлений показывают имя и аватар продавца. Чтобы не соединять
+ads_ad с users_user для каждой строки, эти данные хранятся в самом
+объявлении (seller_name, seller_avatar): при создании объявления они
+копируются из автора, а при изменении имени или аватара пользователя
+обновляются фоновым потоком.
+
+Изменения пользователей накапливаются и обрабатываются пачкой раз в
+ADS_SELLER_SNAPSHOT["FLUSH_INTERVAL"] секунд: несколько изменений одного
+пользователя дают одно обновление. Объявления обновляются через
+QuerySet.update() пачками по BATCH_SIZE строк, updated_at не меняется,
+поэтому смена имени продавца не заполняет ленту изменений /ads/changes/.
+Полная пересинхронизация: manage.py sync_seller_snapshots.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+
+from .ad_cache import invalidate_ads
+from .models import Ad
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FIELDS = {"first_name", "last_name", "avatar"}  # Поля пользователя, копируемые в объявления
+
+
+def display_name(first_name, last_name):
+    return f"{first_name} {last_name}".strip()
+
+
+def seller_snapshot(user):
+    """
+    Возвращает поля копии продавца для объявления.
+    """
+    return {"seller_name": display_name(user.first_name, user.last_name), "seller_avatar": user.avatar.name or ""}
+
+
+def sync_sellers(user_ids, batch_size):
+    """
+    Обновляет копию продавца в объявлениях указанных пользователей.
+
+    :return: Количество обновлённых объявлений.
+    """
+    updated = 0
+    for user_id, first_name, last_name, avatar in User.objects.filter(pk__in=user_ids).values_list(
+        "pk", "first_name", "last_name", "avatar"
+    ):
+        snapshot = {"seller_name": display_name(first_name, last_name), "seller_avatar": avatar or ""}
+        stale = Ad.objects.filter(author_id=user_id).exclude(**snapshot).order_by().values_list("id", flat=True)
+        while True:
+            ids = list(stale[:batch_size])
+            if not ids:
+                break
+            updated += Ad.objects.filter(pk__in=ids).update(**snapshot)
+            invalidate_ads(ids)
+    return updated
+
+
+class SnapshotUpdater:
+    """
+    Накопитель изменённых пользователей с фоновым потоком обновления.
+
+    Если ADS_SELLER_SNAPSHOT["ASYNC"] ложно, объявления обновляются сразу в
+    вызывающем потоке.
+    """
+
+    def __init__(self):
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def schedule(self, user_id):
+        config = settings.ADS_SELLER_SNAPSHOT
+        if not config["ASYNC"]:
+            sync_sellers([user_id], config["BATCH_SIZE"])
+            return
+        with self._lock:
+            self._pending.add(user_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="seller-snapshots", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            user_ids, self._pending = self._pending, set()
+        if user_ids:
+            sync_sellers(user_ids, settings.ADS_SELLER_SNAPSHOT["BATCH_SIZE"])
+
+    def run(self):
+        while True:
+            self._wakeup.wait()
+            # Ждём, пока накопятся изменения других пользователей, и обрабатываем их одной пачкой
+            time.sleep(settings.ADS_SELLER_SNAPSHOT["FLUSH_INTERVAL"])
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Не удалось обновить копии продавцов в объявлениях")
+            finally:
+                close_old_connections()
+
+
+updater = SnapshotUpdater()
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .serializers import AdSerializer
+
+STREAM_PATH = "/ads/stream/"  # Путь SSE-потока, обслуживаемого напрямую из ASGI-приложения
+
+RESET = b"event: reset\ndata: {}\n\n"  # Клиент отстал: нужно досинхронизироваться через /ads/changes/
+HEARTBEAT = b": ping\n\n"  # Комментарий SSE, удерживающий соединение через прокси
+
+
+class Subscription:
+    """
+    Подписка одного клиента на поток новых объявлений.
+
+    Хранит ограниченную очередь сообщений в цикле событий клиента. Если клиент
+    не успевает читать и очередь переполняется, очередь очищается, а клиенту
+    отправляется событие reset, после чего поток закрывается.
+    """
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def push(self, message):
+        """
+        Кладёт сообщение в очередь. Вызывается только в цикле событий подписки.
+
+        :param message: Готовый SSE-кадр в байтах.
+        """
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+
+
+class AdBroker:
+    """
+    Внутрипроцессный брокер новых объявлений.
+
+    Сообщение сериализуется один раз при публикации и раздаётся всем подписчикам
+    без обращения к базе данных. Публикация потокобезопасна: синхронные
+    представления вызывают её из рабочих потоков, а доставка в очереди
+    подписчиков планируется в их цикле событий.
+
+    Брокер работает в пределах одного процесса: при нескольких воркерах каждый
+    из них раздаёт только объявления, созданные им самим.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        """
+        Регистрирует подписчика. Вызывается из работающего цикла событий.
+
+        :return: Subscription или None, если достигнут лимит подписчиков.
+        """
+        subscription = Subscription(asyncio.get_running_loop(), settings.ADS_STREAM_QUEUE_SIZE)
+        with self._lock:
+            if len(self._subscribers) >= settings.ADS_STREAM_MAX_SUBSCRIBERS:
+                return None
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, message):
+        """
+        Раздаёт сообщение всем подписчикам.
+
+        :param message: Готовый SSE-кадр в байтах.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, message)
+            except RuntimeError:  # Цикл событий подписчика уже закрыт
+                self.unsubscribe(subscription)
+
+
+broker = AdBroker()
+
+
+def publish_ad(ad):
+    """
+    Публикует созданное объявление в поток. Вызывается после фиксации транзакции.
+
+    :param ad: Сохранённый экземпляр Ad.
+    """
+    data = json.dumps({"id": ad.pk, **AdSerializer(ad).data}, cls=JSONEncoder, ensure_ascii=False)
+    broker.publish(f"id: {ad.pk}\nevent: ad\ndata: {data}\n\n".encode())
+
+
+async def ad_stream_app(scope, receive, send):
+    """
+    ASGI-приложение SSE-потока новых объявлений.
+
+    - GET /ads/stream/ - Получать новые объявления по мере их публикации.
+
+    Раз в settings.ADS_STREAM_HEARTBEAT секунд отправляется комментарий-пинг.
+    Отключение клиента отслеживается по событию http.disconnect.
+    """
+    if scope["method"] != "GET":
+        await send({"type": "http.response.start", "status": 405, "headers": [(b"allow", b"GET")]})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    subscription = broker.subscribe()
+    if subscription is None:
+        await send({"type": "http.response.start", "status": 503, "headers": [(b"retry-after", b"5")]})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    async def wait_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    disconnect = asyncio.ensure_future(wait_disconnect())
+    try:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),  # Отключаем буферизацию в nginx
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+        while True:
+            message = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait(
+                {message, disconnect},
+                timeout=settings.ADS_STREAM_HEARTBEAT,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnect in done:
+                message.cancel()
+                return
+            if message not in done:
+                message.cancel()
+                await send({"type": "http.response.body", "body": HEARTBEAT, "more_body": True})
+                continue
+            frame = message.result()
+            await send({"type": "http.response.body", "body": frame, "more_body": frame is not RESET})
+            if frame is RESET:
+                return
+    finally:
+        disconnect.cancel()
+        broker.unsubscribe(subscription)
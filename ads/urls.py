@@ -1,13 +1,35 @@
 from django.urls import path, include
-from .views import AdList, AdDetail, ReviewViewSet, AdCreate
-from rest_framework.routers import DefaultRouter
+from .views import (
+    AdList,
+    AdDetail,
+    ReviewViewSet,
+    AdCreate,
+    AdChanges,
+    AdFacets,
+    AdBatch,
+    AdPopular,
+    AdSimilar,
+    SavedSearchMatchList,
+    SavedSearchViewSet,
+)
+from rest_framework.routers import DefaultRouter, SimpleRouter
 
 router = DefaultRouter()
 router.register(r"", ReviewViewSet)
 
+saved_search_router = SimpleRouter()
+saved_search_router.register(r"", SavedSearchViewSet, basename="saved-search")
+
 urlpatterns = [
     path("", AdList.as_view(), name="ad-list"),  # Маршрут для списка объявлений
     path("create/", AdCreate.as_view(), name="ad-create"),  # Маршрут для создания объявления
+    path("facets/", AdFacets.as_view(), name="ad-facets"),  # Гистограмма цен объявлений
+    path("changes/", AdChanges.as_view(), name="ad-changes"),  # Лента изменений объявлений
+    path("popular/", AdPopular.as_view(), name="ad-popular"),  # Самые популярные объявления
+    path("batch/", AdBatch.as_view(), name="ad-batch"),  # Получение нескольких объявлений по списку ID
+    path("<int:pk>/similar/", AdSimilar.as_view(), name="ad-similar"),  # Похожие объявления
     path("upd/<int:pk>/", AdDetail.as_view(), name="ad-detail"),  # Получение, обновление и удаление объявления
     path("reviews/", include(router.urls)),  # Подключаем маршруты для отзывов
+    path("saved-searches/matches/", SavedSearchMatchList.as_view(), name="saved-search-matches"),  # Уведомления
+    path("saved-searches/", include(saved_search_router.urls)),  # Сохранённые поиски пользователя
 ]
@@ -1,29 +1,72 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, When
 from rest_framework import viewsets, generics
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+from config.singleflight import flights
 
-from .models import Ad, Review
+from .ad_cache import AD_LIST_CACHE_KEY, ad_detail_cache_key, get_ads
+from .changes import collect_changes
+from .dedup import find_duplicate, minhash
+from .filters import AdFilter, MineFilterBackend
+from .idempotency import IdempotentCreateMixin
+from .models import Ad, PopularAd, Review, SavedSearch, SavedSearchMatch
 from .permissions import IsAdminOrReadOnly, IsOwner, IsAuthor
-from .serializers import AdSerializer, ReviewSerializer
+from .serializers import (
+    AdBatchSerializer,
+    AdFacetsSerializer,
+    AdSerializer,
+    ReviewSerializer,
+    SavedSearchMatchSerializer,
+    SavedSearchSerializer,
+)
+from .stream import publish_ad
 from .pagination import AdPagination
+from .popularity import counter
+from .saved_searches import matcher
+from .similar import index as similar_index
 
 
-class AdCreate(generics.CreateAPIView):
+class AdCreate(IdempotentCreateMixin, generics.CreateAPIView):
     """
     Представление для создания нового объявления.
 
-    - POST /ads/create/ - Создать новое объявление.
+    - POST /ads/create/ - Создать новое объявление (повтор с тем же заголовком Idempotency-Key вернёт тот же ответ).
     """
 
     queryset = Ad.objects.all()  # Запрос для получения всех объявлений
     serializer_class = AdSerializer  # Сериализатор для преобразования данных
     permission_classes = [IsAuthenticated]  # Только аутентифицированные пользователи могут создавать объявления
+    idempotency_scope = "ad-create"  # Имя представления в таблице ключей Idempotency-Key
 
     def perform_create(self, serializer):
+        # Ищем почти повтор среди объявлений автора по LSH-корзинам (ads/dedup.py)
+        signature = minhash(serializer.validated_data["title"], serializer.validated_data["description"])
+        duplicate = find_duplicate(self.request.user.pk, signature)
+        if duplicate is not None and settings.ADS_DEDUP["ACTION"] == "reject":
+            raise ValidationError(
+                {"non_field_errors": ["У вас уже есть почти такое же объявление."], "duplicate_of": duplicate}
+            )
         # Устанавливаем поле author на текущего пользователя
-        serializer.save(author=self.request.user)
+        ad = serializer.save(author=self.request.user, duplicate_of_id=duplicate)
+        if duplicate is not None:
+            return  # Отмеченный повтор скрыт: не рассылается подписчикам и не сопоставляется с поисками
+        # Отправляем объявление в SSE-поток /ads/stream/ только после фиксации транзакции
+        transaction.on_commit(lambda: publish_ad(ad))
+        # Сопоставление с сохранёнными поисками выполняется в фоновом потоке (ads/saved_searches.py)
+        transaction.on_commit(lambda: matcher.schedule(ad))
 
 
 class AdList(generics.ListAPIView):
@@ -33,14 +76,180 @@ class AdList(generics.ListAPIView):
     - GET /ads/ - Получить список всех объявлений с поддержкой пагинации и поиска.
     """
 
-    queryset = Ad.objects.all()  # Запрос для получения всех объявлений
+    queryset = Ad.objects.filter(duplicate_of__isnull=True)  # Все объявления, кроме отмеченных повторов
     serializer_class = AdSerializer  # Сериализатор для преобразования данных
     pagination_class = AdPagination  # Используем пагинацию
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter)  # Подключаем фильтрацию и поиск
-    filterset_fields = ["title"]  # Поля, по которым можно фильтровать
+    filter_backends = (
+        DjangoFilterBackend,
+        MineFilterBackend,
+        filters.SearchFilter,
+        filters.OrderingFilter,
+    )  # Фильтры, «мои объявления» (?mine=true), поиск, сортировка
+    filterset_class = AdFilter  # Фильтры по названию, цене, автору и дате создания
     search_fields = ["title", "description"]  # Поля, по которым можно выполнять поиск
+    ordering_fields = ["price", "created_at"]  # Сортировки, для каждой из которых есть индекс
     permission_classes = [IsAdminOrReadOnly]  # Анонимные пользователи могут только получать список
 
+    def get_serializer_context(self):
+        # ?include=seller добавляет имя и аватар продавца из копии в объявлении, без JOIN с пользователями
+        context = super().get_serializer_context()
+        context["include_seller"] = "seller" in self.request.query_params.get("include", "").split(",")
+        return context
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        # Первая страница без фильтров - самая частая: её пересчитывает один запрос процесса (config/singleflight.py)
+        data = flights.get(AD_LIST_CACHE_KEY, self.first_page, settings.ADS_LIST_CACHE_TIMEOUT)
+        # Ссылки зависят от Host запроса, поэтому в кэше их нет: они строятся для каждого запроса
+        url = request.build_absolute_uri()
+        more = data["count"] > self.paginator.page_size
+        next_url = replace_query_param(url, self.paginator.page_query_param, 2) if more else None
+        return Response({"count": data["count"], "next": next_url, "previous": None, "results": data["results"]})
+
+    def first_page(self):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        return {"count": self.paginator.page.paginator.count, "results": self.get_serializer(page, many=True).data}
+
+
+class AdFacets(generics.GenericAPIView):
+    """
+    Представление для получения гистограммы цен объявлений.
+
+    - GET /ads/facets/ - Получить количество объявлений по ценовым корзинам.
+
+    Принимает те же фильтры и поиск, что и список объявлений, а также
+    bucket_size - ширину ценовой корзины. Гистограмма считается одним
+    агрегирующим запросом и кэшируется по набору параметров запроса.
+    """
+
+    queryset = Ad.objects.filter(duplicate_of__isnull=True)  # Те же объявления, что и в списке
+    serializer_class = AdFacetsSerializer  # Сериализатор гистограммы
+    filter_backends = (DjangoFilterBackend, filters.SearchFilter)  # Подключаем фильтрацию и поиск
+    filterset_class = AdFilter  # Те же фильтры, что и у списка объявлений
+    search_fields = ["title", "description"]  # Поля, по которым можно выполнять поиск
+    permission_classes = [IsAdminOrReadOnly]  # Анонимные пользователи могут только получать гистограмму
+    default_bucket_size = 1000  # Ширина ценовой корзины по умолчанию
+    max_buckets = 100  # Максимальное количество корзин в ответе
+
+    def get_cache_key(self, bucket_size):
+        params = [*AdFilter.base_filters, api_settings.SEARCH_PARAM]
+        signature = sorted((name, value) for name in params for value in self.request.query_params.getlist(name))
+        digest = hashlib.sha1(repr((bucket_size, signature)).encode()).hexdigest()
+        return f"ads:facets:{digest}"
+
+    def get(self, request):
+        try:
+            bucket_size = int(request.query_params.get("bucket_size", self.default_bucket_size))
+        except ValueError:
+            bucket_size = 0
+        if bucket_size < 1:
+            raise ValidationError({"bucket_size": "Ширина корзины должна быть положительным целым числом."})
+
+        def compute():
+            rows = list(
+                self.filter_queryset(self.get_queryset())
+                .order_by()  # Сбрасываем сортировку модели, чтобы она не попала в GROUP BY
+                .annotate(bucket=F("price") / bucket_size)
+                .values("bucket")
+                .annotate(count=Count("id"))
+                .order_by("bucket")[: self.max_buckets + 1]
+            )
+            return self.get_serializer(
+                {
+                    "bucket_size": bucket_size,
+                    "buckets": [
+                        {
+                            "price_min": row["bucket"] * bucket_size,
+                            "price_max": (row["bucket"] + 1) * bucket_size - 1,
+                            "count": row["count"],
+                        }
+                        for row in rows[: self.max_buckets]
+                    ],
+                    "truncated": len(rows) > self.max_buckets,  # Корзин больше лимита, стоит увеличить bucket_size
+                }
+            ).data
+
+        return Response(flights.get(self.get_cache_key(bucket_size), compute, settings.ADS_FACETS_CACHE_TIMEOUT))
+
+
+class AdChanges(APIView):
+    """
+    Лента изменений объявлений для инкрементальной синхронизации.
+
+    - GET /ads/changes/ - Получить все объявления как созданные и токен продолжения.
+    - GET /ads/changes/?since=<token> - Получить созданные, изменённые и удалённые
+      объявления после позиции токена.
+
+    Параметр limit ограничивает количество изменений в ответе (по умолчанию 100, максимум 1000).
+    """
+
+    permission_classes = [IsAdminOrReadOnly]  # Анонимные пользователи могут только получать изменения
+    default_limit = 100  # Количество изменений в ответе по умолчанию
+    max_limit = 1000  # Максимально допустимое количество изменений в ответе
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = max(1, min(limit, self.max_limit))
+
+        results, next_token, has_more = collect_changes(since=request.query_params.get("since"), limit=limit)
+        return Response({"results": results, "next": next_token, "has_more": has_more})
+
+
+class AdBatch(APIView):
+    """
+    Получение нескольких объявлений за один запрос.
+
+    - GET /ads/batch/?ids=1,2,3 - Получить объявления в порядке переданных ID.
+
+    Объявления читаются через кэш по ID (ads/ad_cache.py), промахи догружаются
+    одним запросом id__in. Не найденные ID возвращаются в поле missing.
+    """
+
+    permission_classes = [IsAdminOrReadOnly]  # Анонимные пользователи могут только получать объявления
+    max_ids = 100  # Максимальное количество ID в одном запросе
+
+    def get(self, request):
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in request.query_params.get("ids", "").split(",") if pk))
+        except ValueError:
+            raise ValidationError({"ids": "Передайте ID объявлений через запятую."})
+        if not ids:
+            raise ValidationError({"ids": "Передайте хотя бы один ID объявления."})
+        if len(ids) > self.max_ids:
+            raise ValidationError({"ids": f"Можно запросить не больше {self.max_ids} объявлений."})
+
+        ads = get_ads(ids)
+        return Response(
+            {"results": [ads[pk] for pk in ids if pk in ads], "missing": [pk for pk in ids if pk not in ads]}
+        )
+
+
+class AdSimilar(APIView):
+    """
+    Похожие объявления.
+
+    - GET /ads/<id>/similar/ - Получить объявления, похожие на объявление с ID, по убыванию близости.
+
+    Соседи читаются из заранее рассчитанного файла (ads/similar.py), объявления - через кэш по ID.
+    Объявления, созданные после последнего запуска build_similar_ads, получают пустой список.
+    Отмеченные повторы (duplicate_of) в соседи не попадают.
+    """
+
+    permission_classes = [IsAdminOrReadOnly]  # Анонимные пользователи могут только получать объявления
+
+    def get(self, request, pk):
+        neighbors = similar_index.neighbors(pk)
+        ads = get_ads([pk, *(ad_id for ad_id, _ in neighbors)])
+        if pk not in ads:
+            raise NotFound("Объявление не найдено.")
+        # Удалённые и отмеченные повторами после построения индекса соседи пропускаются
+        visible = [(ad_id, score) for ad_id, score in neighbors if ad_id in ads and ads[ad_id]["duplicate_of"] is None]
+        return Response({"results": [{**ads[ad_id], "score": round(score, 4)} for ad_id, score in visible]})
+
 
 class AdDetail(generics.RetrieveUpdateDestroyAPIView):
     """
@@ -57,14 +266,46 @@ class AdDetail(generics.RetrieveUpdateDestroyAPIView):
         IsOwner | IsAdminOrReadOnly
     ]  # Пользователь может редактировать/удалять только свои объявления
 
+    def retrieve(self, request, *args, **kwargs):
+        pk = int(self.kwargs["pk"])
+        # Одновременные промахи по популярному объявлению пересчитывает один запрос процесса (config/singleflight.py)
+        data = flights.get(
+            ad_detail_cache_key(pk),
+            lambda: self.get_serializer(self.get_object()).data,
+            settings.ADS_BATCH_CACHE_TIMEOUT,
+        )
+        counter.record(pk)  # Просмотр учитывается в буфере процесса, без UPDATE на запрос
+        return Response(data)
+
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class AdPopular(generics.ListAPIView):
+    """
+    Представление для получения самых популярных объявлений.
+
+    - GET /ads/popular/ - Получить объявления по убыванию популярности.
+
+    Список читается из заранее рассчитанной таблицы ads_popularad (см. ads/popularity.py).
+    """
+
+    serializer_class = AdBatchSerializer  # Объявление с ID и копией продавца
+    pagination_class = None  # Список ограничен ADS_POPULARITY["TOP_SIZE"]
+    permission_classes = [IsAdminOrReadOnly]  # Анонимные пользователи могут только получать список
+
+    filter_backends = ()  # Список не фильтруется
+
+    def get_queryset(self):
+        positions = dict(PopularAd.objects.values_list("ad_id", "position"))
+        order = Case(*(When(pk=ad_id, then=position) for ad_id, position in positions.items()), default=None)
+        return Ad.objects.filter(pk__in=positions, duplicate_of__isnull=True).order_by(order)
+
+
+class ReviewViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
     """
     Представление для работы с отзывами.
     Поддерживает все CRUD операции.
 
     - GET /reviews/ - Получить список всех отзывов.
-    - POST /reviews/ - Создать новый отзыв.
+    - POST /reviews/ - Создать новый отзыв (повтор с тем же заголовком Idempotency-Key вернёт тот же ответ).
     - GET /reviews/<id>/ - Получить конкретный отзыв по ID.
     - PUT /reviews/<id>/ - Обновить конкретный отзыв по ID.
     - DELETE /reviews/<id>/ - Удалить конкретный отзыв по ID.
@@ -72,14 +313,54 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
     queryset = Review.objects.all()  # Запрос для получения всех отзывов
     serializer_class = ReviewSerializer  # Сериализатор для преобразования данных
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter)  # Подключаем фильтрацию и поиск
+    filter_backends = (DjangoFilterBackend, MineFilterBackend, filters.SearchFilter)  # «Мои отзывы» через ?mine=true
     filterset_fields = ["ad"]  # Поля, по которым можно фильтровать
     search_fields = ["comment"]  # Поля, по которым можно выполнять поиск
     permission_classes = [
         IsOwner | IsAdminOrReadOnly | IsAuthor
     ]  # Пользователь может редактировать/удалять только свои отзывы
+    idempotency_scope = "review-create"  # Имя представления в таблице ключей Idempotency-Key
 
     def perform_create(self, serializer):
         serializer.save(
             author=self.request.user
         )  # Автоматически устанавливать автора для вошедшего в систему пользователя
+
+
+class SavedSearchViewSet(viewsets.ModelViewSet):
+    """
+    Сохранённые поиски текущего пользователя.
+
+    - GET /ads/saved-searches/ - Получить свои сохранённые поиски.
+    - POST /ads/saved-searches/ - Сохранить поиск.
+    - GET /ads/saved-searches/<id>/ - Получить сохранённый поиск по ID.
+    - PUT /ads/saved-searches/<id>/ - Обновить сохранённый поиск по ID.
+    - DELETE /ads/saved-searches/<id>/ - Удалить сохранённый поиск по ID.
+    """
+
+    serializer_class = SavedSearchSerializer  # Сериализатор для преобразования данных
+    permission_classes = [IsAuthenticated]  # Поиски доступны только их владельцу
+    filter_backends = ()  # Список не фильтруется
+
+    def get_queryset(self):
+        return SavedSearch.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class SavedSearchMatchList(generics.ListAPIView):
+    """
+    Уведомления о новых объявлениях, подходящих под сохранённые поиски.
+
+    - GET /ads/saved-searches/matches/ - Получить свои уведомления, новые первыми.
+    - GET /ads/saved-searches/matches/?search=<id> - Уведомления одного поиска.
+    """
+
+    serializer_class = SavedSearchMatchSerializer  # Сериализатор для преобразования данных
+    permission_classes = [IsAuthenticated]  # Уведомления доступны только владельцу поиска
+    filter_backends = (DjangoFilterBackend,)
+    filterset_fields = ["search"]  # Поля, по которым можно фильтровать
+
+    def get_queryset(self):
+        return SavedSearchMatch.objects.filter(search__user=self.request.user).select_related("ad")
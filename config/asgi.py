@@ -12,5 +12,17 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+# Под ASGI синхронные представления делят один поток, поэтому хеширование паролей выносится в пул
+# (users/hashing_pool.py); под WSGI у каждого запроса свой поток и пул только добавил бы переключение
+os.environ.setdefault("AUTH_HASHING_POOL", "True")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from ads.stream import STREAM_PATH, ad_stream_app  # noqa: E402  Требует настроенного Django
+
+
+async def application(scope, receive, send):
+    # SSE-поток объявлений обслуживается в обход стека middleware Django
+    if scope["type"] == "http" and scope["path"] == STREAM_PATH:
+        return await ad_stream_app(scope, receive, send)
+    return await django_application(scope, receive, send)
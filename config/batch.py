@@ -0,0 +1,177 @@
+"""
+Пакетное выполнение нескольких запросов API за один HTTP-запрос.
+
+POST /batch/ принимает список подзапросов {"method", "path", "body"} и
+возвращает ответы в том же порядке: {"responses": [{"status", "headers", "body"}]}.
+
+Подзапросы вызывают представления напрямую через URL-резолвер Django, минуя
+middleware. Пользователь определяется один раз для всего пакета и передаётся
+в подзапросы (ForcedAuthentication DRF), а права и ограничения частоты каждое
+представление проверяет само. Подряд идущие GET-подзапросы независимы и
+выполняются параллельно в пуле API_BATCH["MAX_WORKERS"] потоков; изменяющий
+подзапрос выполняется только после завершения всех предыдущих, поэтому
+следующие за ним чтения видят его результат.
+"""
+
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from urllib.parse import unquote_to_bytes, urlsplit
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.urls import Resolver404, resolve
+from django.utils.encoding import iri_to_uri
+from rest_framework import serializers
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+# Заголовки запроса пакета, которые получают подзапросы (тело и его тип у подзапроса свои)
+INHERITED_META = ("REMOTE_ADDR", "SERVER_NAME", "SERVER_PORT", "wsgi.url_scheme")
+# Заголовки, которые подзапросы не получают: один Idempotency-Key на несколько POST вернул бы всем ответ первого
+EXCLUDED_META = ("HTTP_IDEMPOTENCY_KEY",)
+
+
+class BatchItemSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+    def validate_path(self, value):
+        if not value.startswith("/"):
+            raise serializers.ValidationError("Путь должен начинаться с /.")
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchItemSerializer(many=True)
+
+    def validate_requests(self, value):
+        if not value:
+            raise serializers.ValidationError("Передайте хотя бы один подзапрос.")
+        if len(value) > settings.API_BATCH["MAX_REQUESTS"]:
+            raise serializers.ValidationError(f"Не больше {settings.API_BATCH['MAX_REQUESTS']} подзапросов.")
+        return value
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(max_workers=settings.API_BATCH["MAX_WORKERS"], thread_name_prefix="api-batch")
+
+
+def build_request(request, item):
+    """
+    Создаёт подзапрос с заголовками запроса пакета и пользователем, уже определённым для пакета.
+    """
+    url = urlsplit(item["path"])
+    body = json.dumps(item["body"]).encode() if "body" in item else b""
+    environ = {
+        key: value
+        for key, value in request.META.items()
+        if (key.startswith("HTTP_") or key in INHERITED_META) and key not in EXCLUDED_META
+    }
+    environ.update(
+        {
+            "REQUEST_METHOD": item["method"],
+            # WSGI передаёт путь и строку запроса байтами, декодированными как latin-1
+            "PATH_INFO": unquote_to_bytes(iri_to_uri(url.path)).decode("iso-8859-1"),
+            "QUERY_STRING": iri_to_uri(url.query),
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": BytesIO(body),
+        }
+    )
+    sub_request = WSGIRequest(environ)
+    if request.user.is_authenticated:
+        # Анонимный подзапрос проходит обычную аутентификацию, чтобы получить 401 с WWW-Authenticate, а не 403
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def render_body(response):
+    if response.get("Content-Type", "").startswith("application/json") and response.content:
+        return json.loads(response.content)
+    return response.content.decode(errors="replace")
+
+
+def dispatch(request, item):
+    """
+    Выполняет один подзапрос и возвращает его ответ в виде словаря.
+    """
+    path = urlsplit(item["path"]).path
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return {"status": 404, "headers": {}, "body": {"detail": "Страница не найдена."}}
+    if match.view_name == "batch":
+        return {"status": 400, "headers": {}, "body": {"detail": "Вложенные пакеты не поддерживаются."}}
+
+    sub_request = build_request(request, item)
+    sub_request.resolver_match = match
+    view = match.func
+    if asyncio.iscoroutinefunction(view):  # Представления, обёрнутые offload_hashing
+        view = async_to_sync(view)
+    try:
+        response = view(sub_request, *match.args, **match.kwargs)
+        if hasattr(response, "render"):
+            response.render()
+    except Exception:
+        # Ошибка одного подзапроса не должна лишать клиента ответов остальных
+        logger.exception("Ошибка подзапроса %s %s", item["method"], item["path"])
+        return {"status": 500, "headers": {}, "body": {"detail": "Внутренняя ошибка сервера."}}
+    return {"status": response.status_code, "headers": dict(response.items()), "body": render_body(response)}
+
+
+def dispatch_in_thread(request, item):
+    try:
+        return dispatch(request, item)
+    finally:
+        # Соединение с БД принадлежит потоку пула: закрываем его, как это делает обработчик запроса
+        close_old_connections()
+
+
+class BatchView(APIView):
+    """
+    Пакетное выполнение запросов API.
+
+    - POST /batch/ - Выполнить подзапросы и получить все ответы.
+    """
+
+    permission_classes = [AllowAny]  # Права проверяет представление каждого подзапроса
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data["requests"]
+        request.user  # Аутентификация выполняется один раз для всего пакета
+
+        responses = [None] * len(items)
+        reads = []  # Индексы подряд идущих GET-подзапросов
+
+        def run_reads():
+            if len(reads) > 1 and settings.API_BATCH["MAX_WORKERS"] > 1:
+                futures = {index: get_executor().submit(dispatch_in_thread, request, items[index]) for index in reads}
+                for index, future in futures.items():
+                    responses[index] = future.result()
+            else:
+                for index in reads:
+                    responses[index] = dispatch(request, items[index])
+            reads.clear()
+
+        for index, item in enumerate(items):
+            if item["method"] == "GET":
+                reads.append(index)
+                continue
+            run_reads()
+            responses[index] = dispatch(request, item)
+        run_reads()
+        return Response({"responses": responses})
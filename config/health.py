@@ -0,0 +1,132 @@
+"""
+Проверки живости и готовности для оркестратора.
+
+HealthCheckMiddleware стоит первым в MIDDLEWARE и отвечает на /healthz и
+/readyz сам, не передавая запрос дальше: пробы не проходят через сессии, CSRF,
+аутентификацию и права DRF и не обращаются к URL-конфигурации.
+
+- /healthz - процесс жив и обрабатывает запросы; БД не используется.
+- /readyz - процесс готов принимать трафик: БД отвечает на SELECT 1 не дольше
+  HEALTH_CHECK["DB_TIMEOUT"] секунд. Результат кэшируется в процессе на
+  HEALTH_CHECK["CACHE_TTL"] секунд, поэтому частые пробы не нагружают БД.
+  В ответ также попадает состояние соединений, фоновых очередей процесса и
+  счётчики объединения промахов кэша.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+
+from .singleflight import flights
+
+LIVENESS_PATHS = {"/healthz", "/healthz/"}
+READINESS_PATHS = {"/readyz", "/readyz/"}
+
+
+class DatabaseProbe:
+    """
+    Проверка БД с ограничением по времени и кэшированием результата.
+
+    Запрос выполняется в отдельном потоке со своим соединением. Если БД
+    зависла, поток остаётся занят, а новые проверки сразу считаются неуспешными,
+    пока он не освободится, - зависшие проверки не накапливаются.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="readyz")
+        self._lock = threading.Lock()
+        self._pending = None
+        self._result = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def _ping():
+        connection.close_if_unusable_or_obsolete()
+        started = time.monotonic()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        return round((time.monotonic() - started) * 1000, 2)
+
+    def check(self):
+        """
+        :return: Словарь {"ok": bool, ...} с временем ответа БД или описанием ошибки.
+        """
+        config = settings.HEALTH_CHECK
+        with self._lock:
+            now = time.monotonic()
+            if self._result is not None and now - self._checked_at < config["CACHE_TTL"]:
+                return self._result
+            if self._pending is not None and not self._pending.done():
+                return {"ok": False, "error": "предыдущая проверка БД ещё выполняется"}
+            self._pending = self._executor.submit(self._ping)
+            try:
+                self._result = {"ok": True, "latency_ms": self._pending.result(timeout=config["DB_TIMEOUT"])}
+            except FutureTimeoutError:
+                self._result = {"ok": False, "error": f"БД не ответила за {config['DB_TIMEOUT']} с"}
+            except Exception as exc:
+                self._result = {"ok": False, "error": str(exc)}
+            self._checked_at = time.monotonic()
+            return self._result
+
+    def reset(self):
+        with self._lock:
+            self._result = None
+            self._checked_at = 0.0
+
+
+probe = DatabaseProbe()
+
+
+def queues_status():
+    """
+    Состояние фоновых очередей процесса: пула хеширования паролей и SSE-брокера.
+    """
+    from ads.stream import broker
+    from users.hashing_pool import get_pool
+
+    status = {"ads_stream_subscribers": len(broker)}
+    if settings.AUTH_HASHING_POOL["ENABLED"]:
+        pool = get_pool()
+        status["auth_hashing_pool"] = {"capacity": pool.capacity, "in_use": pool.in_use}
+    return status
+
+
+def readiness():
+    """
+    :return: Пара (готов ли процесс, тело ответа).
+    """
+    database = probe.check()
+    body = {
+        "status": "ok" if database["ok"] else "unavailable",
+        "database": {
+            **database,
+            "vendor": connection.vendor,
+            "conn_max_age": settings.DATABASES["default"].get("CONN_MAX_AGE", 0),
+        },
+        "queues": queues_status(),
+        "single_flight": flights.stats(),  # Счётчики объединения промахов кэша процесса
+    }
+    return database["ok"], body
+
+
+class HealthCheckMiddleware:
+    """
+    Отвечает на пробы живости и готовности до остальных middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path in LIVENESS_PATHS:
+            return JsonResponse({"status": "ok"})
+        if request.path in READINESS_PATHS:
+            ready, body = readiness()
+            return JsonResponse(body, status=200 if ready else 503)
+        return self.get_response(request)
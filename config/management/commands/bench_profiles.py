@@ -0,0 +1,90 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.core.management import BaseCommand
+
+PROFILES = ["config.settings", "config.settings_api"]
+
+# Запросы проходят весь стек middleware и DRF (аутентификация и права), но не обращаются к БД:
+# без токена представление отвечает 401
+PATHS = ["/ads/create/", "/users/profile/"]
+
+
+def measure(requests):
+    """
+    Выполняется в отдельном процессе с профилем из DJANGO_SETTINGS_MODULE и печатает результаты в JSON.
+    """
+    import resource
+    import time
+
+    started = time.perf_counter()
+    import django
+
+    django.setup()
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns  # Импорт всех модулей URL-конфигурации и представлений
+    WSGIHandler()  # Загрузка цепочки middleware
+    startup = time.perf_counter() - started
+
+    from django.conf import settings
+    from django.test import Client
+
+    settings.ALLOWED_HOSTS = ["testserver"]
+    client = Client()
+    latencies = {}
+    for path in PATHS:
+        client.get(path)  # Прогрев
+        samples = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            client.get(path)
+            samples.append(time.perf_counter() - started)
+        latencies[path] = samples
+
+    print(
+        json.dumps(
+            {
+                "startup": startup,
+                "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                "modules": len(sys.modules),
+                "latencies": latencies,
+            }
+        )
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает профили настроек: время запуска воркера (django.setup, URL-конфигурация, middleware), "
+        "память процесса и задержку запроса через стек middleware и DRF."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Количество запросов на каждый URL")
+        parser.add_argument("--runs", type=int, default=3, help="Количество запусков процесса на профиль")
+        parser.add_argument("--profiles", nargs="+", default=PROFILES, help="Модули настроек для сравнения")
+
+    def run_child(self, profile, requests):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": profile}
+        code = f"from config.management.commands.bench_profiles import measure; measure({requests})"
+        output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        for profile in options["profiles"]:
+            runs = [self.run_child(profile, options["requests"]) for _ in range(options["runs"])]
+            startup = statistics.median(run["startup"] for run in runs)
+            memory = statistics.median(run["maxrss_kb"] for run in runs) / 1024
+            self.stdout.write(
+                f"{profile}: запуск {startup * 1000:.0f} мс, память {memory:.1f} МБ, модулей {runs[0]['modules']}"
+            )
+            for path in PATHS:
+                samples = sorted(sample for run in runs for sample in run["latencies"][path])
+                p50 = samples[len(samples) // 2] * 1000
+                p99 = samples[int(len(samples) * 0.99)] * 1000
+                self.stdout.write(f"  GET {path}: p50 {p50:.3f} мс, p99 {p99:.3f} мс")
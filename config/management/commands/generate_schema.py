@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from config.schema import CODECS, generate_schema, schema_path
+
+
+class Command(BaseCommand):
+    help = "Генерирует OpenAPI-схему в файлы settings.OPENAPI_SCHEMA_DIR (swagger.json, swagger.yaml)."
+
+    def handle(self, *args, **options):
+        for format in CODECS:
+            path = schema_path(format)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(generate_schema(format))
+            self.stdout.write(f"Схема записана в {path}")
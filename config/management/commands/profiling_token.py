@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from config.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Выдаёт сотруднику токен для профилирования запросов: передайте его в заголовке X-Profile. "
+        "Токен перестаёт действовать, если пользователь деактивирован или больше не сотрудник."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("email", help="Email сотрудника, на которого выдаётся токен")
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(email=options["email"], is_active=True, is_staff=True).first()
+        if user is None:
+            raise CommandError("Активный сотрудник с таким email не найден.")
+        self.stdout.write(make_token(user))
+        self.stdout.write(f"Действует {settings.PROFILING['TOKEN_MAX_AGE']} с", self.style.WARNING)
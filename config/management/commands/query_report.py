@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from config.querystats import load_reports
+
+
+class Command(BaseCommand):
+    help = "Выводит самые затратные отпечатки SQL-запросов по статистике всех процессов (QUERY_STATS)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20, help="Количество строк отчёта")
+        parser.add_argument(
+            "--by",
+            choices=["total", "count", "max"],
+            default="total",
+            help="Сортировка: суммарное время, число, максимум",
+        )
+        parser.add_argument("--per-view", action="store_true", help="Не объединять отпечатки разных представлений")
+
+    def handle(self, *args, **options):
+        entries = load_reports(settings.QUERY_STATS["DIR"])
+        if not options["per_view"]:
+            merged = {}
+            for entry in entries:
+                current = merged.setdefault(entry["fingerprint"], {**entry, "view": set(), "count": 0, "total": 0.0})
+                current["view"].add(entry["view"])
+                current["count"] += entry["count"]
+                current["total"] += entry["total"]
+                current["max"] = max(current["max"], entry["max"])
+            entries = [{**entry, "view": ", ".join(sorted(entry["view"]))} for entry in merged.values()]
+
+        if not entries:
+            self.stdout.write("Статистики нет: включите QUERY_STATS и дождитесь записи файлов.")
+            return
+        db_time = sum(entry["total"] for entry in entries)
+        for entry in sorted(entries, key=lambda entry: entry[options["by"]], reverse=True)[: options["top"]]:
+            self.stdout.write(
+                f"{entry['total'] * 1000:10.1f} мс {entry['total'] / db_time:6.1%} "
+                f"x{entry['count']:<7} ср. {entry['total'] / entry['count'] * 1000:.2f} мс "
+                f"макс. {entry['max'] * 1000:.2f} мс [{entry['view']}]"
+            )
+            self.stdout.write(f"    {entry['fingerprint']}")
@@ -0,0 +1,184 @@
+"""
+Профилирование запросов в рабочем окружении.
+
+Два режима, оба настраиваются в settings.PROFILING:
+
+- Профиль отдельного запроса. Запрос с заголовком X-Profile с подписанным
+  токеном из manage.py profiling_token выполняется под cProfile. Статистика
+  сохраняется в PROFILING["DIR"] в формате pstats, её имя возвращается в
+  заголовке X-Profile-Id, а скачать файл может администратор:
+  GET /profiling/<имя>/. Токен подписан SECRET_KEY, ограничен по времени и
+  выдаётся на сотрудника: он действует, пока этот пользователь активен и
+  остаётся сотрудником. Токен принимается только в заголовке, чтобы не
+  попадать в журналы доступа и заголовок Referer. В каталоге хранятся не
+  больше PROFILING["MAX_FILES"] последних файлов pstats, старые удаляются.
+  Без заголовка middleware лишь проверяет его наличие.
+
+- Сэмплирование. При PROFILING["SAMPLING"] фоновый поток раз в
+  PROFILING["SAMPLE_INTERVAL"] секунд снимает стеки всех потоков процесса и
+  учитывает те, в которых есть кадры модулей PROFILING["SAMPLE_MODULES"].
+  Накопленные стеки раз в PROFILING["FLUSH_INTERVAL"] секунд записываются в
+  PROFILING["DIR"]/sampled-<pid>.collapsed в свёрнутом формате
+  ("кадр;кадр;... количество"), который принимают flamegraph.pl и speedscope.
+  Стоимость сэмплирования не зависит от количества запросов.
+"""
+
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.http import FileResponse, Http404
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+
+TOKEN_SALT = "config.profiling"
+PROFILE_NAME = re.compile(r"^[\w.-]+\.(pstats|collapsed)$")
+
+
+def make_token(user):
+    """
+    Создаёт токен сотрудника user, включающий профилирование запросов на PROFILING["TOKEN_MAX_AGE"] секунд.
+    """
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(str(user.pk))
+
+
+def is_valid_token(token):
+    """
+    Проверяет подпись и срок токена, а также то, что его владелец - активный сотрудник.
+    """
+    try:
+        user_id = signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=settings.PROFILING["TOKEN_MAX_AGE"])
+    except signing.BadSignature:
+        return False
+    return user_id.isdigit() and get_user_model().objects.filter(pk=user_id, is_active=True, is_staff=True).exists()
+
+
+def rotate_profiles(directory, keep):
+    """
+    Удаляет старые файлы pstats, оставляя keep последних (имена начинаются со времени создания).
+    """
+    profiles = sorted(directory.glob("*.pstats"))
+    for path in profiles[: max(len(profiles) - keep, 0)]:
+        path.unlink(missing_ok=True)
+
+
+class StackSampler:
+    """
+    Сэмплирующий профилировщик стеков в фоновом потоке.
+    """
+
+    def __init__(self, interval, modules, path, flush_interval):
+        self.interval = interval
+        self.modules = tuple(modules)
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.counts = Counter()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def collapse(self, frame):
+        """
+        Сворачивает стек в строку "модуль:функция;..." от внешнего кадра к внутреннему.
+
+        :return: Строка или None, если в стеке нет кадров отслеживаемых модулей.
+        """
+        names, matched = [], False
+        while frame is not None:
+            module = frame.f_globals.get("__name__", "?")
+            matched = matched or module.startswith(self.modules)
+            names.append(f"{module}:{frame.f_code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names)) if matched else None
+
+    def sample(self):
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident != own:
+                stack = self.collapse(frame)
+                if stack:
+                    self.counts[stack] += 1
+
+    def flush(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text("".join(f"{stack} {count}\n" for stack, count in self.counts.items()))
+        os.replace(temporary, self.path)  # Читатель никогда не видит наполовину записанный файл
+
+    def run(self):
+        flushed = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            self.sample()
+            if time.monotonic() - flushed >= self.flush_interval:
+                self.flush()
+                flushed = time.monotonic()
+
+
+@lru_cache(maxsize=None)
+def get_sampler():
+    """
+    Возвращает сэмплер процесса (один на процесс, как и его файл).
+    """
+    config = settings.PROFILING
+    return StackSampler(
+        config["SAMPLE_INTERVAL"],
+        config["SAMPLE_MODULES"],
+        Path(config["DIR"]) / f"sampled-{os.getpid()}.collapsed",
+        config["FLUSH_INTERVAL"],
+    )
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запросы с токеном и запускает сэмплирование, если оно включено.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if settings.PROFILING["SAMPLING"]:
+            get_sampler().start()
+
+    def __call__(self, request):
+        token = request.headers.get("X-Profile")
+        if not token or not is_valid_token(token):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        response = profiler.runcall(self.get_response, request)
+        directory = Path(settings.PROFILING["DIR"])
+        directory.mkdir(parents=True, exist_ok=True)
+        # Имена с микросекундами упорядочены по времени создания, по ним rotate_profiles находит старые
+        name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:8]}.pstats"
+        profiler.dump_stats(directory / name)
+        rotate_profiles(directory, settings.PROFILING["MAX_FILES"])
+        response["X-Profile-Id"] = name
+        return response
+
+
+class ProfileDownload(APIView):
+    """
+    Скачивание файла профиля (pstats или свёрнутых стеков). Только для администраторов.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, name):
+        path = Path(settings.PROFILING["DIR"]) / name
+        if not PROFILE_NAME.match(name) or not path.is_file():
+            raise Http404
+        return FileResponse(path.open("rb"), as_attachment=True, filename=name)
@@ -0,0 +1,177 @@
+"""
+Статистика SQL-запросов по отпечаткам.
+
+QueryStatsMiddleware подключает к соединению execute_wrapper на время запроса.
+Каждый запрос приводится к отпечатку: литералы заменяются на ?, списки
+IN (...) сворачиваются, пробелы нормализуются, поэтому запросы одной формы с
+разными параметрами попадают в одну запись. Для каждой пары (представление,
+отпечаток) накапливаются количество, суммарное и максимальное время.
+
+Запросы дольше QUERY_STATS["SLOW_THRESHOLD"] записываются в журнал
+config.querystats вместе с кадром кода ads/users, который их выполнил.
+
+Статистика процесса раз в QUERY_STATS["FLUSH_INTERVAL"] секунд записывается
+в QUERY_STATS["DIR"]/queries-<pid>.json; manage.py query_report объединяет
+файлы всех процессов и выводит самые затратные отпечатки.
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+ORIGIN_MODULES = ("ads.", "users.")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """
+    Приводит SQL к отпечатку: SELECT ... WHERE id IN (%s, %s) -> SELECT ... WHERE id IN (...).
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def query_origin():
+    """
+    Возвращает "модуль:строка функция" ближайшего кадра из кода ads/users или None.
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(ORIGIN_MODULES):
+            return f"{module}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class QueryStats:
+    """
+    Накопитель статистики процесса: (представление, отпечаток) -> [количество, сумма, максимум].
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._flushed = time.monotonic()
+
+    def add(self, view, sql, duration):
+        key = (view, fingerprint(sql))
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.entries[key] = [1, duration, duration]
+            else:
+                entry[0] += 1
+                entry[1] += duration
+                entry[2] = max(entry[2], duration)
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                {"view": view, "fingerprint": sql, "count": count, "total": total, "max": longest}
+                for (view, sql), (count, total, longest) in self.entries.items()
+            ]
+
+    def flush(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"queries-{os.getpid()}.json"
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, path)
+        self._flushed = time.monotonic()
+
+    def maybe_flush(self, directory, interval):
+        if time.monotonic() - self._flushed >= interval:
+            self.flush(directory)
+
+
+stats = QueryStats()
+
+
+class QueryRecorder:
+    """
+    execute_wrapper одного запроса: измеряет время SQL и учитывает его в статистике.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.slow_threshold = settings.QUERY_STATS["SLOW_THRESHOLD"]
+
+    def view_name(self):
+        match = getattr(self.request, "resolver_match", None)
+        return match.view_name if match else self.request.path
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            stats.add(self.view_name(), sql, duration)
+            if duration >= self.slow_threshold:
+                logger.warning(
+                    "Медленный запрос %.1f мс в %s из %s: %s",
+                    duration * 1000,
+                    self.view_name(),
+                    query_origin(),
+                    sql,
+                )
+
+
+def load_reports(directory):
+    """
+    Объединяет статистику всех процессов из файлов queries-*.json.
+
+    :return: Список записей {"view", "fingerprint", "count", "total", "max"}.
+    """
+    merged = {}
+    for path in Path(directory).glob("queries-*.json"):
+        for entry in json.loads(path.read_text()):
+            key = (entry["view"], entry["fingerprint"])
+            if key in merged:
+                merged[key]["count"] += entry["count"]
+                merged[key]["total"] += entry["total"]
+                merged[key]["max"] = max(merged[key]["max"], entry["max"])
+            else:
+                merged[key] = dict(entry)
+    return list(merged.values())
+
+
+class QueryStatsMiddleware:
+    """
+    Собирает статистику SQL-запросов представлений, если QUERY_STATS["ENABLED"].
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_STATS["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with connection.execute_wrapper(QueryRecorder(request)):
+            response = self.get_response(request)
+        config = settings.QUERY_STATS
+        stats.maybe_flush(config["DIR"], config["FLUSH_INTERVAL"])
+        return response
@@ -0,0 +1,91 @@
+"""
+OpenAPI-схема API.
+
+Схема генерируется один раз командой generate_schema в файлы
+settings.OPENAPI_SCHEMA_DIR (swagger.json и swagger.yaml) и отдаётся из
+памяти с долгим кэшированием и ETag. Если файла нет, схема генерируется
+при первом запросе и хранится в памяти процесса.
+"""
+
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+API_INFO = openapi.Info(
+    title="Snippets API",
+    default_version="v1",
+    description="Test description",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
+)
+
+schema_view = get_schema_view(
+    API_INFO,
+    public=True,
+    permission_classes=(permissions.AllowAny,),
+)
+
+CODECS = {
+    ".json": (OpenAPICodecJson, "application/json"),
+    ".yaml": (OpenAPICodecYaml, "application/yaml"),
+}
+
+
+def schema_path(format):
+    return Path(settings.OPENAPI_SCHEMA_DIR) / f"swagger{format}"
+
+
+def generate_schema(format):
+    """
+    Генерирует схему всех представлений в указанном формате.
+
+    :param format: ".json" или ".yaml".
+    :return: Схема в байтах.
+    """
+    codec, _ = CODECS[format]
+    schema = OpenAPISchemaGenerator(info=API_INFO).get_schema(request=None, public=True)
+    return codec(validators=[]).encode(schema)
+
+
+@lru_cache(maxsize=None)
+def load_schema(format):
+    """
+    Возвращает схему и её ETag, читая файл или, если его нет, генерируя схему.
+
+    :param format: ".json" или ".yaml".
+    :return: Кортеж (схема в байтах, ETag).
+    """
+    path = schema_path(format)
+    data = path.read_bytes() if path.exists() else generate_schema(format)
+    return data, f'"{hashlib.md5(data).hexdigest()}"'
+
+
+def _schema_etag(request, format):
+    return load_schema(format)[1] if format in CODECS else None
+
+
+@require_safe
+@cache_control(public=True, max_age=settings.OPENAPI_SCHEMA_MAX_AGE)
+@condition(etag_func=_schema_etag)
+def schema_file_view(request, format):
+    """
+    Отдаёт OpenAPI-схему.
+
+    - GET /swagger.json - Схема в JSON.
+    - GET /swagger.yaml - Схема в YAML.
+    """
+    if format not in CODECS:
+        raise Http404
+    data, _ = load_schema(format)
+    return HttpResponse(data, content_type=CODECS[format][1])
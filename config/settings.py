@@ -26,11 +26,15 @@ INSTALLED_APPS = [
     "django_filters",
     "drf_yasg",
     "corsheaders",
+    "config",  # Команды управления проекта (config/management/commands)
     "users",
     "ads",
 ]
 
 MIDDLEWARE = [
+    "config.health.HealthCheckMiddleware",  # /healthz и /readyz в обход остальных middleware
+    "config.profiling.ProfilingMiddleware",  # Профилирование запросов по токену и сэмплирование стеков
+    "config.querystats.QueryStatsMiddleware",  # Статистика SQL-запросов по отпечаткам (QUERY_STATS)
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -93,6 +97,70 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Политика хеширования паролей: PASSWORD_HASHING_POLICY = scrypt (по умолчанию), argon2 (нужен argon2-cffi)
+# или pbkdf2. Хешер политики ставится первым в PASSWORD_HASHERS, остальные остаются для проверки старых
+# хешей, которые пересчитываются при следующем успешном входе (см. users/hashers.py)
+PASSWORD_HASHING = {
+    "POLICY": os.getenv("PASSWORD_HASHING_POLICY", "scrypt"),
+    "SCRYPT": {"work_factor": 2**14, "block_size": 8, "parallelism": 1},  # ~16 МБ памяти на хеш
+    "ARGON2": {"time_cost": 2, "memory_cost": 19 * 1024, "parallelism": 1},  # Параметры OWASP, память в КиБ
+    "PBKDF2": {"iterations": 600000},
+}
+
+_TUNED_HASHERS = {
+    "scrypt": "users.hashers.TunedScryptPasswordHasher",
+    "argon2": "users.hashers.TunedArgon2PasswordHasher",
+    "pbkdf2": "users.hashers.TunedPBKDF2PasswordHasher",
+}
+
+PASSWORD_HASHERS = [
+    _TUNED_HASHERS[PASSWORD_HASHING["POLICY"]],
+    *(hasher for policy, hasher in _TUNED_HASHERS.items() if policy != PASSWORD_HASHING["POLICY"]),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+]
+
+# Пул потоков для представлений с хешированием паролей (регистрация, вход, смена пароля), см. users/hashing_pool.py.
+# При занятых MAX_WORKERS потоках и MAX_PENDING местах в очереди запрос сразу получает 503 с Retry-After.
+# Нужен только под ASGI: config/asgi.py включает его, если переменная AUTH_HASHING_POOL не задана явно
+AUTH_HASHING_POOL = {
+    "ENABLED": os.getenv("AUTH_HASHING_POOL", "False") == "True",
+    "MAX_WORKERS": os.cpu_count() or 1,
+    "MAX_PENDING": 32,
+    "RETRY_AFTER": 1,  # Секунды
+}
+
+# Пакетные запросы /batch/ (см. config/batch.py)
+API_BATCH = {
+    "MAX_REQUESTS": 20,  # Максимальное количество подзапросов в пакете
+    "MAX_WORKERS": 4,  # Потоки для параллельного выполнения GET-подзапросов (1 - последовательно)
+}
+
+# Пробы /healthz и /readyz (см. config/health.py)
+HEALTH_CHECK = {
+    "DB_TIMEOUT": 1.0,  # Максимальное время ответа БД на SELECT 1 в секундах
+    "CACHE_TTL": 5.0,  # Время жизни результата проверки БД в секундах
+}
+
+# Профилирование запросов (см. config/profiling.py): токен для заголовка X-Profile выдаёт manage.py profiling_token
+PROFILING = {
+    "DIR": BASE_DIR / "profiles",  # Каталог файлов pstats и свёрнутых стеков
+    "TOKEN_MAX_AGE": 60 * 60,  # Срок действия токена в секундах
+    "MAX_FILES": 100,  # Сколько последних файлов pstats хранить в DIR
+    "SAMPLING": os.getenv("PROFILING_SAMPLING") == "True",  # Фоновое сэмплирование стеков
+    "SAMPLE_INTERVAL": 0.01,  # Интервал снятия стеков в секундах
+    "SAMPLE_MODULES": ("ads.views", "users.views"),  # Учитываются стеки с кадрами этих модулей
+    "FLUSH_INTERVAL": 60,  # Интервал записи свёрнутых стеков в файл в секундах
+}
+
+# Статистика SQL-запросов по отпечаткам (см. config/querystats.py), отчёт: manage.py query_report
+QUERY_STATS = {
+    "ENABLED": os.getenv("QUERY_STATS") == "True",
+    "DIR": BASE_DIR / "querystats",  # Каталог файлов статистики процессов
+    "SLOW_THRESHOLD": 0.1,  # Запросы дольше этого времени в секундах записываются в журнал
+    "FLUSH_INTERVAL": 60,  # Интервал записи статистики процесса в файл в секундах
+}
+
 
 LANGUAGE_CODE = "ru-ru"
 
@@ -136,11 +204,136 @@ REST_FRAMEWORK = {
     ),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 5,
+    "DEFAULT_THROTTLE_CLASSES": ("users.throttling.TokenBucketThrottle",),  # Лимиты из AUTH_THROTTLE
+    # Количество доверенных прокси перед приложением: 0 - адрес клиента из REMOTE_ADDR, X-Forwarded-For
+    # не учитывается (его может подделать клиент); N - адрес клиента N-й с конца в X-Forwarded-For
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES") or 0),
+}
+
+# Ограничение частоты запросов по имени URL: ключ "ip" - по адресу клиента,
+# "account" - по email из тела запроса. BACKEND - хранилище вёдер:
+# users.throttling.LocalMemoryBackend (память процесса) или
+# users.throttling.CacheBackend (общий кэш Django, OPTIONS: alias)
+AUTH_THROTTLE = {
+    "BACKEND": "users.throttling.LocalMemoryBackend",
+    "OPTIONS": {},
+    "RATES": {
+        "users:login": {"ip": "30/min", "account": "10/min"},
+        "users:register": {"ip": "10/hour"},
+        "users:reset_password": {"ip": "10/hour", "account": "3/hour"},
+        "users:reset_password_confirm": {"ip": "20/hour"},
+    },
 }
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.TokenRefreshSerializer",  # Отклоняет отозванные токены
+}
+
+# Отзыв refresh-токенов (см. users/revocation.py, очистка истёкших - manage.py prune_revoked_tokens)
+TOKEN_REVOCATION = {
+    "SYNC_INTERVAL": 5,  # Интервал догрузки отзывов других процессов в фильтр в секундах
+    "REBUILD_INTERVAL": 10 * 60,  # Интервал полной перестройки фильтра без истёкших токенов в секундах
+    "SYNC_MARGIN": 60,  # Запас при догрузке отзывов на поздно зафиксированные транзакции, в секундах
+    "FALSE_POSITIVE_RATE": 0.01,  # Доля проверок, которые пойдут в БД для неотозванного токена
+    "MIN_CAPACITY": 10000,  # Минимальное число токенов, на которое рассчитан фильтр
 }
 
 FRONTEND_URL = "http://localhost:3000"
+
+# OpenAPI-схема: файлы создаются командой generate_schema и отдаются с долгим кэшированием (см. config/schema.py)
+OPENAPI_SCHEMA_DIR = BASE_DIR / "schema"
+OPENAPI_SCHEMA_MAX_AGE = 24 * 60 * 60  # Секунды
+OPENAPI_UI_CACHE_TIMEOUT = 60 * 60  # Кэш страниц swagger/redoc в секундах
+
+# Страницы swagger/redoc загружают схему из заранее сгенерированного файла, а не генерируют её заново
+SWAGGER_SETTINGS = {"SPEC_URL": ("schema-json", {"format": ".json"})}
+REDOC_SETTINGS = {"SPEC_URL": ("schema-json", {"format": ".json"})}
+
+# Изменения объявлений моложе этой задержки не отдаются в /ads/changes/,
+# чтобы клиент не пропустил изменения из ещё не зафиксированных транзакций
+ADS_CHANGES_LAG = timedelta(seconds=2)
+
+# Время жизни кэша гистограммы цен /ads/facets/ в секундах
+ADS_FACETS_CACHE_TIMEOUT = 60
+
+# Секционирование объявлений (manage.py partition_ads, только PostgreSQL)
+ADS_PARTITION_RETENTION_MONTHS = 24  # Секции старше этого срока архивируются
+ADS_PARTITION_ARCHIVE_DIR = BASE_DIR / "archive"  # Каталог для сжатых архивов секций
+
+# Пакетная очистка данных (manage.py purge_data и действие админки пользователей)
+PURGE_BATCH_SIZE = 500  # Количество строк в одном DELETE
+PURGE_BATCH_PAUSE = 0.1  # Пауза между пачками в секундах
+
+# Время жизни кэша объявлений по ID для /ads/batch/ и /ads/upd/<id>/ в секундах
+# (сбрасывается при сохранении и удалении)
+ADS_BATCH_CACHE_TIMEOUT = 300
+
+# Время свежести кэша первой страницы /ads/ без параметров в секундах (помечается устаревшей при изменении объявлений)
+ADS_LIST_CACHE_TIMEOUT = 30
+
+# Объединение одновременных промахов кэша (см. config/singleflight.py)
+SINGLE_FLIGHT = {
+    "WAIT_TIMEOUT": 2.0,  # Сколько секунд ждать чужого пересчёта, прежде чем считать самому
+    "STALE_TTL": 60,  # Сколько секунд после времени свежести отдавать устаревшее значение во время пересчёта
+    "SHARED_LOCK": False,  # Блокировка пересчёта в общем кэше на все процессы (нужен Redis или Memcached)
+    "LOCK_TIMEOUT": 10,  # Время жизни общей блокировки в секундах
+    "POLL_INTERVAL": 0.05,  # Интервал опроса кэша при ожидании другого процесса в секундах
+}
+
+# Просмотры и популярность объявлений (см. ads/popularity.py)
+ADS_POPULARITY = {
+    "BACKGROUND": True,  # Записывать просмотры в фоновом потоке процесса (список пересчитывает refresh_popular_ads)
+    "FLUSH_INTERVAL": 10,  # Интервал записи накопленных просмотров в секундах
+    "BATCH_SIZE": 500,  # Количество объявлений в одном INSERT ... ON CONFLICT
+    "HALF_LIFE": 24 * 60 * 60,  # Период полураспада популярности в секундах
+    "EPOCH_HALF_LIVES": 32,  # Длина эпохи в периодах полураспада (ограничивает рост значений score)
+    "TOP_SIZE": 100,  # Количество объявлений в /ads/popular/
+}
+
+# Поиск почти одинаковых объявлений автора (см. ads/dedup.py, очистка каталога - manage.py dedupe_ads)
+ADS_DEDUP = {
+    "ACTION": "reject",  # reject - отклонить повтор при создании, flag - сохранить с duplicate_of и скрыть из списка
+    "THRESHOLD": 0.8,  # Минимальное сходство текстов (оценка коэффициента Жаккара)
+    "SHINGLE_SIZE": 3,  # Количество слов в шингле
+    "PERMUTATIONS": 64,  # Длина MinHash-сигнатуры
+    "BANDS": 16,  # Количество LSH-полос (PERMUTATIONS должно делиться на BANDS)
+    "MAX_CANDIDATES": 100,  # Сколько кандидатов проверять по сигнатурам при создании объявления
+}
+
+# Повтор запросов на создание объявлений и отзывов с заголовком Idempotency-Key (см. ads/idempotency.py,
+# очистка истёкших ключей - manage.py prune_idempotency_keys)
+ADS_IDEMPOTENCY = {
+    "TTL": 24 * 60 * 60,  # Время, в течение которого повтор с тем же ключом получает сохранённый ответ, в секундах
+}
+
+# Похожие объявления /ads/<id>/similar/ (см. ads/similar.py, пересчёт - manage.py build_similar_ads)
+SIMILAR_ADS = {
+    "DIR": BASE_DIR / "similar",  # Каталог файлов индекса
+    "NEIGHBORS": 10,  # Количество соседей каждого объявления
+    "FEATURES": 32,  # Количество признаков в векторе объявления
+    "DIMENSIONS": 2**18,  # Размер пространства хэшированных слов
+    "MAX_POSTINGS": 10000,  # Признаки более частые, чем в стольких объявлениях, не используются для отбора кандидатов
+}
+
+# Сохранённые поиски и уведомления о новых объявлениях (см. ads/saved_searches.py)
+ADS_SAVED_SEARCHES = {
+    "ASYNC": True,  # Сопоставлять новые объявления в фоновом потоке, а не в запросе, создавшем объявление
+    "FLUSH_INTERVAL": 1,  # Время накопления новых объявлений перед сопоставлением в секундах
+    "REBUILD_INTERVAL": 300,  # Интервал полной перестройки индекса поисков в секундах
+    "SYNC_MARGIN": 60,  # Запас при догрузке изменённых поисков на поздно зафиксированные транзакции, в секундах
+    "MAX_PER_USER": 50,  # Максимальное количество сохранённых поисков у пользователя
+}
+
+# Копия имени и аватара продавца в объявлениях (см. ads/snapshots.py)
+ADS_SELLER_SNAPSHOT = {
+    "ASYNC": True,  # Обновлять объявления в фоновом потоке, а не в запросе, изменившем пользователя
+    "FLUSH_INTERVAL": 5,  # Время накопления изменений пользователей перед обновлением в секундах
+    "BATCH_SIZE": 500,  # Количество объявлений в одном UPDATE
+}
+
+# SSE-поток новых объявлений /ads/stream/ (только под ASGI, см. config/asgi.py)
+ADS_STREAM_HEARTBEAT = 15  # Интервал пинга в секундах
+ADS_STREAM_QUEUE_SIZE = 100  # Размер очереди подписчика, при переполнении клиент получает reset
+ADS_STREAM_MAX_SUBSCRIBERS = 10000  # Лимит одновременных подписчиков на процесс
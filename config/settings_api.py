@@ -0,0 +1,37 @@
+from .settings import *  # Импортируем все основные настройки
+
+# Профиль только для API (DJANGO_SETTINGS_MODULE=config.settings_api).
+# В пути запроса остаётся только то, что нужно JWT API: админка, документация,
+# сессии, сообщения, CSRF и шаблоны не загружаются воркерами и не выполняются
+# на каждом запросе. Админка и документация обслуживаются отдельными процессами
+# с профилем config.settings. Сравнение профилей: manage.py bench_profiles
+
+INSTALLED_APPS = [
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "rest_framework",
+    "django_filters",
+    "corsheaders",
+    "config",  # Команды управления проекта (config/management/commands)
+    "users",
+    "ads",
+]
+
+MIDDLEWARE = [
+    "config.health.HealthCheckMiddleware",  # /healthz и /readyz в обход остальных middleware
+    "config.profiling.ProfilingMiddleware",  # Профилирование запросов по токену и сэмплирование стеков
+    "config.querystats.QueryStatsMiddleware",  # Статистика SQL-запросов по отпечаткам (QUERY_STATS)
+    "django.middleware.security.SecurityMiddleware",
+    "corsheaders.middleware.CorsMiddleware",
+    "django.middleware.common.CommonMiddleware",
+]
+
+ROOT_URLCONF = "config.urls_api"
+
+# Шаблоны нужны только админке и браузерному интерфейсу DRF
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),  # Без браузерного интерфейса DRF
+}
@@ -7,3 +7,23 @@ DATABASES = {
         "NAME": ":memory:",
     }
 }
+
+# Быстрый хешер для тестов: стойкость паролей в тестах не нужна, а PBKDF2/scrypt
+# составляют основную часть времени тестов авторизации
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+# Пул хеширования выполняет представления в других потоках, которые не видят
+# транзакцию теста, поэтому в тестах представления вызываются напрямую
+AUTH_HASHING_POOL = {**AUTH_HASHING_POOL, "ENABLED": False}
+
+# Копии продавцов обновляются сразу: фоновый поток не видит транзакцию теста
+ADS_SELLER_SNAPSHOT = {**ADS_SELLER_SNAPSHOT, "ASYNC": False}
+
+# GET-подзапросы /batch/ выполняются последовательно: потоки пула не видят транзакцию теста
+API_BATCH = {**API_BATCH, "MAX_WORKERS": 1}
+
+# Просмотры записываются явным вызовом counter.flush(), без фонового потока
+ADS_POPULARITY = {**ADS_POPULARITY, "BACKGROUND": False}
+
+# Новые объявления сопоставляются с сохранёнными поисками сразу: фоновый поток не видит транзакцию теста
+ADS_SAVED_SEARCHES = {**ADS_SAVED_SEARCHES, "ASYNC": False}
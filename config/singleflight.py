@@ -0,0 +1,144 @@
+"""
+Объединение одновременных промахов кэша (single-flight).
+
+Когда популярная запись пропадает из кэша, её пересчитывает только один
+запрос процесса (ведущий), а остальные ждут его результат до
+SINGLE_FLIGHT["WAIT_TIMEOUT"] секунд и только потом считают сами.
+
+Записи хранятся в кэше Django вместе со временем свежести: после него запись
+ещё STALE_TTL секунд считается устаревшей (stale-while-revalidate). Устаревшую
+запись пересчитывает ведущий, а остальные запросы сразу получают старое
+значение. expire() делает запись устаревшей явно, например после изменения
+объявлений; после cache.delete() запросы ждут пересчёта, не получая старого значения.
+
+Если SHARED_LOCK, ведущий дополнительно берёт блокировку в кэше (cache.add),
+чтобы запись пересчитывал один процесс на все серверы: это имеет смысл с
+общим кэшем (Redis, Memcached). Процесс, не получивший блокировку, отдаёт
+устаревшее значение или опрашивает кэш, пока его не запишет другой процесс.
+
+Счётчики процесса (stats()) выводятся в /readyz.
+"""
+
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+class Flight:
+    """
+    Пересчёт одного ключа, который ждут остальные запросы процесса.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+        self.value = None
+
+
+class SingleFlight:
+    """
+    Кэш с объединением пересчётов по ключу в пределах процесса.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        """
+        :return: Счётчики процесса: hits - свежие попадания, stale - отданные устаревшие значения,
+            computed - пересчёты, coalesced - запросы, получившие чужой пересчёт,
+            timeouts - запросы, не дождавшиеся пересчёта.
+        """
+        with self._lock:
+            return {name: self._counters[name] for name in ("hits", "stale", "computed", "coalesced", "timeouts")}
+
+    def get(self, key, compute, timeout):
+        """
+        Возвращает значение ключа, пересчитывая его через compute() не чаще одного раза на процесс.
+
+        :param timeout: Время свежести значения в секундах.
+        """
+        entry = cache.get(key)
+        if entry is not None:
+            value, fresh_until = entry
+            if time.time() < fresh_until:
+                self.count("hits")
+                return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+
+        if not leader:
+            if entry is not None:
+                self.count("stale")
+                return entry[0]
+            if flight.done.wait(settings.SINGLE_FLIGHT["WAIT_TIMEOUT"]) and flight.ok:
+                self.count("coalesced")
+                return flight.value
+            # Ведущий не успел или упал: считаем сами
+            self.count("timeouts")
+            self.count("computed")
+            return compute()
+
+        try:
+            flight.value, flight.ok = self._lead(key, entry, compute, timeout), True
+            return flight.value
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _lead(self, key, entry, compute, timeout):
+        config = settings.SINGLE_FLIGHT
+        lock_key = f"{key}:lock"
+        if config["SHARED_LOCK"] and not cache.add(lock_key, 1, config["LOCK_TIMEOUT"]):
+            # Запись пересчитывает другой процесс
+            if entry is not None:
+                self.count("stale")
+                return entry[0]
+            deadline = time.monotonic() + config["WAIT_TIMEOUT"]
+            while time.monotonic() < deadline:
+                time.sleep(config["POLL_INTERVAL"])
+                polled = cache.get(key)
+                if polled is not None and time.time() < polled[1]:
+                    self.count("coalesced")
+                    return polled[0]
+            self.count("timeouts")
+            lock_key = None
+        try:
+            value = compute()
+            self.count("computed")
+            cache.set(key, (value, time.time() + timeout), timeout + config["STALE_TTL"])
+            return value
+        finally:
+            if config["SHARED_LOCK"] and lock_key is not None:
+                cache.delete(lock_key)
+
+    def expire(self, *keys):
+        """
+        Делает записи устаревшими сразу и ещё раз после фиксации транзакции: следующий запрос
+        пересчитает запись, а одновременные с ним получат прежнее значение.
+        """
+
+        def mark():
+            for key, entry in cache.get_many(keys).items():
+                cache.set(key, (entry[0], 0), settings.SINGLE_FLIGHT["STALE_TTL"])
+
+        mark()
+        transaction.on_commit(mark)
+
+
+flights = SingleFlight()
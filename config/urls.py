@@ -1,32 +1,22 @@
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path
 
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Snippets API",
-        default_version="v1",
-        description="Test description",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@snippets.local"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from .schema import schema_file_view, schema_view
+from .urls_api import urlpatterns as api_urlpatterns
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("swagger<format>/", schema_view.without_ui(cache_timeout=0), name="schema-json"),
+    path("swagger<format>/", schema_file_view, name="schema-json"),  # Заранее сгенерированная схема
     path(
         "swagger/",
-        schema_view.with_ui("swagger", cache_timeout=0),
+        schema_view.with_ui("swagger", cache_timeout=settings.OPENAPI_UI_CACHE_TIMEOUT),
         name="schema-swagger-ui",
     ),
-    path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
-    path("users/", include("users.urls", namespace="users")),  # Подключаем отдельные маршруты для пользователей
-    path("ads/", include("ads.urls")),  # Подключаем отдельные маршруты для объявлений и отзывов
+    path(
+        "redoc/",
+        schema_view.with_ui("redoc", cache_timeout=settings.OPENAPI_UI_CACHE_TIMEOUT),
+        name="schema-redoc",
+    ),
+    *api_urlpatterns,
 ]
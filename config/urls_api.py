@@ -0,0 +1,12 @@
+from django.urls import path, include
+
+from .batch import BatchView
+from .profiling import ProfileDownload
+
+# Маршруты API без админки и документации (профиль config.settings_api)
+urlpatterns = [
+    path("users/", include("users.urls", namespace="users")),  # Подключаем отдельные маршруты для пользователей
+    path("ads/", include("ads.urls")),  # Подключаем отдельные маршруты для объявлений и отзывов
+    path("batch/", BatchView.as_view(), name="batch"),  # Несколько запросов API за один HTTP-запрос
+    path("profiling/<str:name>/", ProfileDownload.as_view(), name="profiling-download"),  # Файлы профилей
+]
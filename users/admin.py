@@ -1,10 +1,14 @@
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+
+from ads.admin_tools import ScalableAdminMixin
+from ads.retention import purge_users
 from .models import User
 
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(ScalableAdminMixin, UserAdmin):
     """
     Административный интерфейс для модели Users.
 
@@ -35,5 +39,20 @@ class CustomUserAdmin(UserAdmin):
     )
 
     list_display = ("email", "phone", "is_staff")  # Поля, отображаемые в списке пользователей
-    search_fields = ("email", "phone")  # Поля, по которым можно осуществлять поиск
+    search_fields = ("email", "phone")  # Поиск по триграммным индексам user_email_trgm_idx, user_phone_trgm_idx
     ordering = ("email",)  # Поле, по которому будет происходить сортировка
+    actions = ["purge_selected"]  # Пакетное удаление вместо каскада delete_selected
+
+    @admin.action(
+        description="Удалить выбранных пользователей с объявлениями и отзывами (пакетно)",
+        permissions=["delete"],
+    )
+    def purge_selected(self, request, queryset):
+        """
+        Удаляет выбранных пользователей, предварительно очистив их объявления и отзывы пачками.
+        """
+        stats = purge_users(queryset, settings.PURGE_BATCH_SIZE, settings.PURGE_BATCH_PAUSE)
+        self.message_user(
+            request,
+            f"Удалено пользователей: {stats['users']}, объявлений: {stats['ads']}, отзывов: {stats['reviews']}.",
+        )
@@ -0,0 +1,65 @@
+"""
+Хешеры паролей с параметрами из settings.PASSWORD_HASHING.
+
+Хешеры сохраняют имена алгоритмов стандартных хешеров Django, поэтому
+проверяют уже сохранённые хеши. Если параметры хеша пользователя отличаются
+от текущих или его алгоритм не первый в PASSWORD_HASHERS, Django при
+успешном входе пересчитывает хеш (check_password -> must_update), и старые
+хеши обновляются прозрачно для пользователя.
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """
+    scrypt с параметрами из settings.PASSWORD_HASHING["SCRYPT"] (work_factor, block_size, parallelism).
+    """
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_HASHING["SCRYPT"]["work_factor"]
+
+    @property
+    def block_size(self):
+        return settings.PASSWORD_HASHING["SCRYPT"]["block_size"]
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_HASHING["SCRYPT"]["parallelism"]
+
+    @property
+    def maxmem(self):
+        # Память scrypt - 128 * r * (N + p + 2) байт; лимит OpenSSL по умолчанию (32 МБ) мал для N > 2 ** 14
+        return 128 * self.block_size * (self.work_factor + self.parallelism + 2) + 1024 * 1024
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2id с параметрами из settings.PASSWORD_HASHING["ARGON2"] (time_cost, memory_cost, parallelism).
+
+    Требует установленного пакета argon2-cffi.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_HASHING["ARGON2"]["time_cost"]
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_HASHING["ARGON2"]["memory_cost"]
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_HASHING["ARGON2"]["parallelism"]
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 с количеством итераций из settings.PASSWORD_HASHING["PBKDF2"]["iterations"].
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHING["PBKDF2"]["iterations"]
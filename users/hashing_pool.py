@@ -0,0 +1,83 @@
+"""
+Выполнение представлений авторизации в отдельном ограниченном пуле потоков.
+
+Под ASGI синхронные представления Django по умолчанию выполняются в одном
+общем потоке (sync_to_async(thread_sensitive=True)), поэтому хеширование пароля
+при регистрации или входе задерживает все остальные синхронные запросы.
+Обёрнутые представления выполняются в пуле settings.AUTH_HASHING_POOL:
+hashlib.scrypt и hashlib.pbkdf2_hmac освобождают GIL, так что хеширование
+идёт параллельно и не занимает общий поток. Если все места в пуле и очереди
+заняты, запрос сразу получает 503 вместо ожидания в неограниченной очереди.
+
+Под WSGI у каждого запроса и так свой поток, поэтому пул включается только
+при запуске через config/asgi.py (или явно переменной AUTH_HASHING_POOL).
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+
+
+class HashingPool:
+    """
+    Пул потоков с ограничением на количество выполняемых и ожидающих запросов.
+    """
+
+    def __init__(self, max_workers, max_pending):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="auth-hashing")
+        self.capacity = max_workers + max_pending
+        self.slots = threading.BoundedSemaphore(self.capacity)
+
+    @property
+    def in_use(self):
+        """
+        Количество выполняемых и ожидающих запросов (для /readyz).
+        """
+        return self.capacity - self.slots._value
+
+
+@lru_cache(maxsize=None)
+def get_pool():
+    config = settings.AUTH_HASHING_POOL
+    return HashingPool(config["MAX_WORKERS"], config["MAX_PENDING"])
+
+
+def _run_view(view, request, *args, **kwargs):
+    try:
+        return view(request, *args, **kwargs)
+    finally:
+        # Соединение с БД принадлежит потоку пула: закрываем его, как это делает обработчик запроса
+        close_old_connections()
+
+
+def offload_hashing(view):
+    """
+    Оборачивает представление для выполнения в пуле хеширования.
+
+    Если settings.AUTH_HASHING_POOL["ENABLED"] ложно, представление возвращается без изменений.
+
+    :param view: Синхронное представление, например RegisterView.as_view().
+    :return: Асинхронное представление.
+    """
+    if not settings.AUTH_HASHING_POOL["ENABLED"]:
+        return view
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        pool = get_pool()
+        if not pool.slots.acquire(blocking=False):
+            response = JsonResponse({"detail": "Сервер перегружен, повторите запрос позже."}, status=503)
+            response["Retry-After"] = str(settings.AUTH_HASHING_POOL["RETRY_AFTER"])
+            return response
+        try:
+            run = sync_to_async(_run_view, thread_sensitive=False, executor=pool.executor)
+            return await run(view, request, *args, **kwargs)
+        finally:
+            pool.slots.release()
+
+    return wrapper
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management import BaseCommand
+from django.utils.module_loading import import_string
+
+CONFIGURATIONS = {
+    "scrypt": "users.hashers.TunedScryptPasswordHasher",
+    "argon2": "users.hashers.TunedArgon2PasswordHasher",
+    "pbkdf2": "users.hashers.TunedPBKDF2PasswordHasher",
+    "md5 (только для тестов)": "django.contrib.auth.hashers.MD5PasswordHasher",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет количество проверок пароля (входов) в секунду на одно ядро "
+        "для каждого хешера с параметрами из settings.PASSWORD_HASHING."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=2.0, help="Длительность замера для каждого хешера")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Текущая политика: {settings.PASSWORD_HASHING['POLICY']}")
+        for name, path in CONFIGURATIONS.items():
+            hasher = import_string(path)()
+            try:
+                encoded = make_password("correct horse battery staple", hasher=hasher)
+            except ValueError as error:  # Не установлена библиотека хешера, например argon2-cffi
+                self.stdout.write(f"{name}: пропущен ({error})")
+                continue
+
+            checks, started = 0, time.perf_counter()
+            while time.perf_counter() - started < options["seconds"]:
+                check_password("correct horse battery staple", encoded, preferred=hasher)
+                checks += 1
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{name}: {checks / elapsed:.1f} входов/с на ядро ({elapsed / checks * 1000:.2f} мс)")
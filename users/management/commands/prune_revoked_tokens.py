@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from users.revocation import prune_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет записи об отозванных refresh-токенах с истёкшим сроком действия "
+        "(не позже SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'] после выдачи), например раз в сутки по расписанию."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.PURGE_BATCH_SIZE, help="Размер пачки")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Удалено записей: {prune_expired(options['batch_size'])}")
@@ -49,3 +49,26 @@ class User(AbstractUser):
         Возвращает строковое представление пользователя — его email.
         """
         return self.email
+
+
+class RevokedToken(models.Model):
+    """
+    Отозванный refresh-токен (см. users/revocation.py).
+
+    Поля:
+    - jti: Идентификатор токена (claim jti).
+    - expires_at: Время истечения токена; после него запись не нужна и удаляется
+      командой prune_revoked_tokens.
+    - revoked_at: Время и дата отзыва.
+    """
+
+    jti = models.CharField(max_length=255, unique=True)  # Идентификатор токена
+    expires_at = models.DateTimeField(db_index=True)  # Время истечения токена
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)  # Время и дата отзыва
+
+    class Meta:
+        verbose_name = "Отозванный токен"
+        verbose_name_plural = "Отозванные токены"
+
+    def __str__(self):
+        return self.jti
@@ -0,0 +1,195 @@
+"""
+Отзыв refresh-токенов без запроса к БД на каждую проверку.
+
+Отозванные токены (их jti) хранятся в таблице RevokedToken, а проверяются
+через фильтр Блума в памяти процесса: если jti нет в фильтре, токен точно не
+отозван и БД не нужна. Только при попадании в фильтр (отозванный токен или
+ложное срабатывание с вероятностью TOKEN_REVOCATION["FALSE_POSITIVE_RATE"])
+выполняется запрос к таблице.
+
+Фильтр строится при первой проверке. Раз в SYNC_INTERVAL секунд в него
+догружаются токены, отозванные (в том числе в других процессах) после начала
+прошлой загрузки за вычетом SYNC_MARGIN секунд: ID и revoked_at выдаются до
+фиксации транзакции, и запись с меньшим ID может стать видимой позже, поэтому
+отзыв в другом процессе вступает в силу не позже чем через SYNC_INTERVAL
+секунд после фиксации. Раз в REBUILD_INTERVAL секунд (и когда записей
+становится больше, чем рассчитан фильтр) он перестраивается заново только из
+неистёкших записей. Загрузка из БД идёт вне блокировки фильтра: проверки
+продолжают работать по прежнему фильтру, а новый подменяет его целиком.
+
+Запись живёт до истечения самого токена, то есть не дольше
+SIMPLE_JWT["REFRESH_TOKEN_LIFETIME"] после выдачи; истёкшие записи удаляет
+команда prune_revoked_tokens.
+
+Отзываются только refresh-токены: access-токен остаётся действительным до
+своего истечения (SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"]).
+"""
+
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import RevokedToken
+
+
+class BloomFilter:
+    """
+    Фильтр Блума на capacity элементов с заданной долей ложных срабатываний.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))  # Число бит
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))  # Число хэш-функций
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # Двойное хэширование: k позиций из двух половин одного хэша
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationStore:
+    """
+    Фильтр отозванных токенов процесса с периодической синхронизацией с БД.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # Фильтр (короткие операции в памяти)
+        self._refresh_lock = threading.Lock()  # Загрузка из БД: одна на процесс
+        self._filter = None
+        self._count = 0
+        self._pending = None  # Отзывы этого процесса во время перестройки
+        self._built = 0.0
+        self._synced = 0.0
+        self._synced_at = None  # Время начала последней загрузки из БД
+
+    def _add(self, jti):
+        # Догрузка с запасом SYNC_MARGIN читает записи повторно: считаются только новые
+        if jti not in self._filter:
+            self._filter.add(jti)
+            self._count += 1
+
+    def _due(self):
+        config = settings.TOKEN_REVOCATION
+        elapsed = time.monotonic()
+        if self._filter is None or elapsed - self._built >= config["REBUILD_INTERVAL"]:
+            return "rebuild"
+        if self._count > self._filter.capacity:
+            return "rebuild"
+        if elapsed - self._synced >= config["SYNC_INTERVAL"]:
+            return "sync"
+        return None
+
+    def _refresh(self):
+        if self._due() is None:
+            return
+        # Пока фильтр не построен, проверки ждут загрузку; потом её ведёт один поток, а остальные не ждут
+        if not self._refresh_lock.acquire(blocking=self._filter is None):
+            return
+        try:
+            due = self._due()  # Другой поток мог обновить фильтр, пока этот ждал
+            if due is not None:
+                self._load(due == "rebuild")
+        finally:
+            self._refresh_lock.release()
+
+    def _load(self, rebuild):
+        config = settings.TOKEN_REVOCATION
+        started = timezone.now()
+        if rebuild:
+            with self._lock:
+                self._pending = []
+            active = RevokedToken.objects.filter(expires_at__gt=started)
+            # Запас вдвое, чтобы фильтр не переполнился отзывами до следующей перестройки
+            capacity = max(config["MIN_CAPACITY"], 2 * active.count())
+            bloom, count = BloomFilter(capacity, config["FALSE_POSITIVE_RATE"]), 0
+            for jti in active.values_list("jti", flat=True).iterator():
+                bloom.add(jti)
+                count += 1
+            with self._lock:
+                self._filter, self._count = bloom, count
+                for jti in self._pending:
+                    self._add(jti)
+                self._pending = None
+            self._built = time.monotonic()
+        else:
+            since = self._synced_at - timedelta(seconds=config["SYNC_MARGIN"])
+            jtis = list(RevokedToken.objects.filter(revoked_at__gte=since).values_list("jti", flat=True))
+            with self._lock:
+                for jti in jtis:
+                    self._add(jti)
+        # Отзывы, зафиксированные во время загрузки, попадут в следующую
+        self._synced, self._synced_at = time.monotonic(), started
+
+    def is_revoked(self, jti):
+        self._refresh()
+        with self._lock:
+            if jti not in self._filter:
+                return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, jti, expires_at):
+        RevokedToken.objects.get_or_create(jti=jti, defaults={"expires_at": expires_at})
+        with self._lock:
+            if self._filter is not None:
+                self._add(jti)
+            if self._pending is not None:
+                self._pending.append(jti)  # Перестраиваемый фильтр мог прочитать таблицу до этой записи
+
+    def reset(self):
+        """
+        Сбрасывает фильтр: он будет заново построен при следующей проверке.
+        """
+        with self._lock:
+            self._filter = None
+
+
+revoked = RevocationStore()
+
+
+def prune_expired(batch_size):
+    """
+    Удаляет пачками записи о токенах, срок действия которых истёк: такой токен отклоняется и без записи.
+
+    :return: Количество удалённых записей.
+    """
+    deleted = 0
+    expired = RevokedToken.objects.filter(expires_at__lte=timezone.now()).order_by().values_list("pk", flat=True)
+    while True:
+        ids = list(expired[:batch_size])
+        if not ids:
+            return deleted
+        RevokedToken.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+
+
+class RevocableRefreshToken(RefreshToken):
+    """
+    Refresh-токен, который не проходит проверку после отзыва.
+    """
+
+    def verify(self):
+        super().verify()
+        if revoked.is_revoked(self[api_settings.JTI_CLAIM]):
+            raise TokenError("Токен отозван.")
+
+    def revoke(self):
+        revoked.revoke(self[api_settings.JTI_CLAIM], datetime_from_epoch(self["exp"]))
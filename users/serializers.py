@@ -1,5 +1,8 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
 from .models import User
+from .revocation import RevocableRefreshToken
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -48,3 +51,28 @@ class RegisterSerializer(serializers.ModelSerializer):
         user.set_password(validated_data["password"])  # Шифруем пароль
         user.save()  # Сохраняем пользователя в базе данных
         return user  # Возвращаем созданного пользователя
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """
+    Обновление access-токена, отклоняющее отозванные refresh-токены (SIMPLE_JWT["TOKEN_REFRESH_SERIALIZER"]).
+    """
+
+    token_class = RevocableRefreshToken
+
+
+class LogoutSerializer(serializers.Serializer):
+    """
+    Сериализатор выхода: отзывает переданный refresh-токен.
+    """
+
+    refresh = serializers.CharField()
+
+    def validate_refresh(self, value):
+        try:
+            return RevocableRefreshToken(value)
+        except TokenError as exc:
+            raise serializers.ValidationError(str(exc))
+
+    def save(self):
+        self.validated_data["refresh"].revoke()
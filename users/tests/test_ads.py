@@ -1,9 +1,37 @@
+import asyncio
 import pytest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest.mock import Mock
+from django.core.management import CommandError, call_command
+from django.db.models import QuerySet
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APIClient
-from ads.models import Ad, Review
+from rest_framework.test import APIClient, APIRequestFactory
+from ads.dedup import minhash, similarity
+from ads.models import (
+    Ad,
+    AdBand,
+    AdSignature,
+    AdStats,
+    AdTombstone,
+    IdempotencyKey,
+    PopularAd,
+    Review,
+    SavedSearch,
+    SavedSearchMatch,
+)
+from ads.permissions import IsAuthor, IsOwner
+from ads.popularity import counter, epoch_factor, refresh_popular, upsert_stats, view_weight
+from ads.saved_searches import SavedSearchMatcher, SearchIndex, matcher
+from ads import similar
+from ads.similar import index as similar_index
+from ads.partitioning import add_months, month_start, partition_name
+from ads.stream import HEARTBEAT, RESET, STREAM_PATH, Subscription, ad_stream_app, broker
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils import timezone
+from config.querystats import fingerprint, stats
 
 User = get_user_model()
 
@@ -138,3 +166,634 @@ def test_delete_review(api_client, ad, user):
     response = api_client.delete(url)
     assert response.status_code == status.HTTP_204_NO_CONTENT
     assert Review.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_ad_changes_feed(api_client, ad, user, settings):
+    settings.ADS_CHANGES_LAG = timedelta(0)
+    url = reverse("ad-changes")
+
+    response = api_client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert [(c["id"], c["action"]) for c in response.data["results"]] == [(ad.id, "created")]
+    token = response.data["next"]
+
+    # Без новых изменений токен остаётся прежним
+    response = api_client.get(url, {"since": token})
+    assert response.data["results"] == []
+    assert response.data["next"] == token
+
+    ad.title = "Updated Ad"
+    ad.save()
+    new_ad = Ad.objects.create(title="New Ad", price=1, description="New", author=user)
+    deleted_id = ad.id
+    ad.delete()
+
+    response = api_client.get(url, {"since": token})
+    assert response.status_code == status.HTTP_200_OK
+    assert [(c["id"], c["action"]) for c in response.data["results"]] == [
+        (new_ad.id, "created"),
+        (deleted_id, "deleted"),
+    ]
+    assert response.data["has_more"] is False
+
+
+@pytest.mark.django_db
+def test_ad_changes_feed_pagination(api_client, user, settings):
+    settings.ADS_CHANGES_LAG = timedelta(0)
+    ads = [Ad.objects.create(title=f"Ad {i}", price=i, description="", author=user) for i in range(3)]
+    url = reverse("ad-changes")
+
+    response = api_client.get(url, {"limit": 2})
+    assert [c["id"] for c in response.data["results"]] == [ads[0].id, ads[1].id]
+    assert response.data["has_more"] is True
+
+    response = api_client.get(url, {"limit": 2, "since": response.data["next"]})
+    assert [c["id"] for c in response.data["results"]] == [ads[2].id]
+    assert response.data["has_more"] is False
+
+
+@pytest.mark.django_db
+def test_ad_changes_invalid_token(api_client):
+    response = api_client.get(reverse("ad-changes"), {"since": "garbage"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_create_ad_publishes_to_stream(api_client, user, monkeypatch, django_capture_on_commit_callbacks):
+    published = []
+    monkeypatch.setattr(broker, "publish", published.append)
+    api_client.force_authenticate(user=user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.post(reverse("ad-create"), {"title": "New Ad", "price": 200, "description": "New"})
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert len(published) == 1
+    assert b"event: ad" in published[0]
+    assert "New Ad".encode() in published[0]
+
+
+def test_ad_stream_delivers_messages_and_heartbeats(settings):
+    settings.ADS_STREAM_HEARTBEAT = 0.05
+
+    async def scenario():
+        sent = []
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": STREAM_PATH}
+        task = asyncio.create_task(ad_stream_app(scope, receive, send))
+        while not len(broker):
+            await asyncio.sleep(0)
+        await asyncio.to_thread(broker.publish, b"event: ad\ndata: {}\n\n")  # Публикация из другого потока
+        await asyncio.sleep(0.1)
+        disconnected.set()
+        await task
+        return sent
+
+    sent = asyncio.run(scenario())
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    assert sent[0]["status"] == 200
+    assert b"event: ad" in body
+    assert HEARTBEAT in body
+    assert len(broker) == 0
+
+
+def test_stream_subscription_overflow_resets():
+    subscription = Subscription(loop=None, maxsize=2)
+    for i in range(3):
+        subscription.push(f"message {i}".encode())
+    assert subscription.queue.qsize() == 1
+    assert subscription.queue.get_nowait() is RESET
+
+
+@pytest.mark.django_db
+def test_list_ads_price_filter_and_ordering(api_client, user):
+    for price in (50, 300, 150, 900):
+        Ad.objects.create(title=f"Ad {price}", price=price, description="", author=user)
+    url = reverse("ad-list")
+
+    response = api_client.get(url, {"price_min": 100, "price_max": 500, "ordering": "price"})
+    assert response.status_code == status.HTTP_200_OK
+    assert [ad["price"] for ad in response.data["results"]] == [150, 300]
+
+    response = api_client.get(url, {"author": user.id, "ordering": "-price"})
+    assert [ad["price"] for ad in response.data["results"]] == [900, 300, 150, 50]
+
+
+@pytest.mark.django_db
+def test_ad_facets_histogram(api_client, user, django_assert_num_queries):
+    cache.clear()
+    for price in (50, 150, 199, 900):
+        Ad.objects.create(title=f"Ad {price}", price=price, description="", author=user)
+    url = reverse("ad-facets")
+
+    with django_assert_num_queries(1):
+        response = api_client.get(url, {"bucket_size": 100, "price_max": 500})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["buckets"] == [
+        {"price_min": 0, "price_max": 99, "count": 1},
+        {"price_min": 100, "price_max": 199, "count": 2},
+    ]
+
+    # Повторный запрос с теми же фильтрами отдаётся из кэша
+    with django_assert_num_queries(0):
+        api_client.get(url, {"price_max": 500, "bucket_size": 100})
+
+
+def test_partition_month_helpers():
+    start = month_start(datetime(2024, 12, 31, 23, 30, tzinfo=dt_timezone(timedelta(hours=-3))))
+    assert start == datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    assert add_months(start, -13) == datetime(2023, 12, 1, tzinfo=dt_timezone.utc)
+    assert partition_name(add_months(start, 2)) == "ads_ad_p2025_03"
+
+
+@pytest.mark.django_db
+def test_partition_ads_requires_postgresql():
+    with pytest.raises(CommandError):
+        call_command("partition_ads", "create")
+
+
+@pytest.mark.django_db
+def test_purge_data_removes_old_ads_in_batches(ad, user):
+    old_ad = Ad.objects.create(title="Old Ad", price=1, description="", author=user)
+    Ad.objects.filter(pk=old_ad.pk).update(created_at=timezone.now() - timedelta(days=400))
+    Review.objects.create(text="Old review", author=user, ad=old_ad)
+    Review.objects.create(text="Fresh review", author=user, ad=ad)
+
+    call_command("purge_data", older_than_days=365, dry_run=True)
+    assert Ad.objects.count() == 2
+
+    call_command("purge_data", older_than_days=365, batch_size=1, pause=0)
+    assert list(Ad.objects.all()) == [ad]
+    assert list(Review.objects.values_list("text", flat=True)) == ["Fresh review"]
+    assert AdTombstone.objects.filter(ad_id=old_ad.pk).exists()
+
+
+@pytest.mark.django_db
+def test_purge_data_deletes_inactive_users(ad, user):
+    user.is_active = False
+    user.save()
+
+    call_command("purge_data", delete_users=True, pause=0)
+    assert not User.objects.exists()
+    assert not Ad.objects.exists()
+
+
+@pytest.mark.django_db
+def test_object_permissions_compare_ids_without_queries(ad, user, django_assert_num_queries):
+    request = APIRequestFactory().put("/")
+    request.user = user
+    ad = Ad.objects.get(pk=ad.pk)  # Связанные пользователи не загружены
+
+    with django_assert_num_queries(0):
+        assert IsOwner().has_object_permission(request, None, ad)
+        assert IsAuthor().has_object_permission(request, None, ad)
+
+    request.user = AnonymousUser()
+    request._object_permission_cache = {}
+    ad.owner = None
+    assert not IsOwner().has_object_permission(request, None, ad)
+
+
+@pytest.mark.django_db
+def test_list_mine_filter(api_client, ad, user):
+    other = User.objects.create(email="other@example.com")
+    Ad.objects.create(title="Other Ad", price=1, description="", author=other, owner=other)
+    Review.objects.create(text="Mine", author=user, ad=ad)
+    Review.objects.create(text="Not mine", author=other, ad=ad)
+    api_client.force_authenticate(user=user)
+
+    response = api_client.get(reverse("ad-list"), {"mine": "true"})
+    assert [item["title"] for item in response.data["results"]] == [ad.title]
+
+    response = api_client.get(reverse("review-list"), {"mine": "true"})
+    assert [item["text"] for item in response.data["results"]] == ["Mine"]
+
+
+def test_query_fingerprint_strips_literals():
+    assert fingerprint("SELECT * FROM ads_ad WHERE id IN (%s, %s, %s) AND price > 100") == (
+        "SELECT * FROM ads_ad WHERE id IN (...) AND price > ?"
+    )
+    assert fingerprint("SELECT  1 FROM ads_ad WHERE title = 'a''b'") == "SELECT ? FROM ads_ad WHERE title = ?"
+
+
+@pytest.mark.django_db
+def test_query_stats_per_view_and_report(api_client, ad, user, settings, tmp_path, capsys):
+    settings.QUERY_STATS = {**settings.QUERY_STATS, "ENABLED": True, "DIR": tmp_path, "FLUSH_INTERVAL": 0}
+    stats.entries.clear()
+    api_client.force_authenticate(user=user)
+    api_client.get(reverse("ad-list"))
+    api_client.get(reverse("ad-list"), {"price_min": 10})
+
+    views = {view for view, _ in stats.entries}
+    assert views == {"ad-list"}
+    assert list(tmp_path.glob("queries-*.json"))
+
+    call_command("query_report", "--top", "3", "--by", "count")
+    output = capsys.readouterr().out
+    assert "[ad-list]" in output
+    assert 'FROM "ads_ad"' in output
+    stats.entries.clear()
+
+
+@pytest.mark.django_db
+def test_seller_snapshot_kept_in_sync(api_client, user, django_capture_on_commit_callbacks):
+    user.first_name, user.last_name = "Иван", "Петров"
+    user.save()
+    ad = Ad.objects.create(title="Слон", price=100, description="Большой", author=user)
+    assert ad.seller_name == "Иван Петров"
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        user.save(update_fields=["last_login"])
+    assert not callbacks  # Сохранение без имени и аватара не ставит обновление в очередь
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user.first_name = "Пётр"
+        user.save()
+    ad.refresh_from_db()
+    assert ad.seller_name == "Пётр Петров"
+
+    api_client.force_authenticate(user=user)
+    response = api_client.get(reverse("ad-list"))
+    assert "seller" not in response.data["results"][0]
+    response = api_client.get(reverse("ad-list"), {"include": "seller"})
+    assert response.data["results"][0]["seller"] == {"name": "Пётр Петров", "avatar": ""}
+
+    Ad.objects.update(seller_name="")
+    call_command("sync_seller_snapshots")
+    ad.refresh_from_db()
+    assert ad.seller_name == "Пётр Петров"
+
+
+@pytest.mark.django_db
+def test_admin_changelists_do_not_load_related_tables(client, ad, user, django_assert_max_num_queries):
+    client.force_login(User.objects.create(email="admin@example.com", is_staff=True, is_superuser=True))
+    Review.objects.create(text="Отличный слон", author=user, ad=ad)
+    User.objects.bulk_create([User(email=f"user{number}@example.com") for number in range(50)])
+
+    for url in (reverse("admin:ads_ad_changelist"), reverse("admin:ads_review_changelist")):
+        with django_assert_max_num_queries(10):
+            response = client.get(url, {"author__id__exact": user.pk, "q": "слон"})
+        assert response.status_code == 200
+        content = response.content.decode()
+        assert 'class="autocomplete-filter"' in content
+        assert "user49@example.com" not in content  # Фильтр не выводит всех пользователей
+        assert f'<option value="{user.pk}" selected>{user.email}</option>' in content
+
+    # Варианты фильтра подгружаются автодополнением админки
+    params = {"app_label": "ads", "model_name": "ad", "field_name": "author", "term": "user49"}
+    response = client.get(reverse("admin:autocomplete"), params)
+    assert [item["text"] for item in response.json()["results"]] == ["user49@example.com"]
+    assert client.get(reverse("admin:users_user_changelist"), {"q": "user4"}).status_code == 200
+
+
+@pytest.mark.django_db
+def test_ad_batch_preserves_order_and_reads_through_cache(api_client, user, django_assert_num_queries):
+    cache.clear()
+    first, second = (Ad.objects.create(title=title, price=100, description="-", author=user) for title in "AB")
+    url = reverse("ad-batch")
+
+    response = api_client.get(url, {"ids": f"{second.pk},999,{first.pk},{second.pk}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert [ad["id"] for ad in response.data["results"]] == [second.pk, first.pk]
+    assert response.data["missing"] == [999]
+
+    with django_assert_num_queries(1):  # Найденные объявления берутся из кэша, в БД ищется только 999
+        api_client.get(url, {"ids": f"{second.pk},999,{first.pk}"})
+
+    first.title = "C"
+    first.save()
+    response = api_client.get(url, {"ids": str(first.pk)})
+    assert response.data["results"][0]["title"] == "C"
+
+    assert api_client.get(url, {"ids": "1,x"}).status_code == status.HTTP_400_BAD_REQUEST
+    assert api_client.get(url, {"ids": ",".join(map(str, range(1, 102)))}).status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_ad_views_buffered_and_ranked(api_client, user, settings):
+    cold, hot = (Ad.objects.create(title=title, price=100, description="-", author=user) for title in "AB")
+    for _ in range(3):
+        api_client.get(reverse("ad-detail", kwargs={"pk": hot.pk}))
+    api_client.get(reverse("ad-detail", kwargs={"pk": cold.pk}))
+    assert not AdStats.objects.exists()  # Просмотры накапливаются в памяти процесса
+
+    assert counter.flush() == 2
+    assert AdStats.objects.get(ad=hot).views == 3
+    api_client.get(reverse("ad-detail", kwargs={"pk": hot.pk}))
+    counter.flush()
+    assert AdStats.objects.get(ad=hot).views == 4  # Повторная запись прибавляет, а не перезаписывает
+
+    # Просмотр, сделанный на период полураспада позже, весит вдвое больше
+    epoch, weight = view_weight(1000.0)
+    assert view_weight(1000.0 + settings.ADS_POPULARITY["HALF_LIFE"]) == (epoch, weight * 2)
+
+    assert refresh_popular() == 2
+    response = api_client.get(reverse("ad-popular"))
+    assert [ad["id"] for ad in response.data] == [hot.pk, cold.pk]
+
+    # Пачка прошлой эпохи после пачки новой приводится к новой эпохе, а не затирает счёт
+    before = AdStats.objects.get(ad=cold)
+    upsert_stats([(cold.pk, 1, 10.0)], epoch=before.epoch + 1)
+    upsert_stats([(cold.pk, 1, 4.0)], epoch=before.epoch)
+    stats = AdStats.objects.get(ad=cold)
+    assert (stats.views, stats.epoch) == (before.views + 2, before.epoch + 1)
+    assert stats.score == pytest.approx(before.score * epoch_factor() + 10.0 + 4.0 * epoch_factor())
+
+    # Очистка удаляет статистику вместе с объявлением
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    call_command("purge_data", inactive_users=True, pause=0)
+    assert not AdStats.objects.exists() and not PopularAd.objects.exists()
+
+
+def test_search_index_matches_all_terms_and_price():
+    index = SearchIndex()
+    index.add(1, 10, "iPhone 13", None, 50000)
+    index.add(2, 11, "Samsung", None, None)
+    index.add(3, 12, "чёрный iphone", 60000, None)
+
+    assert index.match("Продам iPhone 13 Pro, чёрный", 40000) == [1]
+    assert index.match("Продам iPhone 13 Pro, черный", 70000) == [3]
+    assert index.match("Продам iPhone 13", 40000, exclude_user=10) == []
+
+    index.remove(1)
+    assert index.match("Продам iPhone 13", 40000) == []
+    assert index.by_term == {"samsung": {2}, "черный": {3}}  # Каждый поиск записан под одним словом
+
+
+@pytest.mark.django_db
+def test_saved_search_notified_about_new_ad(api_client, user, django_capture_on_commit_callbacks):
+    buyer = User.objects.create(email="buyer@example.com")
+    matcher.reset()
+    api_client.force_authenticate(user=buyer)
+    url = reverse("saved-search-list")
+    response = api_client.post(url, {"query": "велосипед горный", "price_max": 20000})
+    assert response.status_code == status.HTTP_201_CREATED
+    search_id = response.data["id"]
+    assert api_client.post(url, {"query": "а"}).status_code == status.HTTP_400_BAD_REQUEST
+    assert api_client.post(url, {"query": "шины", "price_min": 5, "price_max": 1}).status_code == 400
+
+    api_client.force_authenticate(user=user)
+    with django_capture_on_commit_callbacks(execute=True):
+        api_client.post(
+            reverse("ad-create"), {"title": "Горный велосипед", "price": 15000, "description": "Почти новый"}
+        )
+        api_client.post(reverse("ad-create"), {"title": "Велосипед детский", "price": 3000, "description": "Новый"})
+    assert SavedSearchMatch.objects.get().ad.title == "Горный велосипед"
+    assert api_client.get(reverse("saved-search-matches")).data["count"] == 0  # Чужие уведомления не видны
+
+    api_client.force_authenticate(user=buyer)
+    response = api_client.get(reverse("saved-search-matches"))
+    assert response.data["results"][0]["search"] == search_id
+    assert response.data["results"][0]["ad"]["title"] == "Горный велосипед"
+
+    # Изменение поиска в другом процессе (без сигнала) догружается по updated_at до перестройки индекса
+    SavedSearch.objects.filter(pk=search_id).update(query="самокат", updated_at=timezone.now())
+    api_client.force_authenticate(user=user)
+    with django_capture_on_commit_callbacks(execute=True):
+        api_client.post(reverse("ad-create"), {"title": "Самокат", "price": 5000, "description": "Складной"})
+    assert SavedSearchMatch.objects.filter(ad__title="Самокат").exists()
+    # Очистка удаляет уведомления вместе с объявлением: у них нет внешнего ключа в БД
+    call_command("purge_data", older_than_days=0, pause=0)
+    assert not SavedSearchMatch.objects.exists()
+    SavedSearch.objects.filter(pk=search_id).update(query="велосипед горный")
+    matcher.reset()
+    api_client.force_authenticate(user=buyer)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        api_client.delete(reverse("saved-search-detail", args=[search_id]))
+        api_client.force_authenticate(user=user)
+        api_client.post(reverse("ad-create"), {"title": "Горный велосипед", "price": 9000, "description": "Б/у"})
+    assert not SavedSearch.objects.exists() and not SavedSearchMatch.objects.exists()
+
+
+def test_saved_search_flush_requeues_on_failure():
+    queue = SavedSearchMatcher()
+    queue._pending = [(1, 1, "Горный велосипед", 15000)]
+    queue.process = Mock(side_effect=RuntimeError)
+    with pytest.raises(RuntimeError):
+        queue.flush()
+    queue._pending.append((2, 1, "Самокат", 5000))
+    queue.process = Mock(return_value=0)
+    queue.flush()
+    queue.process.assert_called_once_with([(1, 1, "Горный велосипед", 15000), (2, 1, "Самокат", 5000)])
+
+
+@pytest.mark.django_db
+def test_similar_ads_built_and_updated_incrementally(api_client, user, settings, tmp_path, monkeypatch):
+    settings.SIMILAR_ADS = {**settings.SIMILAR_ADS, "DIR": tmp_path, "NEIGHBORS": 2}
+    cache.clear()
+
+    def create(title, description):
+        return Ad.objects.create(title=title, price=100, description=description, author=user)
+
+    bike = create("Горный велосипед", "Алюминиевая рама, 21 скорость")
+    kids_bike = create("Детский велосипед", "Рама стальная, для детей 5 лет")
+    sofa = create("Диван угловой", "Раскладной, серая ткань")
+    url = reverse("ad-similar", args=[bike.pk])
+
+    with pytest.raises(CommandError):
+        call_command("build_similar_ads", "--incremental")
+    assert api_client.get(url).data == {"results": []}
+    call_command("build_similar_ads")
+
+    results = api_client.get(url).data["results"]
+    assert [result["id"] for result in results] == [kids_bike.pk]  # Диван без общих слов не попадает в соседи
+    assert 0 < results[0]["score"] < 1
+
+    road_bike = create("Горный велосипед", "Алюминиевая рама, 27 скоростей")
+    assert api_client.get(reverse("ad-similar", args=[road_bike.pk])).data == {"results": []}
+    # Прерванный запуск не меняет действующую версию, и следующий не добавляет объявления повторно
+    with monkeypatch.context() as patch:
+        patch.setattr(similar, "publish", Mock(side_effect=RuntimeError))
+        with pytest.raises(RuntimeError):
+            call_command("build_similar_ads", "--incremental")
+    call_command("build_similar_ads", "--incremental")
+    assert similar_index.open().rows == 4
+    assert len(list(tmp_path.glob("v*"))) == 2  # Действующая и предыдущая версии
+    assert [result["id"] for result in api_client.get(url).data["results"]] == [road_bike.pk, kids_bike.pk]
+    assert similar_index.neighbors(road_bike.pk)[0][0] == bike.pk
+    assert similar_index.neighbors(sofa.pk) == []
+
+    kids_bike_id = kids_bike.pk
+    kids_bike.delete()
+    assert [result["id"] for result in api_client.get(url).data["results"]] == [road_bike.pk]
+    assert api_client.get(reverse("ad-similar", args=[kids_bike_id])).status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_minhash_estimates_text_similarity():
+    text = "Продаю горный велосипед, алюминиевая рама, 21 скорость, дисковые тормоза, почти новый"
+    assert minhash("Велосипед", text) == minhash("Велосипед", text)
+    assert similarity(minhash("Велосипед", text), minhash("Велосипед!", text.replace("почти", "совсем"))) > 0.4
+    assert similarity(minhash("Велосипед", text), minhash("Диван", "Угловой диван, раскладной")) < 0.1
+
+
+@pytest.mark.django_db
+def test_near_duplicate_ads_rejected_flagged_and_deduplicated(api_client, user, settings):
+    description = "Продаю горный велосипед, алюминиевая рама, 21 скорость, дисковые тормоза, почти новый, торг"
+    api_client.force_authenticate(user=user)
+    url = reverse("ad-create")
+    assert api_client.post(url, {"title": "Велосипед", "price": 100, "description": description}).status_code == 201
+    original = Ad.objects.get()
+    assert AdSignature.objects.filter(ad=original).exists()
+    assert AdBand.objects.filter(ad=original).count() == settings.ADS_DEDUP["BANDS"]
+
+    response = api_client.post(url, {"title": "Велосипед", "price": 90, "description": description + "!"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["duplicate_of"] == str(original.pk)
+    assert api_client.post(url, {"title": "Диван", "price": 100, "description": "Угловой"}).status_code == 201
+
+    settings.ADS_DEDUP = {**settings.ADS_DEDUP, "ACTION": "flag"}
+    assert api_client.post(url, {"title": "Велосипед", "price": 90, "description": description}).status_code == 201
+    assert Ad.objects.get(price=90).duplicate_of_id == original.pk
+    assert api_client.get(reverse("ad-list")).data["count"] == 2  # Отмеченный повтор скрыт из списка
+
+    # Повторы, созданные в обход API, находит пакетная команда
+    copies = [Ad.objects.create(title="Велосипед", price=80, description=description, author=user) for _ in range(2)]
+    AdSignature.objects.filter(ad=copies[1]).delete()  # Объявление без сигнатуры, как до миграции
+    call_command("dedupe_ads", "--dry-run")
+    assert not Ad.objects.filter(pk__in=[copy.pk for copy in copies], duplicate_of__isnull=False).exists()
+    call_command("dedupe_ads")
+    assert set(Ad.objects.filter(duplicate_of=original).values_list("pk", flat=True)) == {
+        *[copy.pk for copy in copies],
+        Ad.objects.get(price=90).pk,
+    }
+    call_command("dedupe_ads", "--delete", "--pause", "0")
+    assert set(Ad.objects.values_list("title", flat=True)) == {"Велосипед", "Диван"} and Ad.objects.count() == 2
+    assert AdSignature.objects.count() == 2 and AdBand.objects.count() == 2 * settings.ADS_DEDUP["BANDS"]
+
+
+@pytest.mark.django_db
+def test_flagged_duplicates_hidden_from_feeds(
+    api_client, user, settings, tmp_path, monkeypatch, django_capture_on_commit_callbacks
+):
+    settings.ADS_DEDUP = {**settings.ADS_DEDUP, "ACTION": "flag"}
+    settings.ADS_CHANGES_LAG = timedelta(0)
+    settings.SIMILAR_ADS = {**settings.SIMILAR_ADS, "DIR": tmp_path, "NEIGHBORS": 2}
+    cache.clear()
+    publish, schedule = Mock(), Mock()
+    monkeypatch.setattr("ads.views.publish_ad", publish)
+    monkeypatch.setattr(matcher, "schedule", schedule)
+    description = "Продаю горный велосипед, алюминиевая рама, 21 скорость, дисковые тормоза, почти новый, торг"
+    data = {"title": "Велосипед", "price": 100, "description": description}
+    api_client.force_authenticate(user=user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert api_client.post(reverse("ad-create"), data).status_code == 201
+        assert api_client.post(reverse("ad-create"), {**data, "price": 90}).status_code == 201
+    original, flagged = Ad.objects.get(price=100), Ad.objects.get(price=90)
+    assert flagged.duplicate_of_id == original.pk
+    # Отмеченный повтор не рассылается в /ads/stream/ и не сопоставляется с сохранёнными поисками
+    assert publish.call_count == schedule.call_count == 1
+
+    PopularAd.objects.bulk_create(
+        [PopularAd(position=1, ad=flagged, score=2), PopularAd(position=2, ad=original, score=1)]
+    )
+    assert [ad["id"] for ad in api_client.get(reverse("ad-popular")).data] == [original.pk]
+
+    # Повтор, созданный в обход API, попадает в соседи до отметки командой dedupe_ads
+    copy = Ad.objects.create(title="Велосипед", price=80, description=description, author=user)
+    call_command("build_similar_ads")
+    similar_url = reverse("ad-similar", args=[original.pk])
+    assert [result["id"] for result in api_client.get(similar_url).data["results"]] == [copy.pk]
+    token = api_client.get(reverse("ad-changes")).data["next"]
+
+    call_command("dedupe_ads")
+    assert api_client.get(similar_url).data == {"results": []}
+    changes = api_client.get(reverse("ad-changes"), {"since": token}).data["results"]
+    assert [(change["id"], change["action"]) for change in changes] == [(copy.pk, "deleted")]
+    call_command("build_similar_ads")
+    assert similar_index.neighbors(original.pk) == []
+
+    # После удаления исходного объявления повторы остаются скрытыми и не возвращаются в ленту изменений
+    token = api_client.get(reverse("ad-changes")).data["next"]
+    original_id = original.pk
+    original.delete()
+    assert set(Ad.objects.values_list("duplicate_of_id", flat=True)) == {original_id}
+    assert api_client.get(reverse("ad-list")).data["count"] == 0
+    changes = api_client.get(reverse("ad-changes"), {"since": token}).data["results"]
+    assert [(change["id"], change["action"]) for change in changes] == [(original_id, "deleted")]
+
+
+@pytest.mark.django_db
+def test_ad_detail_and_first_page_served_from_cache(api_client, ad, user, django_assert_num_queries, settings):
+    cache.clear()
+    detail = reverse("ad-detail", args=[ad.pk])
+    assert api_client.get(detail).data["title"] == "Test Ad"
+    api_client.get(reverse("ad-list"))
+    with django_assert_num_queries(0):
+        assert api_client.get(detail).data["title"] == "Test Ad"
+        assert api_client.get(reverse("ad-list")).data["count"] == 1
+
+    api_client.force_authenticate(user=user)
+    api_client.put(detail, {"title": "Updated Ad", "price": 150, "description": "Updated Description"})
+    assert api_client.get(detail).data["title"] == "Updated Ad"
+    # Первая страница помечена устаревшей и пересчитывается первым же запросом
+    assert api_client.get(reverse("ad-list")).data["results"][0]["title"] == "Updated Ad"
+
+    # Ссылка на следующую страницу строится по Host каждого запроса, а не первого закэшировавшего
+    settings.ALLOWED_HOSTS = [".example.com"]
+    Ad.objects.bulk_create([Ad(title=f"Ad {i}", price=i, description="", author=user) for i in range(4)])
+    cache.clear()
+    assert api_client.get(reverse("ad-list"), HTTP_HOST="first.example.com").data["next"].startswith("http://first")
+    with django_assert_num_queries(0):
+        response = api_client.get(reverse("ad-list"), HTTP_HOST="second.example.com")
+    assert response.data["next"] == "http://second.example.com/ads/?page=2" and response.data["previous"] is None
+
+
+@pytest.mark.django_db
+def test_idempotency_key_replays_create_responses(api_client, ad, user, settings, monkeypatch):
+    settings.ADS_DEDUP = {**settings.ADS_DEDUP, "ACTION": "flag"}  # Повторы текста сохраняются, а не отклоняются
+    api_client.force_authenticate(user=user)
+    url = reverse("ad-create")
+    data = {"title": "New Ad", "price": 200, "description": "New Description"}
+    first = api_client.post(url, data, HTTP_IDEMPOTENCY_KEY="ad-1")
+    replay = api_client.post(url, data, HTTP_IDEMPOTENCY_KEY="ad-1")
+    assert first.status_code == replay.status_code == status.HTTP_201_CREATED
+    assert replay.data == first.data and replay["Idempotent-Replayed"] == "true"
+    assert Ad.objects.filter(title="New Ad").count() == 1
+    other = {**data, "price": 300}
+    assert api_client.post(url, other, HTTP_IDEMPOTENCY_KEY="ad-1").status_code == 422
+    # Ошибка валидации не сохраняет ключ: исправленный запрос с ним выполняется
+    assert api_client.post(url, {"title": "Bad"}, HTTP_IDEMPOTENCY_KEY="ad-2").status_code == 400
+    assert api_client.post(url, other, HTTP_IDEMPOTENCY_KEY="ad-2").status_code == status.HTTP_201_CREATED
+
+    # Ключи отзывов не пересекаются с ключами объявлений
+    review = {"text": "Great product!", "ad": ad.id}
+    for _ in range(2):
+        response = api_client.post(reverse("review-list"), review, HTTP_IDEMPOTENCY_KEY="ad-1")
+        assert response.status_code == status.HTTP_201_CREATED
+    assert Review.objects.count() == 1
+
+    # Истёкший ключ выполняет запрос заново и удаляется командой
+    IdempotencyKey.objects.filter(key="ad-2").update(created_at=timezone.now() - timedelta(days=2))
+    assert "Idempotent-Replayed" not in api_client.post(url, other, HTTP_IDEMPOTENCY_KEY="ad-2")
+    assert Ad.objects.filter(price=300).count() == 2
+
+    # Одновременный повтор с истёкшим ключом записал свой ключ первым: запрос получает его ответ, а не ошибку 500
+    IdempotencyKey.objects.filter(key="ad-2").update(created_at=timezone.now() - timedelta(days=2))
+    delete, digest = QuerySet.delete, IdempotencyKey.objects.get(key="ad-2").fingerprint
+
+    def delete_and_race(queryset):
+        result = delete(queryset)
+        IdempotencyKey.objects.create(
+            user=user, scope="ad-create", key="ad-2", fingerprint=digest, status_code=201, response={}
+        )
+        return result
+
+    monkeypatch.setattr(QuerySet, "delete", delete_and_race)
+    response = api_client.post(url, other, HTTP_IDEMPOTENCY_KEY="ad-2")
+    monkeypatch.undo()
+    assert response.status_code == status.HTTP_201_CREATED and response["Idempotent-Replayed"] == "true"
+    assert Ad.objects.filter(price=300).count() == 2
+    IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+    call_command("prune_idempotency_keys")
+    assert not IdempotencyKey.objects.exists()
@@ -1,12 +1,31 @@
+import asyncio
+import sys
+import threading
+from datetime import timedelta
+
 import pytest
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.tokens import default_token_generator
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import RequestFactory
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from rest_framework import status
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView
+from config.health import probe
+from config.profiling import StackSampler, make_token
+from config.schema import load_schema
+from config.singleflight import SingleFlight
+from users.hashing_pool import get_pool, offload_hashing
+from users.models import RevokedToken
+from users.revocation import BloomFilter, revoked
+from users.throttling import LocalMemoryBackend, get_backend
 
 # Получаем модель пользователя
 User = get_user_model()
@@ -149,3 +168,391 @@ def test_invalid_password_reset_request(api_client):
     # Проверяем, что запрос завершился с ошибкой 404
     assert response.status_code == status.HTTP_404_NOT_FOUND
     assert "Пользователь с таким email не найден" in response.data["error"]
+
+
+@pytest.mark.django_db
+def test_login_is_throttled_per_account(api_client, create_user, settings):
+    """
+    Тестирует ограничение частоты входа по учётной записи и заголовок Retry-After.
+    """
+    settings.AUTH_THROTTLE = {
+        "BACKEND": "users.throttling.LocalMemoryBackend",
+        "RATES": {"users:login": {"ip": "100/min", "account": "2/min"}},
+    }
+    get_backend.cache_clear()
+    create_user(email="testuser@example.com", password="password123")
+    url = reverse("users:login")
+
+    for _ in range(2):
+        response = api_client.post(url, {"email": "testuser@example.com", "password": "wrong"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    response = api_client.post(url, {"email": "TestUser@example.com", "password": "password123"})
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response["Retry-After"]) > 0
+
+    # Другая учётная запись с того же адреса не ограничена
+    response = api_client.post(url, {"email": "other@example.com", "password": "password123"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    get_backend.cache_clear()
+
+
+@pytest.mark.django_db
+def test_login_ip_limit_ignores_spoofed_forwarded_for(api_client, settings):
+    """
+    Тестирует, что подмена X-Forwarded-For не сбрасывает ведро адреса, а тело-массив не вызывает 500.
+    """
+    settings.AUTH_THROTTLE = {
+        "BACKEND": "users.throttling.LocalMemoryBackend",
+        "RATES": {"users:login": {"ip": "2/min", "account": "100/min"}},
+    }
+    get_backend.cache_clear()
+    url = reverse("users:login")
+
+    response = api_client.post(url, [{"email": "a@example.com"}], format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = api_client.post(url, {"email": "a@example.com", "password": "x"}, HTTP_X_FORWARDED_FOR="10.0.0.1")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    response = api_client.post(url, {"email": "a@example.com", "password": "x"}, HTTP_X_FORWARDED_FOR="10.0.0.2")
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    get_backend.cache_clear()
+
+
+def test_local_memory_backend_refills():
+    backend = LocalMemoryBackend()
+    assert backend.acquire("key", interval=1.0, period=2.0, now=100.0) == 0
+    assert backend.acquire("key", interval=1.0, period=2.0, now=100.0) == 0
+    assert backend.acquire("key", interval=1.0, period=2.0, now=100.0) == pytest.approx(1.0)
+    assert backend.acquire("key", interval=1.0, period=2.0, now=101.0) == 0
+
+
+def test_local_memory_backend_stays_bounded():
+    backend = LocalMemoryBackend(max_keys=LocalMemoryBackend.stripes)
+    for index in range(1000):
+        assert backend.acquire(f"ip:{index}", interval=60.0, period=600.0, now=100.0) == 0
+    assert len(backend) <= LocalMemoryBackend.stripes
+    # Пополнившиеся вёдра удаляются при следующих записях в полосу
+    for index in range(1000):
+        backend.acquire(f"ip:{index}", interval=1.0, period=2.0, now=1000.0 + index)
+    assert len(backend) < 100
+
+
+@pytest.mark.django_db
+def test_login_upgrades_password_hash(api_client, settings):
+    """
+    Тестирует прозрачный пересчёт хеша старого алгоритма при успешном входе.
+    """
+    settings.PASSWORD_HASHING = {
+        "SCRYPT": {"work_factor": 2**4, "block_size": 8, "parallelism": 1},
+        "PBKDF2": {"iterations": 1000},
+    }
+    settings.PASSWORD_HASHERS = ["users.hashers.TunedScryptPasswordHasher", "users.hashers.TunedPBKDF2PasswordHasher"]
+    user = User.objects.create(
+        email="legacy@example.com", password=make_password("password123", hasher="pbkdf2_sha256")
+    )
+    assert user.password.startswith("pbkdf2_sha256$1000$")
+
+    response = api_client.post(reverse("users:login"), {"email": "legacy@example.com", "password": "password123"})
+    assert response.status_code == status.HTTP_200_OK
+    user.refresh_from_db()
+    assert user.password.startswith("scrypt$")
+    assert user.check_password("password123")
+
+
+def test_offload_hashing_runs_in_bounded_pool(settings):
+    """
+    Тестирует выполнение представления в пуле хеширования и ответ 503 при его заполнении.
+    """
+    settings.AUTH_HASHING_POOL = {"ENABLED": True, "MAX_WORKERS": 1, "MAX_PENDING": 0, "RETRY_AFTER": 1}
+    get_pool.cache_clear()
+    started, finish = threading.Event(), threading.Event()
+
+    def view(request):
+        started.set()
+        finish.wait(5)
+        return HttpResponse(threading.current_thread().name)
+
+    wrapped = offload_hashing(view)
+    request = RequestFactory().post("/")
+
+    async def scenario():
+        first = asyncio.ensure_future(wrapped(request))
+        await asyncio.to_thread(started.wait, 5)
+        rejected = await wrapped(request)  # Единственное место в пуле занято
+        finish.set()
+        return await first, rejected
+
+    try:
+        response, rejected = asyncio.run(scenario())
+    finally:
+        get_pool.cache_clear()
+    assert response.content.decode().startswith("auth-hashing")
+    assert rejected.status_code == 503
+    assert rejected["Retry-After"] == "1"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_login_through_hashing_pool(settings):
+    """
+    Тестирует вход через представление, выполняемое в пуле хеширования (как под ASGI).
+    """
+    settings.AUTH_HASHING_POOL = {"ENABLED": True, "MAX_WORKERS": 2, "MAX_PENDING": 0, "RETRY_AFTER": 1}
+    get_pool.cache_clear()
+    User.objects.create(email="pool@example.com", password=make_password("password123"))
+    login = offload_hashing(TokenObtainPairView.as_view())
+    assert asyncio.iscoroutinefunction(login)
+    factory = RequestFactory()
+
+    def request(password):
+        body = {"email": "pool@example.com", "password": password}
+        return factory.post("/users/login/", body, content_type="application/json")
+
+    async def scenario():
+        return await asyncio.gather(login(request("password123")), login(request("wrong")))
+
+    try:
+        accepted, rejected = asyncio.run(scenario())
+    finally:
+        get_pool.cache_clear()
+    assert accepted.status_code == status.HTTP_200_OK and "access" in accepted.data
+    assert rejected.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_schema_served_with_etag(api_client, settings, tmp_path):
+    """
+    Тестирует отдачу OpenAPI-схемы из файла с кэширующими заголовками и ответом 304.
+    """
+    settings.OPENAPI_SCHEMA_DIR = tmp_path
+    (tmp_path / "swagger.json").write_bytes(b'{"swagger": "2.0"}')
+    load_schema.cache_clear()
+
+    url = reverse("schema-json", kwargs={"format": ".json"})
+    response = api_client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == b'{"swagger": "2.0"}'
+    assert "max-age=" in response["Cache-Control"]
+
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    # Без файла схема генерируется в памяти
+    response = api_client.get(reverse("schema-json", kwargs={"format": ".yaml"}))
+    assert response.status_code == status.HTTP_200_OK
+    assert b"/ads/" in response.content
+    load_schema.cache_clear()
+
+
+@pytest.mark.django_db
+def test_health_endpoints_bypass_auth(api_client, settings):
+    """
+    Тестирует пробы живости и готовности: доступны без авторизации, готовность
+    кэшируется и сообщает о недоступной БД кодом 503.
+    """
+    probe.reset()
+    response = api_client.get("/healthz")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"status": "ok"}
+
+    response = api_client.get("/readyz")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["database"]["ok"] is True
+    assert "ads_stream_subscribers" in response.json()["queues"]
+    assert "coalesced" in response.json()["single_flight"]
+
+    # Пока результат в кэше, БД повторно не проверяется
+    probe._result = {"ok": False, "error": "down"}
+    response = api_client.get("/readyz/")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    probe.reset()
+
+
+def test_api_profile_excludes_admin_and_docs(api_client, settings):
+    """
+    Тестирует профиль config.settings_api: без сессий, CSRF, админки и документации, API доступно.
+    """
+    from config import settings_api
+
+    assert "django.contrib.sessions" not in settings_api.INSTALLED_APPS
+    assert "drf_yasg" not in settings_api.INSTALLED_APPS
+    assert "django.middleware.csrf.CsrfViewMiddleware" not in settings_api.MIDDLEWARE
+
+    settings.ROOT_URLCONF = settings_api.ROOT_URLCONF
+    assert api_client.get("/admin/").status_code == status.HTTP_404_NOT_FOUND
+    assert api_client.get("/swagger/").status_code == status.HTTP_404_NOT_FOUND
+    assert api_client.get(reverse("users:user_profile")).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_request_profiled_with_signed_token(api_client, settings, tmp_path):
+    """
+    Тестирует профилирование запроса по токену сотрудника, ограничение числа файлов и скачивание pstats.
+    """
+    settings.PROFILING = {**settings.PROFILING, "DIR": tmp_path, "MAX_FILES": 1}
+    url = reverse("users:user_profile")
+    admin = User.objects.create(email="admin@example.com", is_staff=True)
+    token = make_token(admin)
+
+    assert "X-Profile-Id" not in api_client.get(url, HTTP_X_PROFILE="forged:token")
+    assert "X-Profile-Id" not in api_client.get(url, {"profile": token})  # Только заголовок
+    api_client.get(url, HTTP_X_PROFILE=token)
+    response = api_client.get(url, HTTP_X_PROFILE=token)
+    name = response["X-Profile-Id"]
+    assert [path.name for path in tmp_path.glob("*.pstats")] == [name]
+
+    download = reverse("profiling-download", kwargs={"name": name})
+    assert api_client.get(download).status_code == status.HTTP_401_UNAUTHORIZED
+    api_client.force_authenticate(admin)
+    response = api_client.get(download)
+    assert response.status_code == status.HTTP_200_OK
+    assert b"".join(response.streaming_content)
+
+    # Токен перестаёт действовать, когда пользователь больше не сотрудник
+    User.objects.filter(pk=admin.pk).update(is_staff=False)
+    assert "X-Profile-Id" not in api_client.get(url, HTTP_X_PROFILE=token)
+    with pytest.raises(CommandError):
+        call_command("profiling_token", "admin@example.com")
+
+
+def test_stack_sampler_collapses_matching_stacks(tmp_path):
+    """
+    Тестирует сворачивание стеков сэмплером: учитываются только стеки с кадрами отслеживаемых модулей.
+    """
+    sampler = StackSampler(0.01, ["users.tests"], tmp_path / "sampled.collapsed", 60)
+    stack = sampler.collapse(sys._getframe())
+    assert stack.endswith("users.tests.test_users:test_stack_sampler_collapses_matching_stacks")
+    assert StackSampler(0.01, ["ads.views"], tmp_path / "x", 60).collapse(sys._getframe()) is None
+
+    sampler.counts[stack] += 3
+    sampler.flush()
+    assert (tmp_path / "sampled.collapsed").read_text() == f"{stack} 3\n"
+
+
+@pytest.mark.django_db
+def test_batch_dispatches_sub_requests_with_shared_auth(api_client, get_tokens_for_user, settings):
+    """
+    Тестирует пакетный запрос: общий токен, порядок ответов, статусы подзапросов и запись перед чтением.
+    """
+    access, _ = get_tokens_for_user("testuser@example.com", "password123")
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+    ad = {"title": "Слон", "price": 100, "description": "Большой"}
+    payload = {
+        "requests": [
+            {"method": "GET", "path": reverse("users:user_profile")},
+            {"method": "POST", "path": reverse("ad-create"), "body": ad},
+            {"method": "GET", "path": reverse("ad-list") + "?search=Слон"},
+            {"method": "GET", "path": "/missing/"},
+            {"method": "POST", "path": "/batch/", "body": {"requests": []}},
+        ]
+    }
+    response = api_client.post(reverse("batch"), payload, format="json")
+    assert response.status_code == status.HTTP_200_OK
+    statuses = [item["status"] for item in response.data["responses"]]
+    assert statuses == [200, 201, 200, 404, 400]
+    assert response.data["responses"][0]["body"]["email"] == "testuser@example.com"
+    assert response.data["responses"][2]["body"]["count"] == 1
+
+    # Параллельное выполнение чтений (подзапросы без обращения к БД)
+    settings.API_BATCH = {**settings.API_BATCH, "MAX_WORKERS": 2}
+    anonymous = APIClient().post(reverse("batch"), {"requests": payload["requests"][:1] * 3}, format="json")
+    assert [item["status"] for item in anonymous.data["responses"]] == [status.HTTP_401_UNAUTHORIZED] * 3
+
+
+@pytest.mark.django_db
+def test_single_flight_coalesces_misses_and_serves_stale(settings):
+    """
+    Тестирует single-flight: промах пересчитывает один поток, остальные получают его результат,
+    а во время пересчёта устаревшей записи - прежнее значение.
+    """
+    from django.core.cache import cache
+
+    cache.delete("test:flight")
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return len(calls)
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.get("test:flight", compute, 60)))
+    leader.start()
+    started.wait(5)
+    waiters = [
+        threading.Thread(target=lambda: results.append(flights.get("test:flight", compute, 60))) for _ in range(5)
+    ]
+    for waiter in waiters:
+        waiter.start()
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join(5)
+    assert results == [1] * 6 and len(calls) == 1
+    assert flights.stats() == {"hits": 0, "stale": 0, "computed": 1, "coalesced": 5, "timeouts": 0}
+
+    # Устаревшую запись пересчитывает ведущий, остальные сразу получают прежнее значение
+    flights.expire("test:flight")
+    started.clear()
+    release.clear()
+    leader = threading.Thread(target=lambda: results.append(flights.get("test:flight", compute, 60)))
+    leader.start()
+    started.wait(5)
+    assert flights.get("test:flight", compute, 60) == 1
+    release.set()
+    leader.join(5)
+    assert results[-1] == 2 and flights.get("test:flight", compute, 60) == 2
+    assert flights.stats()["stale"] == 1 and flights.stats()["hits"] == 1
+
+
+def test_bloom_filter_has_no_false_negatives():
+    """
+    Тестирует фильтр Блума: добавленные элементы всегда найдены, ложных срабатываний около заданной доли.
+    """
+    bloom = BloomFilter(1000, 0.01)
+    for index in range(1000):
+        bloom.add(f"jti-{index}")
+    assert all(f"jti-{index}" in bloom for index in range(1000))
+    assert sum(f"other-{index}" in bloom for index in range(10000)) < 300
+
+
+@pytest.mark.django_db
+def test_logout_revokes_refresh_token(api_client, get_tokens_for_user, django_assert_num_queries, settings):
+    """
+    Тестирует выход: отозванный refresh-токен не обновляется, а проверка неотозванного не обращается к таблице.
+    """
+    revoked.reset()
+    _, refresh = get_tokens_for_user(email="testuser@example.com", password="password123")
+    other_refresh = str(RefreshToken.for_user(User.objects.get()))  # Второй вход того же пользователя
+    url = reverse("users:token_refresh")
+    assert api_client.post(url, {"refresh": refresh}).status_code == status.HTTP_200_OK
+
+    assert api_client.post(reverse("users:logout"), {"refresh": refresh}).status_code == status.HTTP_204_NO_CONTENT
+    assert api_client.post(url, {"refresh": refresh}).status_code == status.HTTP_401_UNAUTHORIZED
+    assert api_client.post(reverse("users:logout"), {"refresh": refresh}).status_code == status.HTTP_400_BAD_REQUEST
+
+    # Неотозванный токен проверяется только по фильтру; остаётся запрос пользователя в TokenRefreshSerializer
+    with django_assert_num_queries(1):
+        assert api_client.post(url, {"refresh": other_refresh}).status_code == status.HTTP_200_OK
+
+    # Отзыв в другом процессе попадает в фильтр при следующей синхронизации
+    settings.TOKEN_REVOCATION = {**settings.TOKEN_REVOCATION, "SYNC_INTERVAL": 0}
+    token = RefreshToken(other_refresh)
+    RevokedToken.objects.create(jti=token["jti"], expires_at=timezone.now() + timedelta(days=1))
+    assert api_client.post(url, {"refresh": other_refresh}).status_code == status.HTTP_401_UNAUTHORIZED
+
+    # Запись с меньшим ID, зафиксированная после догрузки следующих, не пропускается
+    RevokedToken.objects.create(pk=0, jti="late", expires_at=timezone.now() + timedelta(days=1))
+    assert revoked.is_revoked("late")
+
+    # Перестройка идёт вне блокировки фильтра: пока она выполняется, проверки работают по прежнему фильтру
+    settings.TOKEN_REVOCATION = {**settings.TOKEN_REVOCATION, "REBUILD_INTERVAL": 0}
+    with revoked._refresh_lock, django_assert_num_queries(0):
+        assert not revoked.is_revoked("unknown")
+    revoked.revoke("during-rebuild", timezone.now() + timedelta(days=1))
+    assert revoked.is_revoked("during-rebuild") and revoked.is_revoked(token["jti"])
+
+    RevokedToken.objects.filter(jti=token["jti"]).update(expires_at=timezone.now() - timedelta(seconds=1))
+    call_command("prune_revoked_tokens")
+    assert RevokedToken.objects.count() == 3
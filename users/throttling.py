@@ -0,0 +1,167 @@
+"""
+Ограничение частоты запросов по алгоритму token bucket.
+
+Ведро хранится в форме GCRA: для каждого ключа запоминается одно число -
+теоретическое время прибытия следующего запроса (TAT). Запрос разрешён, если
+после его учёта TAT опережает текущее время не больше чем на период лимита;
+это эквивалентно ведру ёмкостью count токенов, пополняемому со скоростью
+count / period.
+
+Лимиты задаются в settings.AUTH_THROTTLE по имени URL, отдельно для ключа по
+IP-адресу ("ip") и по учётной записи ("account", поле email из тела запроса).
+Адрес клиента определяет DRF по REST_FRAMEWORK["NUM_PROXIES"]: без доверенных
+прокси - REMOTE_ADDR, иначе адрес, добавленный в X-Forwarded-For ближайшим к
+приложению прокси, поэтому подмена заголовка клиентом не меняет ключ.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    Разбирает лимит вида "5/min" в пару (количество, период в секундах).
+    """
+    count, period = rate.split("/")
+    return int(count), DURATIONS[period[0]]
+
+
+class LocalMemoryBackend:
+    """
+    Хранилище вёдер в памяти процесса.
+
+    Ключи распределены по полосам с отдельными блокировками, поэтому потоки
+    почти не конкурируют. Вёдра полосы упорядочены по времени последнего
+    разрешённого запроса: в начале лежат давно не использованные, которые
+    обычно уже полностью пополнились (их состояние совпадает с отсутствием
+    ключа). После каждой записи удаляются такие вёдра из начала, а если полоса
+    всё ещё больше своей доли max_keys, - самые давние, даже не пополнившиеся.
+    Очистка работает под блокировкой полосы и занимает O(1) на запрос в среднем.
+    """
+
+    stripes = 64  # Количество блокировок-полос
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._stripe_keys = max(1, max_keys // self.stripes)
+        self._stripes = [(threading.Lock(), OrderedDict()) for _ in range(self.stripes)]
+
+    def acquire(self, key, interval, period, now):
+        """
+        Забирает токен из ведра.
+
+        :param key: Ключ ведра.
+        :param interval: Время пополнения одного токена в секундах.
+        :param period: Период лимита в секундах (ёмкость ведра во времени).
+        :param now: Текущее время.
+        :return: 0, если запрос разрешён, иначе сколько секунд ждать.
+        """
+        lock, tats = self._stripes[hash(key) % self.stripes]
+        with lock:
+            tat = max(tats.get(key, now), now) + interval
+            wait = tat - now - period
+            if wait > 0:
+                return wait
+            tats[key] = tat
+            tats.move_to_end(key)
+            self.prune(tats, now)
+        return 0
+
+    def prune(self, tats, now):
+        # Вызывается под блокировкой полосы tats
+        while tats:
+            oldest, tat = next(iter(tats.items()))
+            if tat > now and len(tats) <= self._stripe_keys:
+                return
+            del tats[oldest]
+
+    def __len__(self):
+        return sum(len(tats) for _, tats in self._stripes)
+
+    def clear(self):
+        for lock, tats in self._stripes:
+            with lock:
+                tats.clear()
+
+
+class CacheBackend:
+    """
+    Хранилище вёдер в общем кэше Django, разделяемое между процессами.
+
+    Чтение и запись не атомарны: при одновременных запросах с одним ключом
+    из разных процессов лимит может быть превышен на несколько запросов.
+    """
+
+    def __init__(self, alias="default", prefix="throttle"):
+        self.cache = caches[alias]
+        self.prefix = prefix
+
+    def acquire(self, key, interval, period, now):
+        key = f"{self.prefix}:{key}"
+        tat = max(self.cache.get(key, now), now) + interval
+        wait = tat - now - period
+        if wait > 0:
+            return wait
+        self.cache.set(key, tat, timeout=int(tat - now) + 1)
+        return 0
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    """
+    Возвращает хранилище вёдер из settings.AUTH_THROTTLE (один экземпляр на процесс).
+    """
+    config = settings.AUTH_THROTTLE
+    return import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Ограничение частоты запросов по имени URL из settings.AUTH_THROTTLE["RATES"].
+
+    Для URL без настроенных лимитов проверка сводится к поиску в словаре.
+    При превышении DRF возвращает 429 с заголовком Retry-After.
+    """
+
+    backend = None  # Хранилище вёдер; по умолчанию берётся из settings.AUTH_THROTTLE
+
+    def get_scope_ident(self, scope, request):
+        if scope == "ip":
+            # Адрес из X-Forwarded-For берётся с учётом REST_FRAMEWORK["NUM_PROXIES"], иначе REMOTE_ADDR
+            return self.get_ident(request)
+        if scope == "account":
+            # Тело может быть JSON-массивом: такой запрос отклонит сериализатор представления
+            email = request.data.get("email") if isinstance(request.data, Mapping) else None
+            return email.strip().lower() if isinstance(email, str) and email else None
+        raise ValueError(f"Неизвестная область ограничения: {scope}")
+
+    def allow_request(self, request, view):
+        self.wait_time = 0
+        match = request.resolver_match
+        rates = settings.AUTH_THROTTLE["RATES"].get(match.view_name if match else None)
+        if not rates:
+            return True
+
+        backend, now = self.backend or get_backend(), time.time()
+        for scope, rate in rates.items():
+            ident = self.get_scope_ident(scope, request)
+            if ident is None:
+                continue
+            count, period = parse_rate(rate)
+            wait = backend.acquire(f"{match.view_name}:{scope}:{ident}", period / count, period, now)
+            self.wait_time = max(self.wait_time, wait)
+        return self.wait_time == 0
+
+    def wait(self):
+        return self.wait_time
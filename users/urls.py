@@ -1,21 +1,26 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .views import RegisterView, UserViewSet, UserProfileView
+from .hashing_pool import offload_hashing
 from users.apps import UsersConfig
 from . import views
 from rest_framework.routers import DefaultRouter
 
-
 app_name = UsersConfig.name
 
 router = DefaultRouter()
 router.register(r"users", UserViewSet)  # CRUD для пользователей
 
 urlpatterns = [
-    path("register/", RegisterView.as_view(), name="register"),
-    path("login/", TokenObtainPairView.as_view(), name="login"),
+    path("register/", offload_hashing(RegisterView.as_view()), name="register"),
+    path("login/", offload_hashing(TokenObtainPairView.as_view()), name="login"),
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("logout/", views.LogoutView.as_view(), name="logout"),  # Отзыв refresh-токена
     path("reset_password/", views.ResetPasswordRequestView.as_view(), name="reset_password"),
-    path("reset_password_confirm/", views.ResetPasswordConfirmView.as_view(), name="reset_password_confirm"),
+    path(
+        "reset_password_confirm/",
+        offload_hashing(views.ResetPasswordConfirmView.as_view()),
+        name="reset_password_confirm",
+    ),
     path("profile/", UserProfileView.as_view(), name="user_profile"),
 ]
@@ -2,7 +2,7 @@ from rest_framework import generics, permissions, serializers
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import User
-from .serializers import RegisterSerializer
+from .serializers import LogoutSerializer, RegisterSerializer
 
 
 from django.contrib.auth.tokens import default_token_generator
@@ -202,3 +202,21 @@ class UserProfileView(APIView):
             "password": user.password,
         }
         return Response(user_data)
+
+
+class LogoutView(APIView):
+    """
+    Представление для выхода из системы.
+
+    Отзывает переданный refresh-токен: после этого по нему нельзя получить
+    новый access-токен (см. users/revocation.py). Выданный ранее access-токен
+    действует до своего истечения.
+    """
+
+    permission_classes = [AllowAny]  # Владение refresh-токеном достаточно для его отзыва
+
+    def post(self, request):
+        serializer = LogoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(status=status.HTTP_204_NO_CONTENT)